@@ -0,0 +1,530 @@
+import hashlib
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+from flask import current_app, request, jsonify, url_for
+from flask_login import current_user
+from sqlalchemy import and_, func, or_, select
+from app import db, views
+from models import Customer, Transaction
+from dashboard import get_portfolio_summary
+from importer import CUSTOMER_HEADERS, import_customers, read_rows, records_from_json
+from live import DASHBOARD, customer_topic, live_updates, totals_event
+from posting import post_transaction, tds_on
+from rates import rate_tables
+from replica import replica_reads
+from timeline import balance_timelines
+from compounding import compounding_schedules, uses_schedule
+from snapshots import period_summary
+from users import DATA_ENTRY_ROLES
+from utils import calculate_interest, calculate_compound_interest
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@views.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+def api_login_required(f):
+    """Like login_required, but answers with JSON 401 instead of redirecting to the login page"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            raise ApiError('Authentication required.', 401)
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_data_entry_required(f):
+    """JSON counterpart of routes.data_entry_required"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            raise ApiError('Authentication required.', 401)
+        if current_user.role not in DATA_ENTRY_ROLES:
+            raise ApiError('Data entry access required.', 403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _parse_date(value, field, required=False):
+    if not value:
+        if required:
+            raise ApiError(f'{field} is required.')
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ApiError(f'{field} must be a date in YYYY-MM-DD format.')
+
+def _parse_amount(value, field):
+    if value in (None, '', 0):
+        return None
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ApiError(f'{field} must be a number.')
+    if not amount.is_finite():
+        raise ApiError(f'{field} must be a number.')
+    if amount < 0:
+        raise ApiError(f'{field} cannot be negative.')
+    return amount or None
+
+def _amount(value):
+    return str(value) if value is not None else None
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+def _not_modified(etag):
+    """A 304 response when the client already holds this ETag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def _with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def customer_to_json(customer):
+    return {
+        'id': customer.id,
+        'iclNo': customer.icl_no,
+        'customerName': customer.name,
+        'customerAddress': customer.address,
+        'contactDetails': customer.contact_details,
+        'annualRate': _amount(customer.annual_rate),
+        'iclStartDate': _iso(customer.icl_start_date),
+        'iclEndDate': _iso(customer.icl_end_date),
+        'iclExtension': customer.icl_extension,
+        'tdsApplicable': bool(customer.tds_applicable),
+        'interestType': (customer.interest_type or 'simple').title(),
+        'compoundFrequency': customer.compound_frequency,
+        'firstCompoundingDate': _iso(customer.first_compounding_date),
+        'balance': _amount(customer.balance),
+    }
+
+def transaction_to_json(transaction):
+    return {
+        'id': transaction.id,
+        'date': _iso(transaction.date),
+        'amountPaid': _amount(transaction.amount_paid),
+        'amountRepaid': _amount(transaction.amount_repaid),
+        'balance': _amount(transaction.balance),
+        'periodFrom': _iso(transaction.period_from),
+        'periodTo': _iso(transaction.period_to),
+        'noOfDays': transaction.no_of_days,
+        'intRate': _amount(transaction.int_rate),
+        'intAmount': _amount(transaction.int_amount),
+        'tdsAmount': _amount(transaction.tds_amount),
+        'netAmount': _amount(transaction.net_amount),
+    }
+
+def _encode_cursor(transaction):
+    return f'{transaction.date.isoformat()}_{transaction.id}'
+
+def _decode_cursor(cursor):
+    try:
+        cursor_date, cursor_id = cursor.split('_')
+        return date.fromisoformat(cursor_date), int(cursor_id)
+    except ValueError:
+        raise ApiError('Invalid cursor.')
+
+@views.route('/api/customers', methods=['GET'])
+@api_login_required
+def api_customers():
+    """Active customers ordered by id, paged by keyset: ?after=<last id>&limit=N"""
+    after = request.args.get('after', 0, type=int)
+    limit = _page_size()
+    customers = Customer.query.filter(Customer.is_active.is_(True), Customer.id > after) \
+        .order_by(Customer.id).limit(limit + 1).all()
+    has_more = len(customers) > limit
+    customers = customers[:limit]
+
+    page_key = ','.join(f'{c.id}:{c.ledger_version}' for c in customers)
+    etag = hashlib.sha1(f'{after}|{limit}|{has_more}|{page_key}'.encode()).hexdigest()
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    response = jsonify([customer_to_json(c) for c in customers])
+    if has_more:
+        next_url = url_for('api_customers', after=customers[-1].id, limit=limit)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = str(customers[-1].id)
+    return _with_etag(response, etag)
+
+@views.route('/api/customers', methods=['POST'])
+@api_data_entry_required
+def api_create_customer():
+    data = request.get_json(silent=True) or {}
+    icl_no = (data.get('iclNo') or '').strip()
+    name = (data.get('customerName') or '').strip()
+    if not icl_no or not name:
+        raise ApiError('iclNo and customerName are required.')
+    try:
+        annual_rate = Decimal(str(data.get('annualRate')))
+    except InvalidOperation:
+        raise ApiError('annualRate must be a number.')
+    if Customer.query.filter_by(icl_no=icl_no).first():
+        raise ApiError(f'ICL No {icl_no} already exists.', 409)
+
+    interest_type = (data.get('interestType') or 'simple').lower()
+    if interest_type not in ('simple', 'compound'):
+        raise ApiError('interestType must be Simple or Compound.')
+
+    customer = Customer(
+        icl_no=icl_no,
+        name=name,
+        address=data.get('customerAddress'),
+        contact_details=data.get('contactDetails'),
+        annual_rate=annual_rate,
+        icl_start_date=_parse_date(data.get('iclStartDate'), 'iclStartDate') or date.today(),
+        icl_end_date=_parse_date(data.get('iclEndDate'), 'iclEndDate'),
+        icl_extension=data.get('iclExtension'),
+        tds_applicable=bool(data.get('tdsApplicable')),
+        interest_type=interest_type,
+        compound_frequency=(data.get('compoundFrequency') or '').lower() if interest_type == 'compound' else '',
+        first_compounding_date=_parse_date(data.get('firstCompoundingDate'), 'firstCompoundingDate'),
+        created_by=current_user.id
+    )
+    db.session.add(customer)
+    db.session.commit()
+    return jsonify(customer_to_json(customer)), 201
+
+def _import_result_to_json(result):
+    return {
+        'created': result['created'],
+        'errors': result['errors'],
+        'results': [{'row': r['row'], 'iclNo': r['icl_no'], 'status': r['status'],
+                     'id': r.get('id'), 'error': r.get('error')} for r in result['results']],
+    }
+
+@views.route('/api/customers/bulk', methods=['POST'])
+@api_data_entry_required
+def api_bulk_create_customers():
+    """Create many customers from a JSON list or an uploaded CSV/XLSX file"""
+    upload = request.files.get('file')
+    if upload:
+        file_format = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+        if file_format not in ('csv', 'xlsx'):
+            raise ApiError('file must be a CSV or XLSX file.')
+        with tempfile.NamedTemporaryFile(suffix=f'.{file_format}') as f:
+            upload.save(f)
+            f.flush()
+            result = import_customers(read_rows(f.name, CUSTOMER_HEADERS, file_format), user_id=current_user.id)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ApiError('Send a JSON list of customers or a CSV/XLSX file.')
+        result = import_customers(records_from_json(data, CUSTOMER_HEADERS), user_id=current_user.id)
+    return jsonify(_import_result_to_json(result))
+
+@views.route('/api/customers/<int:customer_id>', methods=['GET'])
+@api_login_required
+def api_customer(customer_id):
+    customer = db.session.get(Customer, customer_id)
+    if not customer:
+        raise ApiError('Customer not found.', 404)
+
+    etag = f'customer-{customer.id}-{customer.ledger_version}'
+    return _not_modified(etag) or _with_etag(jsonify(customer_to_json(customer)), etag)
+
+def calculate_periods(customer, transactions, next_date, opening_balance):
+    """Cumulative interest periods for consecutive ledger rows.
+
+    Each row opens a period that runs until the next row's date (or today
+    for the latest row), and interest is charged on the balance after the
+    row for that many days.
+    """
+    periods = []
+    balance = opening_balance
+    following_dates = [t.date for t in transactions[1:]] + [next_date or date.today()]
+    for transaction, period_to in zip(transactions, following_dates):
+        balance += (transaction.amount_paid or 0) - (transaction.amount_repaid or 0)
+        days = max((period_to - transaction.date).days, 0)
+        if customer.interest_type == 'simple':
+            int_amount = calculate_interest(balance, customer.annual_rate, days)
+        elif uses_schedule(customer):
+            int_amount = compounding_schedules.get(customer).interest(transaction.date, max(period_to, transaction.date))
+        else:
+            int_amount = calculate_compound_interest(balance, customer.annual_rate, days, customer.compound_frequency)
+        int_amount = int_amount.quantize(Decimal('0.01'))
+        tds_amount = Decimal(str(tds_on(customer, int_amount, period_to))).quantize(Decimal('0.01'))
+        periods.append({
+            'date': _iso(transaction.date),
+            'amountPaid': _amount(transaction.amount_paid or Decimal('0.00')),
+            'amountRepaid': _amount(transaction.amount_repaid or Decimal('0.00')),
+            'balance': _amount(balance),
+            'from': _iso(transaction.date),
+            'to': _iso(period_to),
+            'noOfDays': days,
+            'intRate': _amount(customer.annual_rate),
+            'intAmount': _amount(int_amount),
+            'tds': _amount(tds_amount),
+            'netAmount': _amount(int_amount - tds_amount),
+        })
+    return periods
+
+def _opening_balance(customer, first):
+    """Balance just before `first` in (date, id) order"""
+    timeline = balance_timelines.get(customer)
+    opening = timeline.balance_on(first.date - timedelta(days=1))
+    same_day_before = db.session.execute(
+        select(func.coalesce(func.sum(Transaction.amount_paid), 0) - func.coalesce(func.sum(Transaction.amount_repaid), 0))
+        .where(Transaction.customer_id == customer.id, Transaction.date == first.date, Transaction.id < first.id)
+    ).scalar()
+    return opening + Decimal(str(same_day_before or 0))
+
+@views.route('/api/customers/<int:customer_id>/transactions', methods=['GET'])
+@api_login_required
+def api_customer_transactions(customer_id):
+    """Ledger rows in (date, id) order with their calculated periods, paged by ?after=<cursor>&limit=N"""
+    customer = db.session.get(Customer, customer_id)
+    if not customer:
+        raise ApiError('Customer not found.', 404)
+
+    after = request.args.get('after')
+    limit = _page_size()
+    # The open period runs to today and TDS comes from the rate tables, so both are part of the version
+    versions = rate_tables.versions()
+    etag = (f'ledger-{customer.id}-{customer.ledger_version}-{after or ""}-{limit}-{date.today().isoformat()}'
+            f'-r{versions.get("interest_rate", 0)}.{versions.get("tds_rate", 0)}')
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    query = Transaction.query.filter(Transaction.customer_id == customer_id)
+    if after:
+        after_date, after_id = _decode_cursor(after)
+        query = query.filter(or_(Transaction.date > after_date,
+                                 and_(Transaction.date == after_date, Transaction.id > after_id)))
+    rows = query.order_by(Transaction.date, Transaction.id).limit(limit + 1).all()
+    transactions, lookahead = rows[:limit], rows[limit:]
+
+    periods = []
+    if transactions:
+        periods = calculate_periods(customer, transactions,
+                                    lookahead[0].date if lookahead else None,
+                                    _opening_balance(customer, transactions[0]))
+
+    response = jsonify({
+        'transactions': [transaction_to_json(t) for t in transactions],
+        'calculatedPeriods': periods,
+        'nextCursor': _encode_cursor(transactions[-1]) if lookahead else None,
+    })
+    return _with_etag(response, etag)
+
+@views.route('/api/customers/<int:customer_id>/transactions', methods=['POST'])
+@api_data_entry_required
+def api_add_transaction(customer_id):
+    customer = db.session.get(Customer, customer_id)
+    if not customer:
+        raise ApiError('Customer not found.', 404)
+
+    data = request.get_json(silent=True) or {}
+    transaction_date = _parse_date(data.get('date'), 'date', required=True)
+    amount_paid = _parse_amount(data.get('amountPaid'), 'amountPaid')
+    amount_repaid = _parse_amount(data.get('amountRepaid'), 'amountRepaid')
+    period_from = _parse_date(data.get('periodFrom'), 'periodFrom')
+    period_to = _parse_date(data.get('periodTo'), 'periodTo')
+    if not amount_paid and not amount_repaid and not (period_from and period_to):
+        raise ApiError('Enter at least one amount (Paid or Repaid) or an interest period.')
+
+    try:
+        transaction = post_transaction(customer, transaction_date, amount_paid, amount_repaid,
+                                       period_from, period_to, user_id=current_user.id)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return jsonify({
+        'transaction': transaction_to_json(transaction),
+        'customer': customer_to_json(customer),
+    }), 201
+
+def _summary_to_json(entry):
+    return {
+        'openingBalance': _amount(entry['opening_balance']),
+        'amountPaid': _amount(entry['amount_paid']),
+        'amountRepaid': _amount(entry['amount_repaid']),
+        'intAmount': _amount(entry['int_amount']),
+        'tdsAmount': _amount(entry['tds_amount']),
+        'netAmount': _amount(entry['net_amount']),
+        'closingBalance': _amount(entry['closing_balance']),
+        'transactionCount': entry['transaction_count'],
+    }
+
+@views.route('/api/reports/period_summary', methods=['GET'])
+@api_login_required
+@replica_reads
+def api_period_summary():
+    """Per-customer balances and totals for ?from=YYYY-MM-DD&to=YYYY-MM-DD, served from monthly snapshots"""
+    start_date = _parse_date(request.args.get('from'), 'from', required=True)
+    end_date = _parse_date(request.args.get('to'), 'to', required=True)
+    if end_date < start_date:
+        raise ApiError('to must not be before from.')
+
+    summary = period_summary(start_date, end_date)
+    return jsonify({
+        'from': _iso(start_date),
+        'to': _iso(end_date),
+        'customers': [dict(_summary_to_json(entry), id=entry['customer_id'], iclNo=entry['icl_no'],
+                           customerName=entry['name']) for entry in summary['customers']],
+        'totals': _summary_to_json(summary['totals']),
+    })
+
+@views.route('/api/reports/interest_projection', methods=['GET'])
+@api_login_required
+@replica_reads
+def api_interest_projection():
+    """Expected interest, TDS and net income of the active book per month for ?months=N from ?from=YYYY-MM-DD"""
+    from projection import DEFAULT_MONTHS, MAX_MONTHS, project_interest  # numpy is loaded on first use
+    months = request.args.get('months', DEFAULT_MONTHS, type=int)
+    if not 1 <= months <= MAX_MONTHS:
+        raise ApiError(f'months must be a whole number from 1 to {MAX_MONTHS}.')
+    start_date = _parse_date(request.args.get('from'), 'from')
+
+    projection = project_interest(months, start_date)
+    return jsonify({
+        'from': _iso(projection['start']),
+        'customers': projection['customers'],
+        'months': [{
+            'from': _iso(month['period_from']),
+            'to': _iso(month['period_to']),
+            'facilities': month['facilities'],
+            'ending': month['ending'],
+            'intAmount': _amount(month['interest']),
+            'tdsAmount': _amount(month['tds']),
+            'netAmount': _amount(month['net']),
+        } for month in projection['months']],
+        'totals': {
+            'intAmount': _amount(projection['total_interest']),
+            'tdsAmount': _amount(projection['total_tds']),
+            'netAmount': _amount(projection['total_net']),
+        },
+    })
+
+@views.route('/api/live', methods=['GET'])
+@api_login_required
+def api_live():
+    """Server-sent events for the dashboard, or for one customer's page with ?customer=<id>; see live.py"""
+    customer_id = request.args.get('customer', type=int)
+    if customer_id:
+        topics, first = [customer_topic(customer_id)], []
+    else:
+        topics, first = [DASHBOARD], [('totals', totals_event(get_portfolio_summary()))]
+    # the stream outlives this request; its DB session is released as soon as the view returns
+    response = current_app.response_class(
+        live_updates.stream(topics, request.headers.get('Last-Event-ID'), first), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Sortable columns exposed to DataTables, keyed by the column's `data` name
+CUSTOMER_TABLE_COLUMNS = {
+    'iclNo': Customer.icl_no,
+    'customerName': Customer.name,
+    'annualRate': Customer.annual_rate,
+    'interestType': Customer.interest_type,
+    'balance': Customer.balance,
+    'iclStartDate': Customer.icl_start_date,
+    'iclEndDate': Customer.icl_end_date,
+}
+TRANSACTION_TABLE_COLUMNS = {
+    'date': Transaction.date,
+    'amountPaid': Transaction.amount_paid,
+    'amountRepaid': Transaction.amount_repaid,
+    'balance': Transaction.balance,
+    'periodFrom': Transaction.period_from,
+    'periodTo': Transaction.period_to,
+    'noOfDays': Transaction.no_of_days,
+    'intAmount': Transaction.int_amount,
+    'tdsAmount': Transaction.tds_amount,
+    'netAmount': Transaction.net_amount,
+}
+
+def prefix_match(column, term):
+    """Case-insensitive prefix search that can be served from an index on lower(column)"""
+    term = term.lower()
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    condition = func.lower(column).like(f'{escaped}%', escape='\\')
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite will not use an expression index for LIKE, but it will for a range
+        condition = and_(condition, func.lower(column) >= term,
+                         func.lower(column) < term[:-1] + chr(ord(term[-1]) + 1))
+    return condition
+
+def _datatables_order(columns, default):
+    """ORDER BY clauses from DataTables' order[i][column] / columns[j][data] parameters"""
+    clauses = []
+    i = 0
+    while f'order[{i}][column]' in request.args:
+        index = request.args.get(f'order[{i}][column]', type=int)
+        name = request.args.get(f'columns[{index}][data]')
+        column = columns.get(name)
+        if column is not None:
+            descending = request.args.get(f'order[{i}][dir]') == 'desc'
+            clauses.append(column.desc() if descending else column.asc())
+        i += 1
+    return clauses + default
+
+def datatables_response(query, total, columns, default_order, serialize, search_columns=()):
+    """Run one server-side DataTables request: search, sort, then offset/limit paging"""
+    draw = request.args.get('draw', 0, type=int)
+    start = max(request.args.get('start', 0, type=int), 0)
+    length = request.args.get('length', DEFAULT_PAGE_SIZE, type=int)
+    length = MAX_PAGE_SIZE if length < 0 else min(length, MAX_PAGE_SIZE)
+
+    filtered = total
+    term = (request.args.get('search[value]') or '').strip()
+    if term and search_columns:
+        query = query.filter(or_(*(prefix_match(column, term) for column in search_columns)))
+        filtered = query.order_by(None).count()
+
+    rows = query.order_by(*_datatables_order(columns, default_order)).offset(start).limit(length).all()
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': filtered,
+        'data': [serialize(row) for row in rows],
+    })
+
+@views.route('/api/datatables/customers')
+@api_login_required
+@replica_reads
+def datatable_customers():
+    """Server-side DataTables source for the customer tables"""
+    query = Customer.query.filter(Customer.is_active.is_(True))
+    total = db.session.execute(
+        select(func.count(Customer.id)).where(Customer.is_active.is_(True))
+    ).scalar()
+    return datatables_response(query, total, CUSTOMER_TABLE_COLUMNS, [Customer.icl_no],
+                               customer_to_json, search_columns=(Customer.icl_no, Customer.name))
+
+@views.route('/api/datatables/customers/<int:customer_id>/transactions')
+@api_login_required
+@replica_reads
+def datatable_transactions(customer_id):
+    """Server-side DataTables source for a customer's ledger"""
+    query = Transaction.query.filter(Transaction.customer_id == customer_id)
+    total = db.session.execute(
+        select(func.count(Transaction.id)).where(Transaction.customer_id == customer_id)
+    ).scalar()
+    return datatables_response(query, total, TRANSACTION_TABLE_COLUMNS,
+                               [Transaction.date.desc(), Transaction.id.desc()], transaction_to_json)
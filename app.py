@@ -5,60 +5,100 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+from config import configs
+from replica import RoutingSession
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 login_manager = LoginManager()
+login_manager.login_view = 'login'
+login_manager.login_message = 'Please log in to access this page.'
 
-# create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1) # needed for url_for to generate with https
+class Views:
+    """URL rules and error handlers collected from routes.py and api.py and added to each app.
 
-# configure the database, relative to the app instance folder
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///loan_management.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+    Views are registered on the app itself rather than on a blueprint, so
+    endpoint names stay plain ('dashboard', 'login') for url_for.
+    """
 
-# initialize the app with the extension, flask-sqlalchemy >= 3.0.x
-db.init_app(app)
+    def __init__(self):
+        self.rules = []
+        self.error_handlers = []
 
-# Initialize Flask-Login
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = 'Please log in to access this page.'
+    def route(self, rule, **options):
+        def decorator(f):
+            self.rules.append((rule, options.pop('endpoint', None), f, options))
+            return f
+        return decorator
+
+    def errorhandler(self, code_or_exception):
+        def decorator(f):
+            self.error_handlers.append((code_or_exception, f))
+            return f
+        return decorator
+
+    def init_app(self, app):
+        for rule, endpoint, f, options in self.rules:
+            app.add_url_rule(rule, endpoint, f, **options)
+        for code_or_exception, f in self.error_handlers:
+            app.register_error_handler(code_or_exception, f)
+
+views = Views()
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    # served from an in-process cache; see users.py
+    from users import load_session_user
+    return load_session_user(user_id)
+
+def create_app(config_name=None, **overrides):
+    """Build the application for a configuration profile (default: APP_CONFIG or production).
+
+    Nothing here connects to the database; tables, migrations and default
+    users are set up by `flask init-db` unless INIT_DB_ON_STARTUP is set.
+    """
+    # Set up logging; LOG_LEVEL=DEBUG for verbose output
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
+    app = Flask(__name__)
+    app.config.from_object(configs[config_name or os.environ.get("APP_CONFIG", "production")])
+    app.config.update(overrides)
+    for key, folder in (("EXPORT_STORE_DIR", "exports"), ("REPORT_CACHE_DIR", "report_cache"),
+                        ("PROFILE_DIR", "profiles")):
+        if not app.config[key]:
+            app.config[key] = os.path.join(app.instance_path, folder)
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        app.config["SQLALCHEMY_BINDS"] = {**app.config.get("SQLALCHEMY_BINDS", {}),
+                                          "replica": app.config["SQLALCHEMY_REPLICA_URI"]}
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1) # needed for url_for to generate with https
+
+    # initialize the app with the extension, flask-sqlalchemy >= 3.0.x
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    with app.app_context():
+        import sqlite_setup
+        sqlite_setup.init_app(app, db)
+    import instrumentation
+    instrumentation.init_app(app)
     import models  # noqa: F401
+    import ledger  # noqa: F401
     import routes  # noqa: F401
-    
-    db.create_all()
-
-    # Create default admin user if it doesn't exist
-    from models import User
-    from werkzeug.security import generate_password_hash
-    
-    admin_user = User.query.filter_by(username='admin').first()
-    if not admin_user:
-        admin_user = User(
-            username='admin',
-            email='admin@example.com',
-            password_hash=generate_password_hash('admin123'),
-            role='admin'
-        )
-        db.session.add(admin_user)
-        db.session.commit()
-        print("Default admin user created: admin/admin123")
+    import api  # noqa: F401
+    views.init_app(app)
+    import commands
+    commands.init_app(app)
+    from jobs import export_queue
+    export_queue.init_app(app)
+    from report_cache import report_cache
+    report_cache.init_app(app)
+    from live import live_updates
+    live_updates.init_app(app)
+
+    if app.config["INIT_DB_ON_STARTUP"]:
+        from init_db import init_database
+        with app.app_context():
+            init_database()
+    return app
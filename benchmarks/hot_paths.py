@@ -0,0 +1,232 @@
+"""Benchmark the application's hot paths against a synthetic ledger.
+
+Run from the repository root:
+
+    python -m benchmarks.hot_paths --customers 500 --transactions 200 --output bench.json
+    python -m benchmarks.hot_paths --customers 500 --transactions 200 --baseline bench.json
+
+Seeds a fresh database (a temporary SQLite file unless --database-url is
+given) with customers x transactions rows, then times the dashboard,
+customer profile and transaction posting requests and the cached
+customer report download through the test client, the customer report
+render behind a cache miss, the streamed period report and the two
+interest functions.
+Each benchmark reports min/median/mean seconds and the SQL statements of
+one run as JSON. With --baseline, exits non-zero if any median is more
+than --threshold slower than the baseline's, or runs more SQL statements.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD = 'admin123'  # default admin seeded by init_db.py
+INTEREST_CALLS = 10000
+SEED_PARAMETERS = ('customers', 'transactions', 'compound_share', 'tds_share', 'scheduled_share', 'seed')
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine; measure() resets it before each run"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def measure(name, f, repeat, counter):
+    """Run f once to warm caches, then repeat times; summary of the timed runs"""
+    f()
+    durations = []
+    for _ in range(repeat):
+        counter.count = 0
+        started = time.perf_counter()
+        f()
+        durations.append(time.perf_counter() - started)
+    result = {
+        'runs': repeat,
+        'min_s': min(durations),
+        'median_s': statistics.median(durations),
+        'mean_s': statistics.mean(durations),
+        'queries': counter.count,
+    }
+    print(f'{name}: median {result["median_s"] * 1000:.1f} ms, {result["queries"]} queries', file=sys.stderr)
+    return result
+
+def interest_cases(rng, count):
+    return [(Decimal(rng.randint(0, 10**9)).scaleb(-2), Decimal(rng.randint(0, 3000)).scaleb(-2),
+             rng.randint(0, 1100), rng.choice(['monthly', 'quarterly', 'yearly'])) for _ in range(count)]
+
+def run_benchmarks(args):
+    from app import create_app, db
+    from init_db import init_database
+    app = create_app()
+    from models import Customer, Transaction
+    from utils import calculate_interest, calculate_compound_interest, export_to_excel, stream_period_report
+    from benchmarks.synthetic import seed_ledger, benchmark_user
+
+    with app.app_context():
+        init_database()
+        started = time.perf_counter()
+        book = seed_ledger(args.customers, args.transactions, seed=args.seed,
+                           compound_share=args.compound_share, tds_share=args.tds_share,
+                           scheduled_share=args.scheduled_share, user_id=benchmark_user().id)
+        seed_seconds = time.perf_counter() - started
+        counter = QueryCounter(db.engine)
+        database = db.engine.dialect.name
+    print(f'Seeded {book["transactions"]} transactions for {book["customers"]} customers '
+          f'in {seed_seconds:.1f}s', file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    customer_ids = book['customer_ids']
+    profile_id = customer_ids[len(customer_ids) // 2]
+    report_from = book['last_date'] - timedelta(days=args.report_days)
+    client = app.test_client()
+    response = client.post('/login', data={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'could not sign in as {ADMIN_USERNAME}')
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+
+    posted = {'date': book['last_date']}
+
+    def post_transaction():
+        # one new row per run, dated after the seeded ledger, with an interest period
+        posted['date'] += timedelta(days=1)
+        customer_id = rng.choice(customer_ids)
+        url = f'/transactions/{customer_id}'
+        response = client.post(url, data={
+            'date': posted['date'].isoformat(),
+            'amount_paid': str(rng.randint(1000, 100000)),
+            'amount_repaid': '',
+            'period_from': (posted['date'] - timedelta(days=30)).isoformat(),
+            'period_to': posted['date'].isoformat(),
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f'POST {url} failed with {response.status_code}')
+
+    def in_app_context(f):
+        def run():
+            with app.app_context():
+                f()
+        return run
+
+    def customer_report():
+        customer = db.session.get(Customer, profile_id)
+        transactions = Transaction.query.filter_by(customer_id=profile_id).order_by(Transaction.date).all()
+        export_to_excel(customer, transactions)
+
+    def period_report():
+        for _ in stream_period_report(report_from, book['last_date']):
+            pass
+
+    cases = interest_cases(rng, INTEREST_CALLS)
+
+    benchmarks = {
+        'dashboard': lambda: get('/dashboard'),
+        'customer_profile': lambda: get(f'/customer_profile/{profile_id}'),
+        'transactions_post': post_transaction,
+        # the warm-up run renders the report into report_cache, so the timed runs are cache hits
+        'customer_report_cached': lambda: get(f'/export_customer_report/{profile_id}'),
+        'export_to_excel': in_app_context(customer_report),
+        'stream_period_report': in_app_context(period_report),
+        'calculate_interest': lambda: [calculate_interest(p, r, d) for p, r, d, _ in cases],
+        'calculate_compound_interest': lambda: [calculate_compound_interest(p, r, d, f) for p, r, d, f in cases],
+    }
+    results = {name: measure(name, f, args.repeat, counter)
+               for name, f in benchmarks.items() if not args.only or name in args.only}
+
+    return {
+        'parameters': {name: getattr(args, name) for name in SEED_PARAMETERS + ('repeat', 'report_days')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database,
+        },
+        'seed_s': seed_seconds,
+        'interest_calls': INTEREST_CALLS,
+        'results': results,
+    }
+
+def compare(report, baseline, threshold):
+    """Benchmarks slower than baseline median by more than threshold, or running more queries"""
+    regressions = []
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        ratio = result['median_s'] / before['median_s'] if before['median_s'] else 1.0
+        result['baseline_median_s'] = before['median_s']
+        result['change'] = ratio - 1
+        if ratio > 1 + threshold:
+            regressions.append(f'{name}: median {before["median_s"] * 1000:.1f} ms -> '
+                               f'{result["median_s"] * 1000:.1f} ms ({(ratio - 1) * 100:+.0f}%)')
+        if result['queries'] > before['queries']:
+            regressions.append(f'{name}: {before["queries"]} -> {result["queries"]} queries')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200, help='number of customers to seed')
+    parser.add_argument('--transactions', type=int, default=100, help='transactions per customer')
+    parser.add_argument('--compound-share', type=float, default=0.5, help='fraction of compound-interest customers')
+    parser.add_argument('--tds-share', type=float, default=0.5, help='fraction of customers with TDS applicable')
+    parser.add_argument('--scheduled-share', type=float, default=0.5,
+                        help='fraction of compound customers with a first compounding date')
+    parser.add_argument('--report-days', type=int, default=90, help='period report length ending on the last ledger date')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--seed', type=int, default=20250708)
+    parser.add_argument('--only', nargs='*', help='run only these benchmarks')
+    parser.add_argument('--database-url', help='empty database to seed (default: a temporary SQLite file)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='JSON report from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median before it counts as a regression (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatched = [name for name in SEED_PARAMETERS
+                      if baseline['parameters'].get(name) != getattr(args, name)]
+        if mismatched:
+            print(f'Baseline was seeded with different {", ".join(mismatched)}; rerun with the same parameters',
+                  file=sys.stderr)
+            return 2
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        report = run_benchmarks(args)
+
+    regressions = compare(report, baseline, args.threshold) if baseline else []
+    report['regressions'] = regressions
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
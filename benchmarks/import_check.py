@@ -0,0 +1,93 @@
+"""Check that bulk transaction imports keep stored balances and ledger versions in step.
+
+Run from the repository root:
+
+    python -m benchmarks.import_check
+
+Seeds a few customers into a temporary SQLite file (unless --database-url
+is given), imports a CSV with two deposits on the same day, a back-dated
+repayment and an interest-only row (no paid or repaid amount) in batches
+of two rows, and checks that every imported customer's ledger_version
+moved, so cached reports, ETags and export jobs see the change, that
+stored balances match the ledger, and that every row's balance is the
+previous row's plus its own amount, as single postings record it. Prints the checks as
+JSON and exits non-zero if any fails.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='empty database to seed (default: a temporary SQLite file)')
+    parser.add_argument('--seed', type=int, default=20250708)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "import.db")}'
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from app import create_app, db
+        from importer import import_transactions
+        from init_db import init_database
+        from ledger import balance_delta, find_balance_drift
+        from models import Customer, Transaction
+        from benchmarks.synthetic import seed_ledger
+
+        app = create_app()
+        checks = []
+
+        def check(name, passed, **details):
+            checks.append({'check': name, 'passed': bool(passed), **details})
+
+        with app.app_context():
+            init_database()
+            seeded = seed_ledger(3, 5, seed=args.seed)
+            customers = [db.session.get(Customer, customer_id) for customer_id in seeded['customer_ids']]
+            before = {customer.icl_no: customer.ledger_version for customer in customers}
+            last = seeded['last_date']
+
+            path = os.path.join(workdir, 'import.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['icl_no', 'date', 'amount_paid', 'amount_repaid', 'period_from', 'period_to'])
+                writer.writerow([customers[0].icl_no, last.isoformat(), '1000.00', '', '', ''])
+                writer.writerow([customers[0].icl_no, last.isoformat(), '500.00', '', '', ''])
+                writer.writerow([customers[1].icl_no, seeded['first_date'].isoformat(), '', '10.00', '', ''])
+                writer.writerow([customers[2].icl_no, last.isoformat(), '', '',
+                                 seeded['first_date'].isoformat(), last.isoformat()])
+            result = import_transactions(path, error_path=os.path.join(workdir, 'errors.csv'), batch_size=2)
+            check('all rows imported', result['rows_inserted'] == 4 and not result['errors'],
+                  rows_inserted=result['rows_inserted'], errors=result['errors'])
+
+            db.session.expire_all()
+            for customer in customers:
+                check(f'ledger_version moved for {customer.icl_no}', customer.ledger_version > before[customer.icl_no],
+                      before=before[customer.icl_no], after=customer.ledger_version)
+            drift = find_balance_drift()
+            check('stored balances match the ledger', not drift, drifted=len(drift))
+
+            running, wrong = {}, []
+            for row_id, customer_id, paid, repaid, balance in db.session.execute(
+                    db.select(Transaction.id, Transaction.customer_id, Transaction.amount_paid,
+                              Transaction.amount_repaid, Transaction.balance).order_by(Transaction.id)):
+                expected = running.get(customer_id, Decimal('0')) + balance_delta(paid, repaid)
+                if Decimal(str(balance)) != expected:
+                    wrong.append(row_id)
+                running[customer_id] = Decimal(str(balance))
+            check('every row carries its own running balance', not wrong, transactions=wrong[:10])
+            db.engine.dispose()
+
+    print(json.dumps(checks, indent=2))
+    failed = [check for check in checks if not check['passed']]
+    for check in failed:
+        print(f'FAILED: {check["check"]}', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Equivalence check and benchmark: Decimal interest functions vs vector_interest.
+
+Run from the repository root:
+
+    python -m benchmarks.interest --size 200000
+
+Exits non-zero if any vectorized result differs from the scalar Decimal
+result by even one paisa.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from decimal import Decimal
+import numpy as np
+import app  # noqa: F401  (application modules expect app to be imported first)
+from utils import calculate_interest, calculate_compound_interest
+from vector_interest import simple_interest_array, compound_interest_array, paise_to_decimal
+
+FREQUENCIES = ['monthly', 'quarterly', 'yearly', None, '', 'weekly']
+
+# Zeros, negatives, a long horizon and inputs that land exactly on half a paisa
+EDGE_CASES = [
+    (Decimal('0'), Decimal('12.00'), 30, 'monthly'),
+    (Decimal('1000.00'), Decimal('0'), 30, 'monthly'),
+    (Decimal('1000.00'), Decimal('12.00'), 0, 'monthly'),
+    (Decimal('-2500.50'), Decimal('9.75'), 45, 'quarterly'),
+    (Decimal('2500.50'), Decimal('9.75'), -45, 'yearly'),
+    (Decimal('9999999999.99'), Decimal('99.99'), 3650, 'monthly'),
+    (Decimal('0.01'), Decimal('0.01'), 1, 'yearly'),
+    (Decimal('36.50'), Decimal('5.00'), 1, 'monthly'),
+    (Decimal('109.50'), Decimal('5.00'), 1, 'monthly'),
+    (Decimal('1.00'), Decimal('18.25'), 1, 'yearly'),
+]
+
+def generate_cases(size, seed):
+    rng = random.Random(seed)
+    cases = list(EDGE_CASES)
+    for _ in range(size - len(cases)):
+        principal = Decimal(rng.randint(-10**7, 10**11)).scaleb(-2)
+        rate = Decimal(rng.randint(0, 3000)).scaleb(-2)
+        days = rng.randint(0, 1100)
+        cases.append((principal, rate, days, rng.choice(FREQUENCIES)))
+    return cases
+
+def timed(f):
+    started = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - started
+
+def compare(name, scalar, vector, cases):
+    mismatches = [(case, expected, actual) for case, expected, actual in zip(cases, scalar, vector)
+                  if expected != actual]
+    for case, expected, actual in mismatches[:10]:
+        print(f'{name} mismatch for {case}: decimal {expected}, vectorized {actual}', file=sys.stderr)
+    return len(mismatches)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000, help='number of input rows')
+    parser.add_argument('--seed', type=int, default=20250708)
+    args = parser.parse_args()
+
+    cases = generate_cases(max(args.size, len(EDGE_CASES)), args.seed)
+    principals = np.array([float(p) for p, _, _, _ in cases])
+    rates = np.array([float(r) for _, r, _, _ in cases])
+    days = np.array([d for _, _, d, _ in cases], dtype=np.int64)
+    frequencies = [f for _, _, _, f in cases]
+
+    simple_scalar, simple_scalar_time = timed(
+        lambda: [calculate_interest(p, r, d) for p, r, d, _ in cases])
+    simple_vector, simple_vector_time = timed(
+        lambda: simple_interest_array(principals, rates, days))
+    compound_scalar, compound_scalar_time = timed(
+        lambda: [calculate_compound_interest(p, r, d, f) for p, r, d, f in cases])
+    compound_vector, compound_vector_time = timed(
+        lambda: compound_interest_array(principals, rates, days, frequencies))
+
+    mismatches = (compare('simple', simple_scalar, paise_to_decimal(simple_vector), cases) +
+                  compare('compound', compound_scalar, paise_to_decimal(compound_vector), cases))
+
+    print(json.dumps({
+        'rows': len(cases),
+        'mismatches': mismatches,
+        'simple': {'decimal_s': simple_scalar_time, 'vectorized_s': simple_vector_time,
+                   'speedup': simple_scalar_time / simple_vector_time},
+        'compound': {'decimal_s': compound_scalar_time, 'vectorized_s': compound_vector_time,
+                     'speedup': compound_scalar_time / compound_vector_time},
+    }, indent=2))
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Stress test: many worker processes posting to the same customers at once.
+
+Run from the repository root:
+
+    python -m benchmarks.posting_stress --workers 8 --posts 200 --customers 3
+
+Each worker is a separate process with its own engine, like a WSGI
+worker, and posts deposits, repayments and interest rows through
+posting.post_transaction against a small set of customers so that
+postings collide. Afterwards every customer's stored balance must equal
+its ledger, and every row's balance must equal the previous row's
+balance plus its own amount in posting order. Exits non-zero otherwise.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+def _create_app():
+    from app import create_app, db
+    return create_app(), db
+
+def poster(worker, customer_ids, posts, seed, start):
+    """Worker process: post posts rows to randomly chosen customers as fast as possible"""
+    app, db = _create_app()
+    from models import Customer
+    from posting import post_transaction
+
+    rng = random.Random(seed + worker)
+    start.wait()
+    with app.app_context():
+        for i in range(posts):
+            customer = db.session.get(Customer, rng.choice(customer_ids))
+            day = date(2025, 1, 1) + timedelta(days=rng.randint(0, 365))
+            if rng.random() < 0.2:
+                post_transaction(customer, day, period_from=day - timedelta(days=30), period_to=day)
+            elif rng.random() < 0.7:
+                post_transaction(customer, day, amount_paid=Decimal(rng.randint(100, 100000)).scaleb(-2))
+            else:
+                post_transaction(customer, day, amount_repaid=Decimal(rng.randint(100, 50000)).scaleb(-2))
+            db.session.remove()
+
+def check_ledger(db):
+    """Problems found in the ledger after the run"""
+    from sqlalchemy import select
+    from models import Transaction
+    from ledger import find_balance_drift, balance_delta
+
+    problems = [f'customer {icl_no}: stored balance {stored}, ledger {ledger}'
+                for _, icl_no, stored, ledger in find_balance_drift()]
+    running = {}
+    for row_id, customer_id, paid, repaid, balance in db.session.execute(
+            select(Transaction.id, Transaction.customer_id, Transaction.amount_paid,
+                   Transaction.amount_repaid, Transaction.balance).order_by(Transaction.id)):
+        expected = running.get(customer_id, Decimal('0')) + balance_delta(paid, repaid)
+        if Decimal(str(balance)) != expected:
+            problems.append(f'transaction {row_id}: balance {balance}, expected {expected}')
+        running[customer_id] = Decimal(str(balance))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='posting processes')
+    parser.add_argument('--posts', type=int, default=100, help='postings per worker')
+    parser.add_argument('--customers', type=int, default=3, help='customers the postings are spread over')
+    parser.add_argument('--seed', type=int, default=20250708)
+    parser.add_argument('--database-url', help='empty database to use (default: a temporary SQLite file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "stress.db")}'
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        app, db = _create_app()
+        from benchmarks.synthetic import seed_ledger
+        from init_db import init_database
+
+        with app.app_context():
+            init_database()
+            customer_ids = seed_ledger(args.customers, 5, seed=args.seed)['customer_ids']
+
+        # spawned workers create the app afresh, each with its own connection pool
+        context = multiprocessing.get_context('spawn')
+        start = context.Barrier(args.workers + 1)  # the race starts once every worker has created the app
+        processes = [context.Process(target=poster, args=(worker, customer_ids, args.posts, args.seed, start))
+                     for worker in range(args.workers)]
+        for process in processes:
+            process.start()
+        start.wait()
+        started = time.perf_counter()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        failed_workers = [process.exitcode for process in processes if process.exitcode]
+        with app.app_context():
+            problems = check_ledger(db)
+            db.engine.dispose()
+
+    posts = args.workers * args.posts
+    print(json.dumps({
+        'workers': args.workers,
+        'posts': posts,
+        'customers': args.customers,
+        'elapsed_s': elapsed,
+        'posts_per_second': posts / elapsed if elapsed else None,
+        'failed_workers': len(failed_workers),
+        'problems': len(problems),
+    }, indent=2))
+    for problem in problems[:20]:
+        print(problem, file=sys.stderr)
+    return 1 if problems or failed_workers else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
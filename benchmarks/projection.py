@@ -0,0 +1,145 @@
+"""Benchmark and equivalence check for the interest-income projection.
+
+Run from the repository root:
+
+    python -m benchmarks.projection --customers 20000 --months 12
+
+Seeds a fresh database (a temporary SQLite file unless --database-url is
+given), gives every third customer an icl_end_date inside the projection,
+and times project_interest() over the whole book. Then recomputes the
+first --check customers month by month with the scalar functions
+(calculate_interest, calculate_compound_interest and CompoundingSchedule)
+and compares. Simple and compound interest and TDS must match to the
+paisa; first_compounding_date customers, projected in float paise, may
+differ by one paisa. Prints a JSON report and exits non-zero on a
+mismatch or if the projection takes longer than --target seconds.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+SCHEDULED_TOLERANCE = 1  # paise
+
+def set_end_dates(db, customer_ids, start, months):
+    """icl_end_date somewhere in the projection for every third customer"""
+    from sqlalchemy import update
+    from models import Customer
+    horizon = months * 31
+    db.session.execute(update(Customer), [
+        {'id': customer_id, 'icl_end_date': start + timedelta(days=customer_id * 37 % horizon)}
+        for customer_id in customer_ids[::3]])
+    db.session.commit()
+
+def scalar_projection(rows, months, start):
+    """{customer_id: [(interest, tds), ...]} computed per customer per month with the Decimal functions"""
+    from accrual import DEFAULT_TDS_RATE
+    from compounding import add_months, load_schedules, uses_schedule
+    from rates import tds_rate_on
+    from utils import calculate_interest, calculate_compound_interest
+
+    schedules = load_schedules([row for row in rows if uses_schedule(row)])
+    result = {}
+    for row in rows:
+        amounts = []
+        for month in range(months):
+            period_from, period_to = add_months(start, month), add_months(start, month + 1)
+            stop = min(period_to, row.icl_end_date) if row.icl_end_date else period_to
+            days = max((stop - period_from).days, 0)
+            if row.id in schedules:
+                interest = schedules[row.id].interest(period_from, stop) if days else Decimal('0')
+            elif row.interest_type == 'simple':
+                interest = calculate_interest(row.balance, row.annual_rate, days)
+            else:
+                interest = calculate_compound_interest(row.balance, row.annual_rate, days, row.compound_frequency)
+            tds_rate = tds_rate_on(period_to)
+            tds_fraction = (tds_rate if tds_rate is not None else DEFAULT_TDS_RATE) / 100
+            tds = (interest * tds_fraction).quantize(Decimal('0.01')) if row.tds_applicable else Decimal('0')
+            amounts.append((interest, tds))
+        result[row.id] = amounts
+    return result
+
+def compare(rows, months, start):
+    """Mismatch counts between monthly_accruals and the scalar projection for rows"""
+    from projection import LoanBook, monthly_accruals
+    book = LoanBook(rows)
+    expected = scalar_projection(rows, months, start)
+    report = {'customers': len(rows), 'exact_mismatches': 0, 'scheduled_differences': 0,
+              'max_scheduled_difference': 0}
+    for month, (_, _, interest, tds) in enumerate(monthly_accruals(book, rows, months, start)):
+        for i, row in enumerate(rows):
+            want_interest, want_tds = expected[row.id][month]
+            got_interest, got_tds = Decimal(int(interest[i])).scaleb(-2), Decimal(int(tds[i])).scaleb(-2)
+            if book.scheduled[i]:
+                difference = int(max(abs(got_interest - want_interest), abs(got_tds - want_tds)) * 100)
+                report['scheduled_differences'] += difference > 0
+                report['max_scheduled_difference'] = max(report['max_scheduled_difference'], difference)
+            elif (got_interest, got_tds) != (want_interest, want_tds):
+                report['exact_mismatches'] += 1
+                if report['exact_mismatches'] <= 10:
+                    print(f'mismatch for customer {row.id} month {month}: scalar {want_interest}/{want_tds}, '
+                          f'projected {got_interest}/{got_tds}', file=sys.stderr)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=20000, help='number of customers to seed')
+    parser.add_argument('--transactions', type=int, default=10, help='transactions per customer')
+    parser.add_argument('--months', type=int, default=12, help='months to project')
+    parser.add_argument('--check', type=int, default=1000, help='customers recomputed with the scalar functions')
+    parser.add_argument('--target', type=float, default=5.0, help='seconds the projection may take')
+    parser.add_argument('--seed', type=int, default=20250708)
+    parser.add_argument('--database-url', help='empty database to seed (default: a temporary SQLite file)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "projection.db")}'
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from app import create_app, db
+        from compounding import add_months
+        from init_db import init_database
+        from projection import load_book, project_interest
+        from benchmarks.synthetic import seed_ledger
+
+        app = create_app()
+        with app.app_context():
+            init_database()
+            seeded = seed_ledger(args.customers, args.transactions, seed=args.seed)
+            start = add_months(seeded['last_date'].replace(day=1), 1)
+            set_end_dates(db, seeded['customer_ids'], start, args.months)
+
+            result = project_interest(args.months, start)
+            started = time.perf_counter()
+            check = compare(load_book()[:args.check], args.months, start)
+            check['seconds'] = round(time.perf_counter() - started, 3)
+            db.engine.dispose()
+
+    report = {
+        'customers': result['customers'],
+        'months': args.months,
+        'start': start.isoformat(),
+        'projection_seconds': round(result['elapsed'], 3),
+        'total_interest': str(result['total_interest']),
+        'total_tds': str(result['total_tds']),
+        'check': check,
+    }
+    print(json.dumps(report, indent=2))
+    problems = []
+    if check['exact_mismatches']:
+        problems.append(f"{check['exact_mismatches']} simple/compound month(s) differ from the scalar functions")
+    if check['max_scheduled_difference'] > SCHEDULED_TOLERANCE:
+        problems.append(f"scheduled compounding off by {check['max_scheduled_difference']} paise")
+    if result['elapsed'] > args.target:
+        problems.append(f"projection took {result['elapsed']:.2f}s, target {args.target}s")
+    for problem in problems:
+        print(f'FAILED: {problem}', file=sys.stderr)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Check read-replica routing against two local databases.
+
+Run from the repository root:
+
+    python -m benchmarks.replica_check
+    python -m benchmarks.replica_check --database-url postgresql:///loans --replica-url postgresql:///loans_replica
+
+Uses two empty databases (two temporary SQLite files by default) as the
+primary and the replica, and plays replication by copying every table
+from the primary to the replica. Signs in a poster and a reader and
+checks that replica-routed reads really hit the replica, that the poster
+reads its own write before the replica has it, that a replica behind
+REPLICA_MAX_LAG, unreachable, or failing between lag checks falls back
+to the primary (a streamed period report included), and that the
+poster returns to the replica once the read-your-writes window has
+passed. Prints the checks as JSON and exits non-zero if any fails.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+POSTER = ('admin', 'admin123')  # default users seeded by init_db.py
+READER = ('user', 'user123')
+
+class EngineCounter:
+    """SQL statements executed per engine since the last reset()"""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+        self.counts = dict.fromkeys(engines, 0)
+        for name, engine in engines.items():
+            event.listen(engine, 'after_cursor_execute', self._counter(name))
+
+    def _counter(self, name):
+        def count(*args):
+            self.counts[name] += 1
+        return count
+
+    def reset(self):
+        for name in self.counts:
+            self.counts[name] = 0
+
+def replicate(db):
+    """Copy every table from the primary to the replica, as a caught-up replica would have it"""
+    replica = db.engines['replica']
+    with db.engine.connect() as primary, replica.begin() as target:
+        for table in reversed(db.metadata.sorted_tables):
+            target.execute(table.delete())
+        for table in db.metadata.sorted_tables:
+            rows = [dict(row._mapping) for row in primary.execute(table.select())]
+            if rows:
+                target.execute(table.insert(), rows)
+
+def sign_in(app, username, password):
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'could not sign in as {username}')
+    return client
+
+def period_report_rows(data):
+    """Ledger rows in a period report .xlsx (title, blank line, headers and totals excluded)"""
+    from openpyxl import load_workbook
+    return sum(1 for _ in load_workbook(io.BytesIO(data), read_only=True).active.iter_rows()) - 4
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='empty primary database (default: a temporary SQLite file)')
+    parser.add_argument('--replica-url', help='empty replica database (default: a temporary SQLite file)')
+    parser.add_argument('--seed', type=int, default=20250708)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'ERROR')
+        from app import create_app, db
+        from init_db import init_database
+        from models import Transaction
+        from replica import replica_monitor
+        from benchmarks.synthetic import seed_ledger
+
+        app = create_app(
+            SQLALCHEMY_DATABASE_URI=args.database_url or f'sqlite:///{os.path.join(workdir, "primary.db")}',
+            SQLALCHEMY_REPLICA_URI=args.replica_url or f'sqlite:///{os.path.join(workdir, "replica.db")}',
+            REPLICA_MAX_LAG=30, REPLICA_CHECK_INTERVAL=60)
+        with app.app_context():
+            init_database()
+            customer_id = seed_ledger(3, 10, seed=args.seed)['customer_ids'][0]
+            db.metadata.create_all(db.engines['replica'])
+            replicate(db)
+            counter = EngineCounter({'primary': db.engine, 'replica': db.engines['replica']})
+
+        poster = sign_in(app, *POSTER)
+        reader = sign_in(app, *READER)
+        ledger_url = f'/api/datatables/customers/{customer_id}/transactions'
+        checks = []
+
+        def read(client, probe=True):
+            """(transactions seen, statements on the replica) for one replica-routed request"""
+            if probe:
+                with app.app_context():
+                    replica_monitor.invalidate()
+                    replica_monitor.lag()  # measured up front so the lag probe is not counted as a read
+            counter.reset()
+            response = client.get(ledger_url)
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {ledger_url} returned {response.status_code}')
+            return response.get_json()['recordsTotal'], counter.counts['replica']
+
+        def check(name, passed, **details):
+            checks.append({'check': name, 'passed': bool(passed), **details})
+
+        before, replica_reads = read(reader)
+        check('caught-up replica serves reads', replica_reads > 0, transactions=before)
+
+        response = poster.post(f'/api/customers/{customer_id}/transactions',
+                               json={'date': '2025-06-30', 'amountPaid': '1000.00'})
+        if response.status_code != 201:
+            raise RuntimeError(f'posting returned {response.status_code}')
+        seen, replica_reads = read(poster)
+        check('poster reads its own write from the primary', seen == before + 1 and replica_reads == 0,
+              transactions=seen)
+        seen, replica_reads = read(reader)
+        check('other users may read the replica within the lag limit', seen == before and replica_reads > 0,
+              transactions=seen)
+
+        app.config['REPLICA_MAX_LAG'] = 0
+        seen, replica_reads = read(reader)
+        check('replica behind REPLICA_MAX_LAG falls back to the primary', seen == before + 1 and replica_reads == 0,
+              transactions=seen)
+        app.config['REPLICA_MAX_LAG'] = 30
+
+        with app.app_context():
+            replica_monitor.invalidate()
+            replica_monitor.lag()  # healthy at the last check ...
+            Transaction.__table__.drop(db.engines['replica'])  # ... and broken before the next one
+        response = reader.get(ledger_url)
+        with app.app_context():
+            marked_down = replica_monitor.lag() is None
+        check('replica failing between checks falls back to the primary',
+              response.status_code == 200 and response.get_json()['recordsTotal'] == before + 1 and marked_down,
+              status=response.status_code)
+
+        with app.app_context():
+            db.metadata.create_all(db.engines['replica'])
+            replicate(db)
+            replica_monitor.invalidate()
+            replica_monitor.lag()
+            Transaction.__table__.drop(db.engines['replica'])
+            ledger_rows = Transaction.query.count()
+        try:
+            response = reader.post('/export_period_report', data={'start_date': '1900-01-01', 'end_date': '2999-12-31'})
+            report_rows = period_report_rows(response.data) if response.status_code == 200 else None
+            error = None
+        except Exception as e:  # the stream failing after the view returned surfaces here
+            response, report_rows, error = None, None, f'{type(e).__name__}: {e}'
+        check('streamed report falls back to the primary when the replica fails mid-request',
+              report_rows == ledger_rows, rows=report_rows, expected=ledger_rows, error=error)
+
+        seen, replica_reads = read(reader)
+        check('unreachable replica falls back to the primary', seen == before + 1 and replica_reads == 0,
+              transactions=seen)
+
+        with app.app_context():
+            db.metadata.create_all(db.engines['replica'])
+            replicate(db)
+        app.config.update(REPLICA_MAX_LAG=0.5, REPLICA_CHECK_INTERVAL=0.5)
+        time.sleep(1.1)
+        seen, replica_reads = read(poster)
+        check('poster returns to the replica after the read-your-writes window', replica_reads > 0 and seen == before + 1,
+              transactions=seen)
+
+        with app.app_context():
+            db.engine.dispose()
+            db.engines['replica'].dispose()
+
+    print(json.dumps(checks, indent=2))
+    failed = [check for check in checks if not check['passed']]
+    for check in failed:
+        print(f'FAILED: {check["check"]}', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Cold-start benchmark: how long a fresh worker process takes to build the app.
+
+Run from the repository root:
+
+    python -m benchmarks.startup --runs 10 --target 0.6
+
+Each run is a new interpreter that imports app and calls create_app(), as
+a WSGI worker does on boot. Runs use the production profile against a
+database file that does not exist, and fail if startup opens a database
+connection or loads a report-only dependency (openpyxl, pandas, numpy).
+Reports the import and create_app() times as JSON and exits non-zero if
+the median total exceeds --target seconds or any run fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPORT_MODULES = ('openpyxl', 'pandas', 'numpy')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+event.listen(Pool, 'connect', lambda *args: connections.append(1))
+import app
+imported = time.perf_counter()
+app.create_app('production')
+created = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'create_app_s': created - imported,
+    'total_s': created - started,
+    'connections': len(connections),
+    'report_modules': [name for name in %r if name in sys.modules],
+}))
+''' % (REPORT_MODULES,)
+
+def run_once(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes to start')
+    parser.add_argument('--target', type=float, default=0.6, help='allowed median seconds from first import to a ready app')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ,
+                   APP_CONFIG='production',
+                   DATABASE_URL=f'sqlite:///{os.path.join(workdir, "missing", "startup.db")}',
+                   EXPORT_STORE_DIR=os.path.join(workdir, 'exports'),
+                   REPORT_CACHE_DIR=os.path.join(workdir, 'report_cache'),
+                   LOG_LEVEL='WARNING')
+        env.pop('INIT_DB_ON_STARTUP', None)
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    problems = sorted({f'startup loaded {", ".join(run["report_modules"])}' for run in runs if run['report_modules']} |
+                      {f'startup opened {run["connections"]} database connection(s)' for run in runs if run['connections']})
+    summary = {
+        'runs': args.runs,
+        'target_s': args.target,
+        'median_import_s': statistics.median(run['import_s'] for run in runs),
+        'median_create_app_s': statistics.median(run['create_app_s'] for run in runs),
+        'median_total_s': statistics.median(run['total_s'] for run in runs),
+        'max_total_s': max(run['total_s'] for run in runs),
+        'problems': problems,
+    }
+    if summary['median_total_s'] > args.target:
+        problems.append(f'median startup {summary["median_total_s"]:.3f}s is over the {args.target}s target')
+    print(json.dumps(summary, indent=2))
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Synthetic ledger generator for benchmarks.
+
+Seeds customers and transactions through the models with bulk inserts,
+then sets stored balances from the ledger in one pass. The same seed and
+parameters always produce the same book, so timings taken against it are
+comparable across runs.
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from sqlalchemy import insert
+from app import db
+from models import Customer, Transaction, InterestRate, TDSRate, User
+from ledger import rebuild_balances
+from utils import calculate_interest, calculate_compound_interest
+
+LEDGER_START = date(2023, 4, 1)
+INSERT_BATCH_SIZE = 5000
+FREQUENCIES = ['monthly', 'quarterly', 'yearly']
+
+def _amount(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)).scaleb(-2)
+
+def customer_rows(count, rng, compound_share=0.5, tds_share=0.5, scheduled_share=0.5, user_id=None):
+    """Column dicts for count customers with a mix of interest types and TDS settings"""
+    rows = []
+    for i in range(count):
+        compound = rng.random() < compound_share
+        start = LEDGER_START + timedelta(days=rng.randint(0, 30))
+        rows.append({
+            'icl_no': f'BENCH{i + 1:07d}',
+            'name': f'Benchmark Customer {i + 1}',
+            'address': f'{rng.randint(1, 999)} Synthetic Road',
+            'contact_details': f'+91 {rng.randint(7000000000, 9999999999)}',
+            'annual_rate': _amount(rng, 6, 18),
+            'icl_start_date': start,
+            'tds_applicable': rng.random() < tds_share,
+            'interest_type': 'compound' if compound else 'simple',
+            'compound_frequency': rng.choice(FREQUENCIES) if compound else '',
+            'first_compounding_date': start if compound and rng.random() < scheduled_share else None,
+            'created_by': user_id,
+            'is_active': True,
+        })
+    return rows
+
+def transaction_rows(customer_id, customer, count, rng, interest_every=3, user_id=None):
+    """count ledger rows for one customer in date order: deposits, repayments and interest rows"""
+    rows = []
+    balance = Decimal('0')
+    day = customer['icl_start_date']
+    last_interest = day
+    for i in range(count):
+        day += timedelta(days=rng.randint(1, 7))
+        amount_paid = amount_repaid = None
+        if balance <= 0 or rng.random() < 0.6:
+            amount_paid = _amount(rng, 1000, 500000)
+        else:
+            amount_repaid = min(balance, _amount(rng, 500, 200000))
+        balance += (amount_paid or 0) - (amount_repaid or 0)
+
+        row = {
+            'customer_id': customer_id,
+            'date': day,
+            'amount_paid': amount_paid,
+            'amount_repaid': amount_repaid,
+            'balance': balance,
+            'period_from': None,
+            'period_to': None,
+            'no_of_days': None,
+            'int_rate': customer['annual_rate'],
+            'int_amount': None,
+            'tds_amount': None,
+            'net_amount': None,
+            'created_by': user_id,
+        }
+        if interest_every and i % interest_every == interest_every - 1:
+            days = (day - last_interest).days
+            if customer['interest_type'] == 'compound':
+                int_amount = calculate_compound_interest(balance, customer['annual_rate'], days,
+                                                         customer['compound_frequency'])
+            else:
+                int_amount = calculate_interest(balance, customer['annual_rate'], days)
+            tds_amount = (int_amount / 10).quantize(Decimal('0.01')) if customer['tds_applicable'] else Decimal('0')
+            row.update(period_from=last_interest, period_to=day, no_of_days=days,
+                       int_amount=int_amount, tds_amount=tds_amount, net_amount=int_amount - tds_amount)
+            last_interest = day
+        rows.append(row)
+    return rows
+
+def seed_ledger(customers, transactions_per_customer, seed=20250708, compound_share=0.5, tds_share=0.5,
+                scheduled_share=0.5, user_id=None):
+    """Create customers x transactions_per_customer ledger rows; returns a summary dict"""
+    rng = random.Random(seed)
+    if not InterestRate.query.first():
+        db.session.add(InterestRate(rate=Decimal('12.00'), effective_date=LEDGER_START,
+                                    description='Benchmark rate', created_by=user_id))
+    if not TDSRate.query.first():
+        db.session.add(TDSRate(rate=Decimal('10.00'), effective_date=LEDGER_START,
+                               description='Benchmark TDS', created_by=user_id))
+
+    rows = customer_rows(customers, rng, compound_share, tds_share, scheduled_share, user_id)
+    customer_ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        customer_ids.extend(db.session.execute(
+            insert(Customer).returning(Customer.id, sort_by_parameter_order=True),
+            rows[start:start + INSERT_BATCH_SIZE]
+        ).scalars())
+
+    batch = []
+    last_date = LEDGER_START
+    for customer_id, customer in zip(customer_ids, rows):
+        batch.extend(transaction_rows(customer_id, customer, transactions_per_customer, rng, user_id=user_id))
+        if batch:
+            last_date = max(last_date, batch[-1]['date'])
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+    rebuild_balances()
+
+    return {
+        'customers': customers,
+        'transactions': customers * transactions_per_customer,
+        'customer_ids': customer_ids,
+        'first_date': LEDGER_START,
+        'last_date': last_date,
+    }
+
+def benchmark_user():
+    """The default admin seeded by init_db.py, used to sign in the benchmark client"""
+    return User.query.filter_by(username='admin').one()
@@ -0,0 +1,187 @@
+"""Check that a database created by the first release upgrades to the current schema.
+
+Run from the repository root:
+
+    python -m benchmarks.upgrade_check
+
+Creates the first release's tables (a temporary SQLite file unless
+--database-url is given, which must point at an empty database), fills them
+with a few customers and ledger rows the way that release wrote them (no
+stored balances), then runs the pending migrations as `flask db-upgrade`
+does and init_database() as `flask init-db` does. Checks that every
+migration applied, that every model table and index exists, that stored
+balances match the ledger, that the hot queries use their indexes and that
+a posting goes through on the upgraded schema. Prints the checks as JSON
+and exits non-zero if any fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+def baseline_metadata():
+    """The tables exactly as the first release's models declared them"""
+    from sqlalchemy import (Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, Numeric, String, Table,
+                            Text)
+    metadata = MetaData()
+    Table('user', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('username', String(64), unique=True, nullable=False),
+          Column('email', String(120), unique=True, nullable=False),
+          Column('password_hash', String(256)),
+          Column('role', String(20)),
+          Column('created_at', DateTime),
+          Column('is_active', Boolean))
+    Table('customer', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('icl_no', String(50), unique=True, nullable=False),
+          Column('name', String(100), nullable=False),
+          Column('address', Text),
+          Column('contact_details', String(200)),
+          Column('annual_rate', Numeric(5, 2), nullable=False),
+          Column('icl_start_date', Date, nullable=False),
+          Column('icl_end_date', Date),
+          Column('icl_extension', String(100)),
+          Column('tds_applicable', Boolean),
+          Column('interest_type', String(20)),
+          Column('compound_frequency', String(20)),
+          Column('first_compounding_date', Date),
+          Column('created_at', DateTime),
+          Column('created_by', Integer, ForeignKey('user.id')),
+          Column('is_active', Boolean))
+    Table('transaction', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('customer_id', Integer, ForeignKey('customer.id'), nullable=False),
+          Column('date', Date, nullable=False),
+          Column('amount_paid', Numeric(15, 2)),
+          Column('amount_repaid', Numeric(15, 2)),
+          Column('balance', Numeric(15, 2)),
+          Column('period_from', Date),
+          Column('period_to', Date),
+          Column('no_of_days', Integer),
+          Column('int_rate', Numeric(5, 2)),
+          Column('int_amount', Numeric(15, 2)),
+          Column('tds_amount', Numeric(15, 2)),
+          Column('net_amount', Numeric(15, 2)),
+          Column('created_at', DateTime),
+          Column('created_by', Integer, ForeignKey('user.id')))
+    for name in ('interest_rate', 'tds_rate'):
+        Table(name, metadata,
+              Column('id', Integer, primary_key=True),
+              Column('rate', Numeric(5, 2), nullable=False),
+              Column('effective_date', Date, nullable=False),
+              Column('description', String(200)),
+              Column('created_at', DateTime),
+              Column('created_by', Integer, ForeignKey('user.id')),
+              Column('is_active', Boolean))
+    return metadata
+
+def create_baseline(engine, customers, transactions):
+    """First-release schema with customers x transactions ledger rows; {customer_id: ledger balance}"""
+    metadata = baseline_metadata()
+    metadata.create_all(engine)
+    tables = metadata.tables
+    now = datetime(2025, 7, 8)
+    balances = {}
+    with engine.begin() as connection:
+        connection.execute(tables['user'].insert().values(
+            id=1, username='admin', email='admin@example.com', role='admin', created_at=now, is_active=True))
+        for customer_id in range(1, customers + 1):
+            connection.execute(tables['customer'].insert().values(
+                id=customer_id, icl_no=f'ICL{customer_id:04d}', name=f'Baseline Customer {customer_id}',
+                annual_rate=Decimal('12.50'), icl_start_date=date(2025, 1, 1), tds_applicable=customer_id % 2 == 0,
+                interest_type='simple', created_at=now, created_by=1, is_active=True))
+            balance = Decimal('0')
+            for n in range(transactions):
+                paid = Decimal(1000 * (n + 1)) if n % 3 != 2 else None
+                repaid = Decimal(250 * customer_id) if n % 3 == 2 else None
+                balance += (paid or 0) - (repaid or 0)
+                connection.execute(tables['transaction'].insert().values(
+                    customer_id=customer_id, date=date(2025, 1, 1) + timedelta(days=n * 7),
+                    amount_paid=paid, amount_repaid=repaid, balance=balance, created_at=now, created_by=1))
+            balances[customer_id] = balance
+    return balances
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='empty database to build the old schema in (default: a temporary SQLite file)')
+    parser.add_argument('--customers', type=int, default=5)
+    parser.add_argument('--transactions', type=int, default=6, help='ledger rows per customer')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "upgrade.db")}'
+        os.environ.setdefault('EXPORT_STORE_DIR', os.path.join(workdir, 'exports'))
+        os.environ.setdefault('REPORT_CACHE_DIR', os.path.join(workdir, 'report_cache'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        from sqlalchemy import inspect
+        from app import create_app, db
+        from init_db import init_database
+        from ledger import find_balance_drift
+        from migrations import MIGRATIONS, check_query_plans, current_version, upgrade
+        from models import Customer
+        from posting import post_transaction
+
+        app = create_app()
+        checks = []
+
+        def check(name, passed, **details):
+            checks.append({'check': name, 'passed': bool(passed), **details})
+
+        with app.app_context():
+            balances = create_baseline(db.engine, args.customers, args.transactions)
+
+            try:
+                applied = upgrade()
+                error = None
+            except Exception as e:  # reported as a failed check rather than a traceback
+                applied, error = [], f'{type(e).__name__}: {e}'
+            latest = MIGRATIONS[-1][0]
+            check('db-upgrade applies every migration', applied == [entry[0] for entry in MIGRATIONS],
+                  applied=applied, error=error)
+
+            init_database()
+            with db.engine.connect() as connection:
+                version = current_version(connection)
+                inspector = inspect(connection)
+                tables = set(inspector.get_table_names())
+                missing_tables = sorted(set(db.metadata.tables) - tables)
+                missing_columns = sorted(f'{table.name}.{column.name}' for table in db.metadata.sorted_tables
+                                         if table.name in tables
+                                         for column in table.columns
+                                         if column.name not in {c['name'] for c in inspector.get_columns(table.name)})
+            check('schema is at the latest version', version == latest, version=version, latest=latest)
+            check('every model table and column exists', not missing_tables and not missing_columns,
+                  missing_tables=missing_tables, missing_columns=missing_columns)
+
+            drift = find_balance_drift()
+            stored = {customer.id: customer.balance for customer in Customer.query.all()}
+            check('stored balances rebuilt from the ledger', not drift and stored == balances, drifted=len(drift))
+            check('every customer has updated_at',
+                  Customer.query.filter(Customer.updated_at.is_(None)).count() == 0)
+
+            plans = check_query_plans()
+            scans = [description for description, _, uses_index, _ in plans if not uses_index]
+            check('hot queries use their indexes', not scans, not_using_index=scans)
+
+            customer = db.session.get(Customer, 1)
+            version_before = customer.ledger_version
+            post_transaction(customer, date(2025, 7, 1), amount_paid=Decimal('500.00'))
+            db.session.expire_all()
+            customer = db.session.get(Customer, 1)
+            check('posting works on the upgraded schema',
+                  customer.balance == balances[1] + Decimal('500.00') and customer.ledger_version > version_before,
+                  balance=str(customer.balance))
+            db.engine.dispose()
+
+    print(json.dumps(checks, indent=2))
+    failed = [check for check in checks if not check['passed']]
+    for check in failed:
+        print(f'FAILED: {check["check"]}', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import csv
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError
+from accrual import run_accrual
+from init_db import init_database
+from importer import CUSTOMER_HEADERS, IMPORT_BATCH_SIZE, import_customers, import_transactions, read_rows
+from ledger import find_balance_drift, rebuild_balances
+from migrations import check_query_plans, pending_migrations, upgrade
+from replica import measure_lag, replica_configured
+from snapshots import build_snapshots
+from statements import export_statements
+
+@click.command('rebuild-balances')
+@click.option('--check', is_flag=True, help='Only report customers whose stored balance differs from the ledger.')
+@with_appcontext
+def rebuild_balances_command(check):
+    """Reconcile Customer.balance against the Transaction ledger"""
+    drift = find_balance_drift()
+    for customer_id, icl_no, stored, ledger_balance in drift:
+        click.echo(f'{icl_no} (id {customer_id}): stored {stored}, ledger {ledger_balance}')
+    click.echo(f'{len(drift)} customer(s) out of balance')
+
+    if check or not drift:
+        return
+
+    updated = rebuild_balances()
+    click.echo(f'Rebuilt balances for {updated} customer(s)')
+
+@click.command('accrue-interest')
+@click.option('--from', 'period_from', required=True, type=click.DateTime(formats=['%Y-%m-%d']), help='First day of the accrual period.')
+@click.option('--to', 'period_to', required=True, type=click.DateTime(formats=['%Y-%m-%d']), help='Day the accrual period ends (exclusive).')
+@click.option('--dry-run', is_flag=True, help='Compute and report without writing any rows.')
+@with_appcontext
+def accrue_interest_command(period_from, period_to, dry_run):
+    """Accrue interest for all active customers over one period"""
+    result = run_accrual(period_from.date(), period_to.date(), dry_run=dry_run)
+    click.echo(f"{'Would write' if dry_run else 'Wrote'} {result['rows']} interest row(s), "
+               f"skipped {result['skipped']} already accrued")
+    click.echo(f"Interest {result['total_interest']}, TDS {result['total_tds']}, net {result['total_net']}")
+    click.echo(f"{result['elapsed']:.2f}s ({result['rows_per_second']:.0f} rows/s)")
+
+@click.command('project-interest')
+@click.option('--months', default=12, show_default=True, type=click.IntRange(1, 120), help='Months to project.')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day of the projection (default: the first of next month).')
+@with_appcontext
+def project_interest_command(months, start):
+    """Project interest income and TDS for the active book month by month"""
+    from projection import project_interest  # numpy is loaded on first use
+    result = project_interest(months, start.date() if start else None)
+    for month in result['months']:
+        click.echo(f"{month['period_from']}  interest {month['interest']:>16}  TDS {month['tds']:>14}  "
+                   f"net {month['net']:>16}  ({month['facilities']} accruing, {month['ending']} ending)")
+    click.echo(f"Total interest {result['total_interest']}, TDS {result['total_tds']}, net {result['total_net']}")
+    click.echo(f"{result['customers']} customer(s) in {result['elapsed']:.2f}s")
+
+@click.command('init-db')
+@click.option('--no-seed', is_flag=True, help='Only create tables and apply migrations; skip the default users and rates.')
+@with_appcontext
+def init_db_command(no_seed):
+    """Create the schema, apply pending migrations and seed default users and rates"""
+    init_database(seed=not no_seed)
+    click.echo('Database initialized' + (' (no seed data)' if no_seed else ''))
+
+@click.command('db-upgrade')
+@click.option('--check', is_flag=True, help='Only list pending migrations.')
+@with_appcontext
+def db_upgrade_command(check):
+    """Apply pending schema migrations to the configured database"""
+    pending = pending_migrations()
+    for version, description, _ in pending:
+        click.echo(f'{version}: {description}')
+    if check:
+        click.echo(f'{len(pending)} pending migration(s)')
+        return
+
+    applied = upgrade()
+    click.echo(f'Applied {len(applied)} migration(s)')
+
+@click.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the full plan for every query.')
+@with_appcontext
+def check_query_plans_command(verbose):
+    """Check that the hot queries are planned with their indexes"""
+    failures = 0
+    for description, index_name, uses_index, plan in check_query_plans():
+        click.echo(f"{'ok  ' if uses_index else 'SCAN'} {description} ({index_name})")
+        if verbose or not uses_index:
+            for line in plan:
+                click.echo(f'       {line}')
+        failures += not uses_index
+    if failures:
+        raise click.ClickException(f'{failures} hot query(ies) not using their index; run flask db-upgrade')
+
+@click.command('replica-status')
+@with_appcontext
+def replica_status_command():
+    """Report how far the read replica is behind and whether reads are sent to it"""
+    if not replica_configured():
+        click.echo('No read replica configured; set DATABASE_REPLICA_URL')
+        return
+    try:
+        lag = measure_lag()
+    except DBAPIError as e:
+        raise click.ClickException(f'Read replica unavailable, reads go to the primary: {e.orig}')
+    max_lag = current_app.config['REPLICA_MAX_LAG']
+    click.echo(f'Replica ledger lag {lag:.1f}s (max {max_lag:g}s): '
+               + ('serving reads' if lag <= max_lag else 'too far behind, reads go to the primary'))
+
+@click.command('import-transactions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--errors', 'error_path', type=click.Path(dir_okay=False), help='Where to write rejected rows (default: PATH.errors.csv).')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows inserted per commit.')
+@with_appcontext
+def import_transactions_command(path, error_path, batch_size):
+    """Bulk import ledger rows from a CSV or XLSX file"""
+    def progress(info):
+        click.echo(f"{info['stage']}: {info['rows_read']} read, {info['rows_inserted']} inserted, "
+                   f"{info['errors']} rejected ({info['rows_per_second']} rows/s)")
+
+    error_path = error_path or f'{path}.errors.csv'
+    result = import_transactions(path, error_path=error_path, batch_size=batch_size, progress=progress)
+    click.echo(f"Imported {result['rows_inserted']} of {result['rows_read']} row(s) for {result['customers']} customer(s) "
+               f"in {result['elapsed']:.2f}s ({result['rows_per_second']} rows/s)")
+    if result['errors']:
+        click.echo(f"{result['errors']} row(s) rejected, see {error_path}")
+
+@click.command('import-customers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--results', 'results_path', type=click.Path(dir_okay=False), help='Where to write the per-row results (default: PATH.results.csv).')
+@with_appcontext
+def import_customers_command(path, results_path):
+    """Bulk create customers from a CSV or XLSX file"""
+    result = import_customers(read_rows(path, CUSTOMER_HEADERS))
+    results_path = results_path or f'{path}.results.csv'
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'icl_no', 'status', 'id', 'error'])
+        for r in result['results']:
+            writer.writerow([r['row'], r['icl_no'] or '', r['status'], r.get('id', ''), r.get('error', '')])
+    click.echo(f"Created {result['created']} customer(s), rejected {result['errors']} "
+               f"in {result['elapsed']:.2f}s ({result['rows_per_second']} rows/s); results in {results_path}")
+
+@click.command('build-snapshots')
+@click.option('--full', is_flag=True, help='Rebuild every month instead of only those with new or back-dated rows.')
+@with_appcontext
+def build_snapshots_command(full):
+    """Bring the monthly customer snapshots up to date"""
+    result = build_snapshots(full=full)
+    click.echo(f"{'Rebuilt' if result['full'] else 'Updated'} {result['months']} month(s) for "
+               f"{result['customers']} customer(s) in {result['elapsed']:.2f}s")
+
+@click.command('export-statements')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--all', 'include_inactive', is_flag=True, help='Include deactivated customers.')
+@click.option('--interest-type', type=click.Choice(['simple', 'compound']), help='Only customers with this interest type.')
+@click.option('--tds/--no-tds', default=None, help='Only customers with (or without) TDS applicable.')
+@click.option('--icl-prefix', help='Only customers whose ICL number starts with this.')
+@click.option('--workers', type=int, help='Worker processes (default: one per CPU).')
+@with_appcontext
+def export_statements_command(path, include_inactive, interest_type, tds, icl_prefix, workers):
+    """Write every matching customer's statement into one ZIP file"""
+    def progress(info):
+        click.echo(f"{info['done']}/{info['total']} statements ({info['cached']} from cache, "
+                   f"{info['statements_per_second']}/s)")
+
+    filters = {'status': 'all' if include_inactive else 'active', 'interest_type': interest_type,
+               'tds_applicable': tds, 'icl_prefix': icl_prefix}
+    result = export_statements(path, filters, workers=workers, progress=progress)
+    click.echo(f"Wrote {result['statements']} statement(s) to {path} in {result['elapsed']:.2f}s "
+               f"({result['statements_per_second']}/s)")
+
+def init_app(app):
+    """Register maintenance commands on the Flask CLI"""
+    app.cli.add_command(rebuild_balances_command)
+    app.cli.add_command(accrue_interest_command)
+    app.cli.add_command(project_interest_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(import_transactions_command)
+    app.cli.add_command(import_customers_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(replica_status_command)
+    app.cli.add_command(build_snapshots_command)
+    app.cli.add_command(export_statements_command)
@@ -0,0 +1,146 @@
+"""Compound interest on a schedule anchored at Customer.first_compounding_date.
+
+Interest accrues daily at annual_rate / 365 on the ledger balance plus all
+interest capitalized so far. Accrued interest is capitalized (rounded to
+the paisa) on the first compounding date and on every compounding boundary
+after it, one compounding period apart. Interest for a period is the
+interest that accrued during it.
+
+A schedule keeps a checkpoint per boundary it has passed, so asking for a
+later period only computes the boundaries since the last checkpoint, and a
+new ledger row only discards checkpoints on or after its date.
+"""
+import calendar
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from timeline import balance_timelines, load_timelines
+
+MONTHS_PER_PERIOD = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+DAILY_RATE_DIVISOR = Decimal('36500')  # percent per year -> fraction per day
+TIMELINE_CHUNK_SIZE = 500
+
+def add_months(anchor, months):
+    """anchor moved by a number of months, clamped to the end of shorter months"""
+    month_index = anchor.month - 1 + months
+    year, month = anchor.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+def uses_schedule(customer):
+    """Whether a customer's compound interest follows a first_compounding_date schedule"""
+    return customer.interest_type == 'compound' and customer.first_compounding_date is not None
+
+class CompoundingSchedule:
+    """Capitalization checkpoints for one customer over a BalanceTimeline"""
+
+    def __init__(self, timeline, first_compounding_date, annual_rate, compound_frequency):
+        self.timeline = timeline
+        self.anchor = first_compounding_date
+        self.months = MONTHS_PER_PERIOD.get(compound_frequency, 12)
+        self.rate = Decimal(str(annual_rate or 0))
+        self.boundaries = []
+        self.capitalized = []
+        self._lock = threading.Lock()
+
+    def _interest_since(self, start, capitalized, end):
+        """Uncapitalized interest accrued over [start, end) on the ledger balance plus capitalized"""
+        balance_days = self.timeline.balance_days(start, end) + capitalized * (end - start).days
+        return balance_days * self.rate / DAILY_RATE_DIVISOR
+
+    def _last_checkpoint(self):
+        if self.boundaries:
+            return self.boundaries[-1], self.capitalized[-1]
+        return date.min, Decimal('0')
+
+    def _extend_to(self, on_date):
+        boundary = add_months(self.anchor, self.months * len(self.boundaries))
+        while boundary <= on_date:
+            start, capitalized = self._last_checkpoint()
+            interest = self._interest_since(start, capitalized, boundary).quantize(Decimal('0.01'))
+            self.boundaries.append(boundary)
+            self.capitalized.append(capitalized + interest)
+            boundary = add_months(self.anchor, self.months * len(self.boundaries))
+
+    def accrued(self, on_date):
+        """Total interest accrued before on_date, capitalized or not"""
+        with self._lock:
+            self._extend_to(on_date)
+            index = bisect_right(self.boundaries, on_date) - 1
+            if index < 0:
+                start, capitalized = date.min, Decimal('0')
+            else:
+                start, capitalized = self.boundaries[index], self.capitalized[index]
+        return capitalized + self._interest_since(start, capitalized, on_date)
+
+    def interest(self, period_from, period_to):
+        """Interest accrued over [period_from, period_to)"""
+        return (self.accrued(period_to) - self.accrued(period_from)).quantize(Decimal('0.01'))
+
+    def ledger_changed(self, change_date):
+        """Drop checkpoints that a ledger change on change_date affects"""
+        with self._lock:
+            keep = bisect_right(self.boundaries, change_date)
+            del self.boundaries[keep:]
+            del self.capitalized[keep:]
+
+def load_schedules(customers):
+    """{customer_id: CompoundingSchedule} built from the whole ledger, for batch jobs that bypass the cache"""
+    schedules = {}
+    for start in range(0, len(customers), TIMELINE_CHUNK_SIZE):
+        chunk = customers[start:start + TIMELINE_CHUNK_SIZE]
+        timelines = load_timelines([customer.id for customer in chunk])
+        for customer in chunk:
+            schedules[customer.id] = CompoundingSchedule(timelines[customer.id], customer.first_compounding_date,
+                                                         customer.annual_rate, customer.compound_frequency)
+    return schedules
+
+class ScheduleCache:
+    """In-process LRU of compounding schedules, kept in step with balance_timelines.
+
+    An entry is reused while the customer's ledger_version and cached
+    timeline are unchanged; edit_customer bumps the version, so changed
+    terms always build a fresh schedule.
+    """
+
+    def __init__(self, max_customers=10000):
+        self.max_customers = max_customers
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, customer):
+        timeline = balance_timelines.get(customer)
+        with self._lock:
+            entry = self._entries.get(customer.id)
+            if entry and entry[0] == customer.ledger_version and entry[1].timeline is timeline:
+                self._entries.move_to_end(customer.id)
+                return entry[1]
+
+            schedule = CompoundingSchedule(timeline, customer.first_compounding_date,
+                                           customer.annual_rate, customer.compound_frequency)
+            self._entries[customer.id] = (customer.ledger_version, schedule)
+            self._entries.move_to_end(customer.id)
+            while len(self._entries) > self.max_customers:
+                self._entries.popitem(last=False)
+        return schedule
+
+    def record(self, customer_id, change_date, amount):
+        """Follow a committed ledger row that balance_timelines has applied"""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry:
+                version, schedule = entry
+                if amount:
+                    schedule.ledger_changed(change_date)
+                self._entries[customer_id] = (version + 1, schedule)
+
+    def invalidate(self, customer_id=None):
+        with self._lock:
+            if customer_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(customer_id, None)
+
+compounding_schedules = ScheduleCache()
+balance_timelines.listeners.append(compounding_schedules.record)
@@ -0,0 +1,80 @@
+"""Configuration profiles for create_app().
+
+The profile is chosen with APP_CONFIG (production, development or testing;
+default production). Every setting can still be overridden through its
+environment variable. Paths left as None default to folders under the app
+instance folder.
+"""
+import os
+
+class Config:
+    SECRET_KEY = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+
+    # configure the database, relative to the app instance folder
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///loan_management.db")
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+    # optional read replica for reports, exports, the dashboard and profile pages (see replica.py); reads
+    # use it only while it is at most REPLICA_MAX_LAG seconds behind, measured every REPLICA_CHECK_INTERVAL
+    SQLALCHEMY_REPLICA_URI = os.environ.get("DATABASE_REPLICA_URL")
+    REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 30))
+    REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", 5))
+
+    # background export jobs and their on-disk result store
+    EXPORT_STORE_DIR = os.environ.get("EXPORT_STORE_DIR")
+    EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+    EXPORT_RESULT_TTL = int(os.environ.get("EXPORT_RESULT_TTL", 24 * 3600))
+    EXPORT_JOB_STALE_AFTER = int(os.environ.get("EXPORT_JOB_STALE_AFTER", 3600))
+
+    # rendered customer reports, cached on disk per ledger version with LRU eviction past the size limit
+    REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR")
+    REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+    # worker processes for batch statement exports (default: one per CPU)
+    STATEMENT_WORKERS = int(os.environ.get("STATEMENT_WORKERS", 0)) or None
+
+    # seconds a signed-in user is served from the in-process cache before being re-read
+    USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+
+    # seconds between checks of the shared rate-table version; rate changes reach other workers within this
+    RATE_CACHE_CHECK_INTERVAL = float(os.environ.get("RATE_CACHE_CHECK_INTERVAL", 5))
+
+    # seconds between checks for changes made by other workers, pushed to open pages over /api/live (see live.py)
+    LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", 2))
+
+    # seconds a SQLite writer waits for the database lock before giving up (see sqlite_setup.py)
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 10))
+
+    # request/SQL instrumentation: slow-query log threshold and sampled profiling (see instrumentation.py)
+    SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 0.5))
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_ENDPOINTS = os.environ.get("PROFILE_ENDPOINTS", "")
+    PROFILER = os.environ.get("PROFILER", "cprofile")
+    PROFILE_DIR = os.environ.get("PROFILE_DIR")
+
+    # create tables, apply migrations and seed default users when the app starts; in production
+    # this is left to `flask init-db` / `flask db-upgrade` so workers start without touching the database
+    INIT_DB_ON_STARTUP = os.environ.get("INIT_DB_ON_STARTUP", "0") == "1"
+
+class ProductionConfig(Config):
+    pass
+
+class DevelopmentConfig(Config):
+    INIT_DB_ON_STARTUP = os.environ.get("INIT_DB_ON_STARTUP", "1") == "1"
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite://")
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    USER_CACHE_TTL = 0
+    RATE_CACHE_CHECK_INTERVAL = 0
+    INIT_DB_ON_STARTUP = True
+
+configs = {
+    "production": ProductionConfig,
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+}
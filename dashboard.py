@@ -0,0 +1,28 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from app import db
+from models import Customer, Transaction
+
+RECENT_TRANSACTIONS = 5
+
+def get_portfolio_summary():
+    """Active customer count and total outstanding balance in one aggregate query"""
+    total_customers, total_balance = db.session.execute(
+        select(func.count(Customer.id), func.coalesce(func.sum(Customer.balance), 0))
+        .where(Customer.is_active.is_(True))
+    ).one()
+    return {
+        'total_customers': total_customers,
+        'total_balance': float(total_balance),
+    }
+
+def get_customer_balances():
+    """Active customers with their stored balances; the dashboard template lists them all, so there is no pager"""
+    return db.session.execute(
+        select(Customer).where(Customer.is_active.is_(True)).order_by(Customer.icl_no)
+    ).scalars().all()
+
+def get_recent_transactions(limit=RECENT_TRANSACTIONS):
+    """Latest ledger rows with their customer loaded in the same query"""
+    return Transaction.query.options(joinedload(Transaction.customer)) \
+        .order_by(Transaction.created_at.desc()).limit(limit).all()
@@ -1,3 +1,3 @@
 #!/bin/sh
 source .venv/bin/activate
-python -u -m flask --app main run -p $PORT --debug
\ No newline at end of file
+APP_CONFIG=${APP_CONFIG:-development} python -u -m flask --app main run -p $PORT --debug
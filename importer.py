@@ -0,0 +1,434 @@
+"""Bulk import of ledger rows and customers from CSV or XLSX files.
+
+Rows are streamed from the file and validated in chunks, with customer
+lookups done as one set-based query per chunk. Every batch of valid rows
+is then posted per customer in date order, computing each row's running
+balance and period interest the same way a single posting does, and
+written with one executemany insert and committed. Customer imports (which also take a JSON
+list) check each batch's ICL numbers with one IN query before inserting.
+"""
+import csv
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, select
+from app import db
+from models import Customer, Transaction
+from ledger import apply_ledger_deltas, balance_delta
+from posting import timeline_interest, tds_on
+from timeline import load_timelines
+from compounding import CompoundingSchedule, uses_schedule
+
+IMPORT_BATCH_SIZE = 5000
+VALIDATION_CHUNK_SIZE = 1000
+TIMELINE_CHUNK_SIZE = 500
+PROGRESS_EVERY = 10000
+IMPORT_DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+# Header spellings accepted for each field, including the period report's own headers
+TRANSACTION_HEADERS = {
+    'icl_no': ('icl_no', 'icl', 'customer_icl'),
+    'date': ('date', 'transaction_date'),
+    'amount_paid': ('amount_paid', 'paid'),
+    'amount_repaid': ('amount_repaid', 'repaid'),
+    'period_from': ('period_from', 'from'),
+    'period_to': ('period_to', 'to'),
+}
+
+class RowError(ValueError):
+    pass
+
+def _header_key(header):
+    return str(header or '').strip().lower().replace('.', '').replace(' ', '_')
+
+def _field_map(headers, fields):
+    """Map each known field to its column index in headers"""
+    keys = [_header_key(header) for header in headers]
+    columns = {}
+    for field, spellings in fields.items():
+        for spelling in spellings:
+            if spelling in keys:
+                columns[field] = keys.index(spelling)
+                break
+    return columns
+
+def read_rows(path, fields, file_format=None):
+    """Yield (line number, {field: raw value}) for each data row of a CSV or XLSX file"""
+    file_format = (file_format or os.path.splitext(path)[1].lstrip('.')).lower()
+    if file_format == 'xlsx':
+        from openpyxl import load_workbook  # only needed for .xlsx uploads
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            yield from _rows_to_records(rows, fields)
+        finally:
+            workbook.close()
+    elif file_format == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from _rows_to_records(csv.reader(f), fields)
+    else:
+        raise ValueError(f'Unsupported import format: {file_format or "unknown"} (use CSV or XLSX)')
+
+def _rows_to_records(rows, fields):
+    headers = next(rows, None)
+    if headers is None:
+        return
+    columns = _field_map(headers, fields)
+    for line_no, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield line_no, {field: row[index] if index < len(row) else None for field, index in columns.items()}
+
+def parse_date(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for date_format in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    raise RowError(f'{field} is not a valid date: {value}')
+
+def parse_amount(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        amount = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise RowError(f'{field} is not a valid amount: {value}')
+    if not amount.is_finite() or amount < 0:
+        raise RowError(f'{field} must be a positive amount')
+    return amount.quantize(Decimal('0.01'))
+
+def parse_transaction(record):
+    """(icl_no, date, paid, repaid, period_from, period_to) from a raw import record"""
+    icl_no = str(record.get('icl_no') or '').strip()
+    if not icl_no:
+        raise RowError('icl_no is required')
+    transaction_date = parse_date(record.get('date'), 'date', required=True)
+    amount_paid = parse_amount(record.get('amount_paid'), 'amount_paid')
+    amount_repaid = parse_amount(record.get('amount_repaid'), 'amount_repaid')
+    period_from = parse_date(record.get('period_from'), 'period_from')
+    period_to = parse_date(record.get('period_to'), 'period_to')
+    if bool(period_from) != bool(period_to):
+        raise RowError('period_from and period_to must be given together')
+    if period_from and period_to <= period_from:
+        raise RowError('period_to must be after period_from')
+    if not amount_paid and not amount_repaid and not period_from:
+        raise RowError('row has no amount and no interest period')
+    return icl_no, transaction_date, amount_paid, amount_repaid, period_from, period_to
+
+def _lookup_customers(icl_nos):
+    """{icl_no: customer row} for the given ICL numbers from one IN query"""
+    rows = db.session.execute(
+        select(Customer.id, Customer.icl_no, Customer.annual_rate, Customer.interest_type,
+               Customer.compound_frequency, Customer.first_compounding_date, Customer.tds_applicable)
+        .where(Customer.icl_no.in_(icl_nos))
+    ).all()
+    return {row.icl_no: row for row in rows}
+
+class ErrorLog:
+    """Per-row import errors written as CSV (line, icl_no, error)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', newline='') if path else None
+        self._writer = csv.writer(self._file) if self._file else None
+        if self._writer:
+            self._writer.writerow(['line', 'icl_no', 'error'])
+
+    def add(self, line_no, icl_no, message):
+        self.count += 1
+        if self._writer:
+            self._writer.writerow([line_no, icl_no or '', message])
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def import_transactions(path, file_format=None, error_path=None, user_id=None,
+                        batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Import ledger rows from a CSV/XLSX file; returns a summary dict.
+
+    Each batch of batch_size valid rows is written and committed on its
+    own as soon as it is full, so memory stays bounded and an interrupted
+    import keeps the batches already written. Rows that fail validation
+    are skipped and listed in the error file.
+    """
+    started = time.perf_counter()
+    errors = ErrorLog(error_path)
+    stats = {'rows_read': 0, 'rows_inserted': 0}
+
+    def report(stage):
+        if progress:
+            elapsed = time.perf_counter() - started
+            progress({'stage': stage, 'rows_read': stats['rows_read'], 'rows_inserted': stats['rows_inserted'],
+                      'errors': errors.count, 'elapsed': round(elapsed, 2),
+                      'rows_per_second': round(stats['rows_read'] / elapsed) if elapsed else 0})
+
+    customers = {}
+    pending = []  # (customer row, line_no, parsed) validated but not yet written
+    timelines = {}  # loaded once per customer, then kept current with each batch's rows
+    deltas = defaultdict(Decimal)
+
+    def write_pending():
+        # posted per customer in (date, line) order, each row's balance running on from the ledger as it
+        # stands (earlier batches included), which is what posting.py computes for a single row
+        by_customer = defaultdict(list)
+        for customer, line_no, parsed in pending:
+            by_customer[customer.id].append((parsed[1], line_no, customer, parsed))
+        pending.clear()
+
+        unloaded = sorted(by_customer.keys() - timelines.keys())
+        for start in range(0, len(unloaded), TIMELINE_CHUNK_SIZE):
+            timelines.update(load_timelines(unloaded[start:start + TIMELINE_CHUNK_SIZE]))
+
+        rows = []
+        for customer_id in sorted(by_customer):
+            entries = sorted(by_customer.pop(customer_id), key=lambda entry: entry[:2])
+            customer = entries[0][2]
+            timeline = timelines[customer_id]
+            running = timeline.balance_on(date.max)
+            schedule = CompoundingSchedule(timeline, customer.first_compounding_date, customer.annual_rate,
+                                           customer.compound_frequency) if uses_schedule(customer) else None
+            for _, _, _, (_, transaction_date, amount_paid, amount_repaid, period_from, period_to) in entries:
+                delta = balance_delta(amount_paid, amount_repaid)
+                deltas[customer_id] += delta  # registered even when zero, so ledger_version moves
+                running += delta
+                if delta:
+                    timeline.insert(transaction_date, delta)
+                    if schedule:
+                        schedule.ledger_changed(transaction_date)
+
+                int_amount = tds_amount = net_amount = no_of_days = None
+                if period_from:
+                    no_of_days = (period_to - period_from).days
+                    if schedule:
+                        int_amount = schedule.interest(period_from, period_to)
+                    else:
+                        int_amount = timeline_interest(timeline, period_from, period_to, customer.annual_rate,
+                                                       customer.interest_type, customer.compound_frequency)
+                    tds_amount = tds_on(customer, int_amount, period_to)
+                    net_amount = int_amount - tds_amount
+
+                rows.append({
+                    'customer_id': customer_id,
+                    'date': transaction_date,
+                    'amount_paid': amount_paid,
+                    'amount_repaid': amount_repaid,
+                    'balance': running,
+                    'period_from': period_from,
+                    'period_to': period_to,
+                    'no_of_days': no_of_days,
+                    'int_rate': customer.annual_rate,
+                    'int_amount': int_amount,
+                    'tds_amount': tds_amount,
+                    'net_amount': net_amount,
+                    'created_by': user_id,
+                })
+
+        # stamped as each batch is written, so a long import cannot slip behind a snapshot watermark
+        now = datetime.utcnow()
+        db.session.execute(insert(Transaction), [dict(row, created_at=now) for row in rows])
+        apply_ledger_deltas(deltas)
+        db.session.commit()
+        stats['rows_inserted'] += len(rows)
+        deltas.clear()
+        report('inserting')
+
+    def validate_chunk(chunk):
+        unknown = {parsed[0] for _, parsed in chunk} - customers.keys()
+        if unknown:
+            customers.update(_lookup_customers(unknown))
+        for line_no, parsed in chunk:
+            customer = customers.get(parsed[0])
+            if customer is None:
+                errors.add(line_no, parsed[0], 'unknown icl_no')
+                continue
+            pending.append((customer, line_no, parsed))
+            if len(pending) >= batch_size:
+                write_pending()
+
+    try:
+        chunk = []
+        for line_no, record in read_rows(path, TRANSACTION_HEADERS, file_format):
+            stats['rows_read'] += 1
+            try:
+                chunk.append((line_no, parse_transaction(record)))
+            except RowError as e:
+                errors.add(line_no, record.get('icl_no'), str(e))
+            if len(chunk) >= VALIDATION_CHUNK_SIZE:
+                validate_chunk(chunk)
+                chunk = []
+            if stats['rows_read'] % PROGRESS_EVERY == 0:
+                report('validating')
+        if chunk:
+            validate_chunk(chunk)
+        report('validating')
+        if pending:
+            write_pending()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        errors.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows_read': stats['rows_read'],
+        'rows_inserted': stats['rows_inserted'],
+        'errors': errors.count,
+        'customers': len(customers),
+        'elapsed': round(elapsed, 2),
+        'rows_per_second': round(stats['rows_read'] / elapsed) if elapsed else 0,
+        'error_file': error_path,
+    }
+
+CUSTOMER_BATCH_SIZE = 1000
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+# Header spellings for customer imports; JSON items use the API's camelCase keys, which normalize to the second spelling
+CUSTOMER_HEADERS = {
+    'icl_no': ('icl_no', 'iclno', 'icl'),
+    'name': ('name', 'customername', 'customer_name'),
+    'address': ('address', 'customeraddress', 'customer_address'),
+    'contact_details': ('contact_details', 'contactdetails'),
+    'annual_rate': ('annual_rate', 'annualrate', 'rate'),
+    'icl_start_date': ('icl_start_date', 'iclstartdate', 'start_date'),
+    'icl_end_date': ('icl_end_date', 'iclenddate', 'end_date'),
+    'icl_extension': ('icl_extension', 'iclextension'),
+    'tds_applicable': ('tds_applicable', 'tdsapplicable', 'tds'),
+    'interest_type': ('interest_type', 'interesttype'),
+    'compound_frequency': ('compound_frequency', 'compoundfrequency'),
+    'first_compounding_date': ('first_compounding_date', 'firstcompoundingdate'),
+}
+
+def records_from_json(items, fields):
+    """Yield (item number, {field: raw value}) for a list of JSON objects"""
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            yield number, {}
+            continue
+        columns = _field_map(item.keys(), fields)
+        keys = list(item.keys())
+        yield number, {field: item[keys[index]] for field, index in columns.items()}
+
+def _text(value):
+    return str(value).strip() if value not in (None, '') else None
+
+def parse_customer(record):
+    """Customer column values from a raw import record"""
+    icl_no = _text(record.get('icl_no'))
+    name = _text(record.get('name'))
+    if not icl_no or not name:
+        raise RowError('icl_no and name are required')
+    try:
+        annual_rate = Decimal(str(record.get('annual_rate')).strip())
+    except InvalidOperation:
+        raise RowError('annual_rate must be a number')
+    if not annual_rate.is_finite() or not 0 <= annual_rate < 1000:
+        raise RowError('annual_rate must be a percentage between 0 and 999.99')
+
+    interest_type = (_text(record.get('interest_type')) or 'simple').lower()
+    if interest_type not in ('simple', 'compound'):
+        raise RowError('interest_type must be simple or compound')
+    compound_frequency = (_text(record.get('compound_frequency')) or '').lower() if interest_type == 'compound' else ''
+    if interest_type == 'compound' and compound_frequency not in ('monthly', 'quarterly', 'yearly'):
+        raise RowError('compound_frequency must be monthly, quarterly or yearly')
+
+    tds_applicable = record.get('tds_applicable')
+    if not isinstance(tds_applicable, bool):
+        tds_applicable = str(tds_applicable or '').strip().lower() in TRUE_VALUES
+
+    return {
+        'icl_no': icl_no,
+        'name': name,
+        'address': _text(record.get('address')),
+        'contact_details': _text(record.get('contact_details')),
+        'annual_rate': annual_rate.quantize(Decimal('0.01')),
+        'icl_start_date': parse_date(record.get('icl_start_date'), 'icl_start_date') or date.today(),
+        'icl_end_date': parse_date(record.get('icl_end_date'), 'icl_end_date'),
+        'icl_extension': _text(record.get('icl_extension')),
+        'tds_applicable': tds_applicable,
+        'interest_type': interest_type,
+        'compound_frequency': compound_frequency,
+        'first_compounding_date': parse_date(record.get('first_compounding_date'), 'first_compounding_date'),
+    }
+
+def _existing_icl_nos(icl_nos):
+    return set(db.session.execute(select(Customer.icl_no).where(Customer.icl_no.in_(icl_nos))).scalars())
+
+def import_customers(records, user_id=None, batch_size=CUSTOMER_BATCH_SIZE):
+    """Create customers from (row number, raw record) pairs; returns a summary with a result per row.
+
+    Each batch is checked against existing ICL numbers with one IN query
+    on the unique icl_no index and inserted with one executemany, so the
+    cost per batch does not grow with the number of customers on file.
+    """
+    started = time.perf_counter()
+    results = []
+    seen = set()
+    batch = []
+    created = 0
+    now = datetime.utcnow()
+
+    def flush():
+        nonlocal created
+        existing = _existing_icl_nos([values['icl_no'] for _, values in batch])
+        rows = []
+        for row_no, values in batch:
+            if values['icl_no'] in existing:
+                results.append({'row': row_no, 'icl_no': values['icl_no'], 'status': 'error',
+                                'error': f"ICL No {values['icl_no']} already exists"})
+            else:
+                rows.append((row_no, values))
+        if rows:
+            inserted = db.session.execute(
+                insert(Customer).returning(Customer.id, sort_by_parameter_order=True),
+                [dict(values, created_at=now, created_by=user_id, is_active=True) for _, values in rows]
+            ).scalars().all()
+            db.session.commit()
+            created += len(rows)
+            for (row_no, values), customer_id in zip(rows, inserted):
+                results.append({'row': row_no, 'icl_no': values['icl_no'], 'status': 'created', 'id': customer_id})
+        batch.clear()
+
+    try:
+        for row_no, record in records:
+            try:
+                values = parse_customer(record)
+            except RowError as e:
+                results.append({'row': row_no, 'icl_no': _text(record.get('icl_no')), 'status': 'error', 'error': str(e)})
+                continue
+            if values['icl_no'] in seen:
+                results.append({'row': row_no, 'icl_no': values['icl_no'], 'status': 'error',
+                                'error': f"ICL No {values['icl_no']} appears more than once"})
+                continue
+            seen.add(values['icl_no'])
+            batch.append((row_no, values))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    results.sort(key=lambda result: result['row'])
+    elapsed = time.perf_counter() - started
+    return {
+        'created': created,
+        'errors': len(results) - created,
+        'elapsed': round(elapsed, 2),
+        'rows_per_second': round(len(results) / elapsed) if elapsed else 0,
+        'results': results,
+    }
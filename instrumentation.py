@@ -0,0 +1,198 @@
+"""Per-request timing, SQL query accounting and sampled profiling.
+
+Every request records its wall time, the number of SQL statements it ran
+and the time spent in them, aggregated per endpoint and exposed in
+Prometheus text format (routes.metrics). Statements slower than
+SLOW_QUERY_SECONDS are logged with their SQL. With PROFILE_SAMPLE_RATE
+above zero, that fraction of requests is profiled with cProfile (or
+pyinstrument, if installed and selected) and dumped to PROFILE_DIR.
+
+Metrics are kept per process; each worker reports its own counters.
+"""
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+BACKGROUND = '<background>'
+MAX_LOGGED_STATEMENT = 2000
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+class RequestMetrics:
+    """Thread-safe per-endpoint counters rendered as Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+            self.query_counts = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+            self.sql_queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.slow_queries = defaultdict(int)
+
+    def record_request(self, endpoint, method, status, seconds, queries):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            self.durations[endpoint].observe(seconds)
+            self.query_counts[endpoint].observe(queries)
+
+    def record_query(self, endpoint, seconds, slow):
+        with self._lock:
+            self.sql_queries[endpoint] += 1
+            self.sql_seconds[endpoint] += seconds
+            if slow:
+                self.slow_queries[endpoint] += 1
+
+    def render_prometheus(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, histograms):
+            for endpoint, h in sorted(histograms.items()):
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f'{name}_bucket{{endpoint="{_label(endpoint)}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{_label(endpoint)}",le="+Inf"}} {h.total}')
+                lines.append(f'{name}_sum{{endpoint="{_label(endpoint)}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{endpoint="{_label(endpoint)}"}} {h.total}')
+
+        def counter(name, values, fmt='{}'):
+            for endpoint, value in sorted(values.items()):
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {fmt.format(value)}')
+
+        with self._lock:
+            family('loanapp_requests_total', 'counter', 'Requests handled by endpoint, method and status.')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'loanapp_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}')
+            family('loanapp_request_duration_seconds', 'histogram', 'Request wall time.')
+            histogram('loanapp_request_duration_seconds', self.durations)
+            family('loanapp_request_sql_queries', 'histogram', 'SQL statements executed per request.')
+            histogram('loanapp_request_sql_queries', self.query_counts)
+            family('loanapp_sql_queries_total', 'counter', 'SQL statements executed, by endpoint.')
+            counter('loanapp_sql_queries_total', self.sql_queries)
+            family('loanapp_sql_seconds_total', 'counter', 'Time spent executing SQL, by endpoint.')
+            counter('loanapp_sql_seconds_total', self.sql_seconds, '{:.6f}')
+            family('loanapp_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_SECONDS.')
+            counter('loanapp_slow_queries_total', self.slow_queries)
+        return '\n'.join(lines) + '\n'
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+metrics = RequestMetrics()
+_config = {'slow_query_seconds': 0.5}
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return BACKGROUND
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    slow = elapsed >= _config['slow_query_seconds']
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+    metrics.record_query(_current_endpoint(), elapsed, slow)
+    if slow:
+        logger.warning('Slow query (%.3fs) in %s: %s', elapsed, _current_endpoint(),
+                       ' '.join(statement.split())[:MAX_LOGGED_STATEMENT])
+
+def _start_profiler(app):
+    if app.config['PROFILER'] == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning('PROFILER=pyinstrument but pyinstrument is not installed; using cProfile')
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def _dump_profile(app, profiler, endpoint):
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    stem = os.path.join(app.config['PROFILE_DIR'], f'{endpoint}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}')
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(f'{stem}.prof')
+    else:
+        profiler.stop()
+        with open(f'{stem}.html', 'w') as f:
+            f.write(profiler.output_html())
+
+def init_app(app):
+    """Hook request timing, SQL accounting and sampled profiling into the app"""
+    _config['slow_query_seconds'] = app.config['SLOW_QUERY_SECONDS']
+    profile_endpoints = {name.strip() for name in app.config['PROFILE_ENDPOINTS'].split(',') if name.strip()}
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+        rate = app.config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate and (not profile_endpoints or request.endpoint in profile_endpoints):
+            g.profiler = _start_profiler(app)
+
+    @app.after_request
+    def add_server_timing(response):
+        if 'request_started' in g:
+            g.response_status = response.status_code
+            elapsed = time.perf_counter() - g.request_started
+            response.headers['Server-Timing'] = (f'app;dur={elapsed * 1000:.1f}, '
+                                                 f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_queries} queries"')
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        # pop so a context torn down twice (the test client preserves contexts) is counted once
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - started
+        metrics.record_request(endpoint, request.method, g.get('response_status', 500),
+                               elapsed, g.sql_queries)
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            try:
+                _dump_profile(app, profiler, endpoint)
+            except Exception:
+                logger.exception('Could not write profile for %s', endpoint)
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from sqlalchemy import func, select
+from app import db
+from models import Customer, Transaction
+from importer import import_transactions
+from utils import export_to_excel, stream_period_report
+from statements import export_statements
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ARTIFACT_MIMETYPES = {
+    'xlsx': XLSX_MIMETYPE,
+    'zip': 'application/zip',
+    'csv': 'text/csv',
+}
+
+class ExportJobQueue:
+    """Runs report builds on a local thread pool and keeps the results on disk.
+
+    A job id is derived from (report kind, parameters, data version), so a
+    repeated request for unchanged data resolves to the artifact that is
+    already in the store. Job metadata lives next to the artifact as JSON,
+    which lets any worker process on the host answer status and download
+    requests.
+    """
+
+    def __init__(self, app=None):
+        self.builders = {}
+        self.store_dir = None
+        self.result_ttl = None
+        self.stale_after = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.store_dir = app.config['EXPORT_STORE_DIR']
+        self.result_ttl = app.config['EXPORT_RESULT_TTL']
+        self.stale_after = app.config['EXPORT_JOB_STALE_AFTER']
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=app.config['EXPORT_WORKERS'],
+                                            thread_name_prefix='export')
+
+    def builder(self, kind, extension='xlsx', progress=False):
+        """Register the function that writes a report of this kind to a path.
+
+        The artifact is stored (and served) with the given file extension,
+        one of ARTIFACT_MIMETYPES. A dict returned by the builder is kept as
+        the job's result. With
+        progress=True the builder also gets a progress(dict) callback whose
+        latest value is published in the job status.
+        """
+        def decorator(f):
+            self.builders[kind] = (f, progress, extension)
+            return f
+        return decorator
+
+    @staticmethod
+    def job_id(kind, params, version):
+        key = json.dumps([kind, params, version], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.store_dir, f'{job_id}.json')
+
+    def artifact_path(self, job_id, extension='xlsx'):
+        return os.path.join(self.store_dir, f'{job_id}.{extension}')
+
+    def _write_meta(self, meta):
+        tmp_path = f'{self._meta_path(meta["id"])}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(meta['id']))
+
+    def status(self, job_id):
+        """Job metadata, or None if the store has never seen this job"""
+        try:
+            with open(self._meta_path(job_id)) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        meta.setdefault('extension', 'xlsx')  # stored before artifacts carried their own extension
+        return meta
+
+    def submit(self, kind, params, version, filename):
+        """Queue a build unless an identical one is finished or already in flight"""
+        job_id = self.job_id(kind, params, version)
+        with self._lock:
+            meta = self.status(job_id)
+            if meta and self._is_reusable(meta):
+                return meta
+
+            meta = {
+                'id': job_id,
+                'kind': kind,
+                'params': params,
+                'version': version,
+                'filename': filename,
+                'extension': self.builders[kind][2],
+                'status': 'queued',
+                'error': None,
+                'progress': None,
+                'result': None,
+                'created_at': time.time(),
+                'finished_at': None,
+            }
+            self._write_meta(meta)
+            self._pending.add(job_id)
+
+        self.purge_expired()
+        self._executor.submit(self._run, meta)
+        return meta
+
+    def _is_reusable(self, meta):
+        if meta['status'] == 'done':
+            return os.path.exists(self.artifact_path(meta['id'], meta['extension']))
+        if meta['status'] in ('queued', 'running'):
+            # Jobs queued by another worker process are trusted until they go stale
+            return meta['id'] in self._pending or time.time() - meta['created_at'] < self.stale_after
+        return False
+
+    def _run(self, meta):
+        job_id = meta['id']
+        artifact_path = self.artifact_path(job_id, meta['extension'])
+        partial_path = f'{artifact_path}.part'
+        try:
+            meta['status'] = 'running'
+            self._write_meta(meta)
+            build, wants_progress, _ = self.builders[meta['kind']]
+            params = dict(meta['params'])
+            if wants_progress:
+                params['progress'] = lambda info: self._publish_progress(meta, info)
+            with self.app.app_context():
+                meta['result'] = build(partial_path, **params)
+            os.replace(partial_path, artifact_path)
+            meta['status'] = 'done'
+        except Exception as e:
+            logger.exception('Export job %s failed', job_id)
+            meta['status'] = 'failed'
+            meta['error'] = str(e)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        finally:
+            meta['finished_at'] = time.time()
+            self._write_meta(meta)
+            with self._lock:
+                self._pending.discard(job_id)
+
+    def _publish_progress(self, meta, info):
+        meta['progress'] = info
+        self._write_meta(meta)
+
+    def purge_expired(self):
+        """Remove finished artifacts older than the configured retention"""
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.store_dir):
+            if not name.endswith('.json'):
+                continue
+            job_id = name[:-len('.json')]
+            meta = self.status(job_id)
+            if not meta or meta['status'] not in ('done', 'failed') or (meta['finished_at'] or 0) > cutoff:
+                continue
+            for path in (self.artifact_path(job_id, meta['extension']), self._meta_path(job_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+export_queue = ExportJobQueue()
+
+def customer_report_version(customer_id):
+    """Data version of a single customer's report"""
+    return db.session.execute(
+        select(Customer.ledger_version).where(Customer.id == customer_id)
+    ).scalar_one()
+
+def period_report_version():
+    """Data version of the whole book; changes whenever any customer's ledger or details change.
+
+    Ledger postings bump ledger_version; edits and deactivations (which
+    decide who is in a statement batch) bump updated_at instead.
+    """
+    version_sum, customer_count, last_updated = db.session.execute(
+        select(func.coalesce(func.sum(Customer.ledger_version), 0), func.count(Customer.id),
+               func.max(Customer.updated_at))
+    ).one()
+    return f'{customer_count}:{version_sum}:{last_updated}'
+
+def render_customer_report(customer):
+    """The customer's styled .xlsx report as bytes"""
+    transactions = Transaction.query.filter_by(customer_id=customer.id).order_by(Transaction.date).all()
+    return export_to_excel(customer, transactions).getvalue()
+
+@export_queue.builder('customer_report')
+def build_customer_report(path, customer_id):
+    customer = db.session.get(Customer, customer_id)
+    with open(path, 'wb') as f:
+        f.write(render_customer_report(customer))
+
+@export_queue.builder('period_report')
+def build_period_report(path, start_date, end_date):
+    start_date = date.fromisoformat(start_date)
+    end_date = date.fromisoformat(end_date)
+    with open(path, 'wb') as f:
+        for block in stream_period_report(start_date, end_date):
+            f.write(block)
+
+def enqueue_customer_report(customer):
+    return export_queue.submit('customer_report', {'customer_id': customer.id},
+                               customer_report_version(customer.id),
+                               f'customer_report_{customer.icl_no}.xlsx')
+
+def enqueue_period_report(start_date, end_date):
+    return export_queue.submit('period_report',
+                               {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+                               period_report_version(),
+                               f'period_report_{start_date}_{end_date}.xlsx')
+
+@export_queue.builder('statement_batch', extension='zip', progress=True)
+def build_statement_batch(path, filters, progress):
+    """Every matching customer's statement in one ZIP, rendered in worker processes"""
+    return export_statements(path, filters, workers=export_queue.app.config['STATEMENT_WORKERS'],
+                             progress=progress)
+
+def enqueue_statement_batch(filters):
+    return export_queue.submit('statement_batch', {'filters': filters}, period_report_version(),
+                               f'statements_{date.today().isoformat()}.zip')
+
+@export_queue.builder('transaction_import', extension='csv', progress=True)
+def build_transaction_import(path, source, file_format, user_id, progress):
+    """Run an uploaded ledger import; the job's artifact is its per-row error file"""
+    try:
+        result = import_transactions(source, file_format, error_path=path, user_id=user_id, progress=progress)
+    finally:
+        os.remove(source)
+    result.pop('error_file')
+    return result
+
+def save_upload(upload):
+    """Store an uploaded import file next to the job results; returns (path, format)"""
+    file_format = os.path.splitext(upload.filename or '')[1].lstrip('.').lower()
+    upload_dir = os.path.join(export_queue.store_dir, 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f'{uuid.uuid4().hex}.{file_format}')
+    upload.save(path)
+    return path, file_format
+
+def enqueue_transaction_import(upload, user_id):
+    source, file_format = save_upload(upload)
+    stem = os.path.splitext(os.path.basename(upload.filename))[0]
+    return export_queue.submit('transaction_import',
+                               {'source': source, 'file_format': file_format, 'user_id': user_id},
+                               os.path.basename(source),
+                               f'import_errors_{stem}.csv')
@@ -0,0 +1,82 @@
+from decimal import Decimal
+from sqlalchemy import bindparam, event, func, select, update
+from app import db
+from models import Customer, Transaction
+
+def balance_delta(amount_paid, amount_repaid):
+    """Net effect of a ledger row on the customer's balance"""
+    return Decimal(str(amount_paid or 0)) - Decimal(str(amount_repaid or 0))
+
+@event.listens_for(Transaction, 'after_insert')
+def apply_transaction_to_balance(mapper, connection, target):
+    """Keep Customer.balance and ledger_version in step with the ledger inside the inserting DB transaction"""
+    delta = balance_delta(target.amount_paid, target.amount_repaid)
+    customer_table = Customer.__table__
+    connection.execute(
+        update(customer_table)
+        .where(customer_table.c.id == target.customer_id)
+        .values(balance=customer_table.c.balance + delta,
+                ledger_version=customer_table.c.ledger_version + 1,
+                # not a customer change: live pages get the new row (and balance) as a transaction event
+                updated_at=customer_table.c.updated_at)
+    )
+
+def apply_ledger_deltas(deltas):
+    """Apply {customer_id: balance delta} for rows written with bulk inserts, which skip the insert hook"""
+    if not deltas:
+        return
+    customer_table = Customer.__table__
+    db.session.execute(
+        update(customer_table)
+        .where(customer_table.c.id == bindparam('customer_id'))
+        .values(balance=customer_table.c.balance + bindparam('delta', type_=customer_table.c.balance.type),
+                ledger_version=customer_table.c.ledger_version + 1,
+                updated_at=customer_table.c.updated_at),  # as in apply_transaction_to_balance
+        [{'customer_id': customer_id, 'delta': delta} for customer_id, delta in deltas.items()]
+    )
+
+def bump_ledger_version(customer):
+    """Mark a customer's reports as stale after a change outside the ledger (e.g. edited terms)"""
+    customer.ledger_version = Customer.ledger_version + 1
+
+def _ledger_balance_subquery():
+    """Aggregate balance per customer straight from the Transaction table"""
+    return select(
+        Transaction.customer_id.label('customer_id'),
+        (func.coalesce(func.sum(Transaction.amount_paid), 0) -
+         func.coalesce(func.sum(Transaction.amount_repaid), 0)).label('ledger_balance')
+    ).group_by(Transaction.customer_id).subquery()
+
+def find_balance_drift():
+    """Return (customer_id, icl_no, stored, ledger) for every customer whose stored balance is off"""
+    ledger = _ledger_balance_subquery()
+    rows = db.session.execute(
+        select(Customer.id, Customer.icl_no, Customer.balance, ledger.c.ledger_balance)
+        .outerjoin(ledger, ledger.c.customer_id == Customer.id)
+        .order_by(Customer.id)
+    ).all()
+
+    drift = []
+    for customer_id, icl_no, stored, ledger_balance in rows:
+        stored = Decimal(str(stored or 0)).quantize(Decimal('0.01'))
+        ledger_balance = Decimal(str(ledger_balance or 0)).quantize(Decimal('0.01'))
+        if stored != ledger_balance:
+            drift.append((customer_id, icl_no, stored, ledger_balance))
+    return drift
+
+def rebuild_balances_statement():
+    """UPDATE that sets every customer's stored balance from the ledger and marks their reports stale"""
+    customer_table = Customer.__table__
+    transaction_table = Transaction.__table__
+    ledger_balance = select(
+        func.coalesce(func.sum(transaction_table.c.amount_paid), 0) -
+        func.coalesce(func.sum(transaction_table.c.amount_repaid), 0)
+    ).where(transaction_table.c.customer_id == customer_table.c.id).scalar_subquery()
+    return update(customer_table).values(balance=ledger_balance,
+                                         ledger_version=customer_table.c.ledger_version + 1)
+
+def rebuild_balances():
+    """Recompute every Customer.balance from the ledger in a single UPDATE statement"""
+    result = db.session.execute(rebuild_balances_statement())
+    db.session.commit()
+    return result.rowcount
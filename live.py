@@ -0,0 +1,339 @@
+"""Live updates for the dashboard and customer pages over server-sent events.
+
+Committed changes are published to an in-process broker that fans them
+out to every open /api/live stream subscribed to their topic ('dashboard',
+or 'customer:<id>' for one customer's page), so open pages apply small
+deltas instead of re-fetching:
+
+- transaction: a new ledger row and the customer's balance after it
+- customer: a created, edited or deactivated customer
+- totals: active customer count and total balance
+- refresh: too much changed (or events were missed); re-fetch the page data
+
+Rows posted through the ORM are published when their session commits.
+A relay thread per process, started with the first subscriber, looks for
+ledger rows and customer changes (Customer.updated_at) written by other
+workers or by bulk paths (imports, accrual) every LIVE_POLL_INTERVAL
+seconds, and recomputes the
+totals once per burst of changes, so the database is read once per
+process however many pages are open. Events carry an id and the last
+EVENT_BUFFER are kept, so a reconnecting EventSource gets what it missed
+(or a refresh if that is no longer possible).
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, joinedload
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUFFER = 500  # recent events kept for reconnecting clients
+SUBSCRIBER_QUEUE = 200  # events a slow client may fall behind before it is sent a refresh
+RELAY_BATCH = 200  # rows from other writers published one by one; more than this sends a refresh
+HEARTBEAT = 15  # seconds between keepalive comments on an idle stream
+RELAY_MIN_GAP = 0.5  # seconds between relay passes, so bursts of commits cost one totals query
+RELAY_OVERLAP = timedelta(seconds=10)  # customer changes re-read each pass, for commits that land after their updated_at
+DASHBOARD = 'dashboard'
+
+def customer_topic(customer_id):
+    return f'customer:{customer_id}'
+
+def sse(event_id, kind, data):
+    # events without an id (initial state, refresh) leave the client's Last-Event-ID alone
+    id_line = f'id: {event_id}\n' if event_id else ''
+    return f'{id_line}event: {kind}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+class Subscriber:
+    def __init__(self, topics):
+        self.topics = frozenset(topics)
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+    def put(self, item):
+        try:
+            self.events.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+
+class LiveBroker:
+    def __init__(self):
+        self.app = None
+        self.instance = uuid.uuid4().hex[:8]  # event ids from another process are never replayed
+        self._seq = 0
+        self._recent = deque(maxlen=EVENT_BUFFER)
+        self._subscribers = set()
+        # already published by this process's commits: transaction ids and (customer id, updatedAt)
+        self._published = {'transaction': set(), 'customer': set()}
+        self._seen_customers = {}  # customer id -> updated_at for the relay's current overlap window
+        self._totals_dirty = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._relay = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def publish(self, kind, data, topics):
+        with self._lock:
+            self._seq += 1
+            item = (f'{self.instance}-{self._seq}', kind, data, frozenset(topics))
+            self._recent.append(item)
+            subscribers = [s for s in self._subscribers if s.topics & item[3]]
+        for subscriber in subscribers:
+            subscriber.put(item)
+
+    def publish_committed(self, events):
+        """Publish the changes of one committed session and have the relay refresh the totals"""
+        with self._lock:
+            if self._subscribers:
+                for kind, data, _ in events:
+                    self._published[kind].add(data['transaction']['id'] if kind == 'transaction'
+                                              else (data['id'], data['updatedAt']))
+        for kind, data, topics in events:
+            self.publish(kind, data, topics)
+        self.changed()
+
+    def publish_all(self, kind, data):
+        """Publish to every open stream, whatever its topics"""
+        with self._lock:
+            topics = set().union(*(s.topics for s in self._subscribers))
+        self.publish(kind, data, topics)
+
+    def changed(self):
+        """Something that affects the totals was committed; the relay republishes them"""
+        with self._lock:
+            self._totals_dirty = True
+        self._wake.set()
+
+    def subscribe(self, topics, last_event_id=None):
+        subscriber = Subscriber(topics)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            missed = None
+            if last_event_id:
+                ids = [item[0] for item in self._recent]
+                if last_event_id in ids:
+                    missed = list(self._recent)[ids.index(last_event_id) + 1:]
+        if last_event_id:
+            if missed is None:
+                subscriber.put(('', 'refresh', {}, subscriber.topics))
+            else:
+                for item in missed:
+                    if subscriber.topics & item[3]:
+                        subscriber.put(item)
+        self._start_relay()
+        self._wake.set()
+        return subscriber
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, topics, last_event_id=None, first=()):
+        """SSE text for one client: the first events, then whatever is published to its topics.
+
+        The client is subscribed when the stream starts and unsubscribed when
+        the server closes it, so a response that is never sent leaves nothing behind.
+        """
+        subscriber = self.subscribe(topics, last_event_id)
+        try:
+            yield 'retry: 3000\n\n'
+            for kind, data in first:
+                yield sse('', kind, data)
+            while True:
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    while not subscriber.events.empty():
+                        subscriber.events.get_nowait()
+                    yield sse('', 'refresh', {})
+                try:
+                    event_id, kind, data, _ = subscriber.events.get(timeout=HEARTBEAT)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield sse(event_id, kind, data)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _start_relay(self):
+        with self._lock:
+            if self._relay is not None or self.app is None:
+                return
+            self._relay = threading.Thread(target=self._run_relay, name='live-relay', daemon=True)
+        self._relay.start()
+
+    def _run_relay(self):
+        try:
+            self._relay_loop()
+        finally:
+            with self._lock:
+                self._relay = None  # the next subscriber starts a new relay
+
+    def _relay_loop(self):
+        from app import db
+        watermarks = None
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    idle = not self._subscribers
+                    if idle:
+                        for ids in self._published.values():
+                            ids.clear()
+                        self._seen_customers = {}
+                if idle:
+                    watermarks = None  # nobody to tell; start from the current ids when someone subscribes
+                else:
+                    try:
+                        watermarks = self._relay_changes(watermarks) if watermarks else self._start_watermarks()
+                    except DBAPIError:
+                        logger.warning('Live update relay could not read the database', exc_info=True)
+                    except Exception:
+                        # never let the thread die; pages re-fetch and the relay starts again from the current ids
+                        logger.exception('Live update relay failed')
+                        self.publish_all('refresh', {})
+                        watermarks = None
+                    finally:
+                        db.session.remove()
+                    time.sleep(RELAY_MIN_GAP)
+                self._wake.wait(self.app.config['LIVE_POLL_INTERVAL'])
+                self._wake.clear()
+
+    def _start_watermarks(self):
+        """Watermarks for the current state, with the customers in the overlap window marked as seen"""
+        from app import db
+        from models import Customer
+        watermarks = _watermarks()
+        if watermarks[1]:
+            changed = db.session.execute(select(Customer.id, Customer.updated_at)
+                                         .where(Customer.updated_at >= watermarks[1] - RELAY_OVERLAP)).all()
+            with self._lock:
+                self._seen_customers = dict(changed)
+        return watermarks
+
+    def _relay_changes(self, watermarks):
+        """Publish rows written outside this process's sessions since watermarks, then the totals"""
+        from app import db
+        from api import customer_to_json, transaction_to_json
+        from dashboard import get_portfolio_summary
+        from models import Customer, Transaction
+
+        last_transaction, customers_since = watermarks
+        transactions = db.session.execute(
+            select(Transaction).options(joinedload(Transaction.customer))
+            .where(Transaction.id > last_transaction).order_by(Transaction.id)
+            .limit(RELAY_BATCH + 1)).scalars().all()
+        # new, edited and deactivated customers (ledger postings leave updated_at alone); the window is re-read
+        # for RELAY_OVERLAP and what was already published is skipped
+        window_start = customers_since - RELAY_OVERLAP if customers_since else None
+        query = select(Customer.id, Customer.updated_at)
+        if window_start:
+            query = query.where(Customer.updated_at >= window_start)
+        changed = db.session.execute(query).all()
+        with self._lock:
+            fresh_transactions = [t for t in transactions if t.id not in self._published['transaction']]
+            if transactions:
+                self._published['transaction'] = {i for i in self._published['transaction']
+                                                  if i > transactions[-1].id}
+            fresh_ids = [customer_id for customer_id, updated_at in changed
+                         if self._seen_customers.get(customer_id) != updated_at
+                         and (customer_id, _iso(updated_at)) not in self._published['customer']]
+            self._seen_customers = dict(changed)
+            if window_start:
+                self._published['customer'] = {key for key in self._published['customer']
+                                               if key[1] is None or key[1] >= _iso(window_start)}
+            totals_dirty, self._totals_dirty = self._totals_dirty, False
+        latest = max((updated_at for _, updated_at in changed if updated_at), default=customers_since)
+
+        if len(transactions) > RELAY_BATCH or len(fresh_ids) > RELAY_BATCH:
+            self.publish_all('refresh', {})
+            return self._start_watermarks()
+        fresh_customers = db.session.execute(
+            select(Customer).where(Customer.id.in_(fresh_ids)).order_by(Customer.id)).scalars().all() \
+            if fresh_ids else []
+        for transaction in fresh_transactions:
+            self.publish('transaction', transaction_event(transaction, transaction.customer, transaction_to_json),
+                         [DASHBOARD, customer_topic(transaction.customer_id)])
+        for customer in fresh_customers:
+            self.publish('customer', customer_event(customer, customer_to_json),
+                         [DASHBOARD, customer_topic(customer.id)])
+        if totals_dirty or fresh_transactions or fresh_customers:
+            self.publish('totals', totals_event(get_portfolio_summary()), [DASHBOARD])
+        return (transactions[-1].id if transactions else last_transaction, latest)
+
+live_updates = LiveBroker()
+
+def _watermarks():
+    """(last ledger row id, latest customer updated_at) as the relay's starting point"""
+    from app import db
+    from models import Customer, Transaction
+    return (db.session.execute(select(func.coalesce(func.max(Transaction.id), 0))).scalar(),
+            db.session.execute(select(func.max(Customer.updated_at))).scalar())
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+def transaction_event(transaction, customer, to_json):
+    row = to_json(transaction)
+    return {'customerId': transaction.customer_id, 'iclNo': customer.icl_no, 'customerName': customer.name,
+            'transaction': row, 'balance': row['balance']}
+
+def customer_event(customer, to_json):
+    return {**to_json(customer), 'active': bool(customer.is_active), 'updatedAt': _iso(customer.updated_at)}
+
+def totals_event(summary):
+    return {'totalCustomers': summary['total_customers'], 'totalBalance': f"{summary['total_balance']:.2f}"}
+
+@event.listens_for(Session, 'after_flush')
+def _collect_live_events(session, flush_context):
+    # serialized now: after commit the objects are expired and no SQL can be emitted
+    if not live_updates.has_subscribers():
+        return
+    from api import customer_to_json, transaction_to_json
+    from models import Customer, Transaction
+
+    events = session.info.setdefault('live_events', [])
+    try:
+        for obj in session.new:
+            if isinstance(obj, Transaction):
+                customer = session.get(Customer, obj.customer_id)  # usually already in the identity map
+                events.append(('transaction', transaction_event(obj, customer, transaction_to_json),
+                               (DASHBOARD, customer_topic(obj.customer_id))))
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Customer) and (obj in session.new or session.is_modified(obj)):
+                events.append(('customer', customer_event(obj, customer_to_json),
+                               (DASHBOARD, customer_topic(obj.id))))
+    except Exception:
+        # a live update is never worth failing the write over; the relay still sends the totals
+        logger.exception('Could not prepare live updates for a flush')
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_change(orm_execute_state):
+    # bulk writes (imports, accrual, balance rebuilds) are picked up by the relay; only the totals are flagged here
+    if not live_updates.has_subscribers():
+        return
+    from models import Customer, Transaction
+
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if not orm_execute_state.is_select and getattr(table, 'name', None) in (Customer.__tablename__,
+                                                                           Transaction.__tablename__):
+        orm_execute_state.session.info.setdefault('live_events', [])
+
+@event.listens_for(Session, 'after_commit')
+def _publish_live_events(session):
+    events = session.info.pop('live_events', None)
+    if events is not None:
+        live_updates.publish_committed(events)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_live_events(session):
+    session.info.pop('live_events', None)
@@ -0,0 +1,247 @@
+"""Versioned schema migrations for databases created before a model change.
+
+db.create_all() only creates missing tables, so new columns and indexes on
+existing tables are applied here. Each migration runs once, in version
+order, and records itself in the schema_version table. Migrations check
+the live schema before changing it, so they are safe on fresh databases
+that create_all() already built in full.
+
+Migrations work on the frozen table and index definitions below, never on
+the models: an upgrade from an old database runs every migration in turn,
+and a later model change (a new column, an onupdate default, a new index)
+must not leak into a migration that runs before that column exists.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import (Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, Numeric, String,
+                        Table, UniqueConstraint, func, inspect, select, text, update)
+from sqlalchemy.schema import CreateIndex
+from app import db
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+# Only the columns the migrations touch; these tables are never created from here
+frozen = MetaData()
+_customer = Table(
+    'customer', frozen,
+    Column('id', Integer, primary_key=True),
+    Column('icl_no', String(50)),
+    Column('name', String(100)),
+    Column('is_active', Boolean),
+    Column('balance', Numeric(15, 2)),
+    Column('ledger_version', Integer),
+    Column('updated_at', DateTime),
+)
+_transaction = Table(
+    'transaction', frozen,
+    Column('id', Integer, primary_key=True),
+    Column('customer_id', Integer),
+    Column('date', Date),
+    Column('amount_paid', Numeric(15, 2)),
+    Column('amount_repaid', Numeric(15, 2)),
+    Column('period_from', Date),
+    Column('period_to', Date),
+    Column('created_at', DateTime),
+)
+_interest_rate = Table('interest_rate', frozen, Column('id', Integer, primary_key=True),
+                       Column('is_active', Boolean), Column('effective_date', Date))
+_tds_rate = Table('tds_rate', frozen, Column('id', Integer, primary_key=True),
+                  Column('is_active', Boolean), Column('effective_date', Date))
+
+# Tables added after the first release, as they were when their migration was written
+_cache_version = Table(
+    'cache_version', frozen,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False, default=0),
+)
+_monthly_snapshot = Table(
+    'monthly_snapshot', frozen,
+    Column('id', Integer, primary_key=True),
+    Column('customer_id', Integer, ForeignKey('customer.id'), nullable=False),
+    Column('month', Date, nullable=False),
+    Column('opening_balance', Numeric(15, 2), nullable=False, default=0),
+    Column('closing_balance', Numeric(15, 2), nullable=False, default=0),
+    Column('amount_paid', Numeric(15, 2), nullable=False, default=0),
+    Column('amount_repaid', Numeric(15, 2), nullable=False, default=0),
+    Column('int_amount', Numeric(15, 2), nullable=False, default=0),
+    Column('tds_amount', Numeric(15, 2), nullable=False, default=0),
+    Column('net_amount', Numeric(15, 2), nullable=False, default=0),
+    Column('transaction_count', Integer, nullable=False, default=0),
+    Column('built_at', DateTime),
+    UniqueConstraint('customer_id', 'month', name='uq_monthly_snapshot_customer_month'),
+    Index('ix_monthly_snapshot_month', 'month'),
+)
+_snapshot_run = Table(
+    'snapshot_run', frozen,
+    Column('id', Integer, primary_key=True),
+    Column('started_at', DateTime, nullable=False),
+    Column('finished_at', DateTime),
+    Column('full', Boolean, nullable=False, default=False),
+    Column('customers', Integer, nullable=False, default=0),
+    Column('months', Integer, nullable=False, default=0),
+)
+
+HOT_QUERY_INDEXES = [
+    Index('ix_customer_is_active', _customer.c.is_active, _customer.c.icl_no),
+    Index('ix_customer_name', _customer.c.name),
+    Index('ix_customer_lower_icl_no', func.lower(_customer.c.icl_no).label('lower_icl_no'),
+          postgresql_ops={'lower_icl_no': 'text_pattern_ops'}),
+    Index('ix_customer_lower_name', func.lower(_customer.c.name).label('lower_name'),
+          postgresql_ops={'lower_name': 'text_pattern_ops'}),
+    Index('ix_transaction_customer_date', _transaction.c.customer_id, _transaction.c.date, _transaction.c.id),
+    Index('ix_transaction_date', _transaction.c.date),
+    Index('ix_transaction_created_at', _transaction.c.created_at),
+    Index('ix_transaction_period', _transaction.c.period_from, _transaction.c.period_to),
+    Index('ix_interest_rate_active', _interest_rate.c.is_active, _interest_rate.c.effective_date),
+    Index('ix_tds_rate_active', _tds_rate.c.is_active, _tds_rate.c.effective_date),
+]
+UPDATED_AT_INDEXES = [
+    Index('ix_customer_updated_at', _customer.c.updated_at),
+]
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register fn(connection) as schema migration number version"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+def _add_column(connection, table, column_ddl):
+    name = column_ddl.split()[0]
+    if name not in {column['name'] for column in inspect(connection).get_columns(table)}:
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column_ddl}'))
+        return True
+    return False
+
+def _create_indexes(connection, indexes):
+    # IF NOT EXISTS rather than the inspector, which does not report expression indexes on SQLite
+    for index in indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+@migration(1, 'Stored customer balance and ledger version')
+def _customer_balance_columns(connection):
+    added_balance = _add_column(connection, 'customer', 'balance NUMERIC(15, 2) DEFAULT 0 NOT NULL')
+    added_version = _add_column(connection, 'customer', 'ledger_version INTEGER DEFAULT 0 NOT NULL')
+    # either column missing means the stored balances were never kept (or were added by hand), so rebuild them
+    if added_balance or added_version:
+        ledger_balance = select(
+            func.coalesce(func.sum(_transaction.c.amount_paid), 0) -
+            func.coalesce(func.sum(_transaction.c.amount_repaid), 0)
+        ).where(_transaction.c.customer_id == _customer.c.id).scalar_subquery()
+        connection.execute(update(_customer).values(balance=ledger_balance,
+                                                    ledger_version=_customer.c.ledger_version + 1))
+
+@migration(2, 'Secondary indexes for hot query columns')
+def _hot_query_indexes(connection):
+    _create_indexes(connection, HOT_QUERY_INDEXES)
+
+@migration(3, 'Cache version counters for the rate tables')
+def _rate_cache_versions(connection):
+    _cache_version.create(connection, checkfirst=True)
+    existing = set(connection.execute(select(_cache_version.c.name)).scalars())
+    for name in ('interest_rate', 'tds_rate'):
+        if name not in existing:
+            connection.execute(_cache_version.insert().values(name=name, version=0))
+
+@migration(4, 'Customer updated_at for live updates')
+def _customer_updated_at(connection):
+    if _add_column(connection, 'customer', 'updated_at TIMESTAMP'):
+        connection.execute(text('UPDATE customer SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)'))
+    _create_indexes(connection, UPDATED_AT_INDEXES)
+
+@migration(5, 'Monthly snapshot tables')
+def _monthly_snapshot_tables(connection):
+    # create_all() makes these on init-db; db-upgrade alone must bring an old database up too
+    _monthly_snapshot.create(connection, checkfirst=True)
+    _snapshot_run.create(connection, checkfirst=True)
+
+def current_version(connection):
+    if not inspect(connection).has_table('schema_version'):
+        return 0
+    return connection.execute(select(db.func.max(schema_version.c.version))).scalar() or 0
+
+def pending_migrations():
+    with db.engine.connect() as connection:
+        version = current_version(connection)
+    return [entry for entry in MIGRATIONS if entry[0] > version]
+
+def upgrade():
+    """Apply pending migrations, each in its own transaction; returns the versions applied"""
+    with db.engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+
+    applied = []
+    for version, description, fn in pending_migrations():
+        with db.engine.begin() as connection:
+            # another process may have applied it since pending_migrations() looked
+            if current_version(connection) >= version:
+                continue
+            logging.info('Applying schema migration %s: %s', version, description)
+            fn(connection)
+            connection.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+def hot_queries():
+    """(description, statement, index it should use) for the queries the app runs most"""
+    from datetime import date
+    from models import Customer, InterestRate, TDSRate, Transaction
+    today = date.today()
+    return [
+        ('customer ledger',
+         select(Transaction).where(Transaction.customer_id == 1).order_by(Transaction.date, Transaction.id),
+         'ix_transaction_customer_date'),
+        ('period report range',
+         select(Transaction).where(Transaction.date >= today.replace(day=1), Transaction.date <= today),
+         'ix_transaction_date'),
+        ('recent transactions',
+         select(Transaction).order_by(Transaction.created_at.desc()).limit(5),
+         'ix_transaction_created_at'),
+        ('already accrued check',
+         select(Transaction.customer_id).where(Transaction.period_from == today.replace(day=1),
+                                               Transaction.period_to == today),
+         'ix_transaction_period'),
+        ('active customers',
+         select(Customer).where(Customer.is_active == True).order_by(Customer.icl_no),  # noqa: E712
+         'ix_customer_is_active'),
+        ('live relay customer changes',
+         select(Customer.id, Customer.updated_at).where(Customer.updated_at >= datetime(2000, 1, 1)),
+         'ix_customer_updated_at'),
+        ('customer name search',
+         select(Customer).where(db.func.lower(Customer.name) >= 'ab', db.func.lower(Customer.name) < 'ac'),
+         'ix_customer_lower_name'),
+        ('active interest rate',
+         select(InterestRate).where(InterestRate.is_active == True).order_by(InterestRate.effective_date.desc()),  # noqa: E712
+         'ix_interest_rate_active'),
+        ('active TDS rate',
+         select(TDSRate).where(TDSRate.is_active == True).order_by(TDSRate.effective_date.desc()),  # noqa: E712
+         'ix_tds_rate_active'),
+    ]
+
+def explain(connection, statement):
+    """The database's query plan for statement as a list of text lines"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+    return [row[0] for row in connection.execute(text(f'EXPLAIN {sql}'))]
+
+def check_query_plans():
+    """[(description, expected index, uses it, plan lines), ...] for every hot query"""
+    results = []
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            # tiny or unanalysed tables make sequential scans look cheaper; ask whether the index is usable at all
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+        for description, statement, index_name in hot_queries():
+            plan = explain(connection, statement)
+            results.append((description, index_name, any(index_name in line for line in plan), plan))
+    return results
@@ -32,20 +32,31 @@ class Customer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     is_active = db.Column(db.Boolean, default=True)
+    balance = db.Column(db.Numeric(15, 2), nullable=False, default=0, server_default='0')  # maintained by ledger.py
+    ledger_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped on every ledger or terms change
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # followed by the live relay
 
     # Relationships
     transactions = db.relationship('Transaction', backref='customer', lazy=True, cascade='all, delete-orphan')
+
+    # Indexes for sorting and case-insensitive prefix search in the customer tables
+    __table_args__ = (
+        db.Index('ix_customer_is_active', 'is_active', 'icl_no'),
+        db.Index('ix_customer_name', 'name'),
+        db.Index('ix_customer_updated_at', 'updated_at'),
+        db.Index('ix_customer_lower_icl_no', db.func.lower(icl_no).label('lower_icl_no'),
+                 postgresql_ops={'lower_icl_no': 'text_pattern_ops'}),
+        db.Index('ix_customer_lower_name', db.func.lower(name).label('lower_name'),
+                 postgresql_ops={'lower_name': 'text_pattern_ops'}),
+    )
     
     @property
     def current_balance(self):
-        """Calculate current balance based on transactions"""
-        from decimal import Decimal
-        total_paid = sum(Decimal(str(t.amount_paid or 0)) for t in self.transactions)
-        total_repaid = sum(Decimal(str(t.amount_repaid or 0)) for t in self.transactions)
-        return float(total_paid - total_repaid)
+        """Current balance from the stored running balance (see ledger.py)"""
+        return float(self.balance or 0)
     
     def get_current_balance(self):
-        """Calculate current balance based on transactions (method version for backward compatibility)"""
+        """Current balance (method version for backward compatibility)"""
         return self.current_balance
 
     def __repr__(self):
@@ -68,6 +79,13 @@ class Transaction(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
 
+    __table_args__ = (
+        db.Index('ix_transaction_customer_date', 'customer_id', 'date', 'id'),
+        db.Index('ix_transaction_date', 'date'),
+        db.Index('ix_transaction_created_at', 'created_at'),
+        db.Index('ix_transaction_period', 'period_from', 'period_to'),
+    )
+
     def __repr__(self):
         return f'<Transaction {self.date} - {self.customer.name}>'
 
@@ -80,6 +98,10 @@ class InterestRate(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     is_active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        db.Index('ix_interest_rate_active', 'is_active', 'effective_date'),
+    )
+
     def __repr__(self):
         return f'<InterestRate {self.rate}% from {self.effective_date}>'
 
@@ -92,5 +114,52 @@ class TDSRate(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     is_active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        db.Index('ix_tds_rate_active', 'is_active', 'effective_date'),
+    )
+
     def __repr__(self):
         return f'<TDSRate {self.rate}% from {self.effective_date}>'
+
+class MonthlySnapshot(db.Model):
+    """One customer's ledger totals for one calendar month, built by snapshots.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # first day of the month
+    opening_balance = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    closing_balance = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    amount_paid = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    amount_repaid = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    int_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    tds_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    net_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'month', name='uq_monthly_snapshot_customer_month'),
+        db.Index('ix_monthly_snapshot_month', 'month'),
+    )
+
+    def __repr__(self):
+        return f'<MonthlySnapshot customer {self.customer_id} {self.month:%Y-%m}>'
+
+class SnapshotRun(db.Model):
+    """One build of the monthly snapshots; the latest finished run's started_at is the next run's watermark"""
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    full = db.Column(db.Boolean, nullable=False, default=False)
+    customers = db.Column(db.Integer, nullable=False, default=0)
+    months = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SnapshotRun {self.started_at} ({self.months} months)>'
+
+# Version counters that tell every worker when one of its in-process caches is stale
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} v{self.version}>'
@@ -0,0 +1,126 @@
+import logging
+import random
+import time
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, DBAPIError
+from app import db
+from models import Customer, Transaction
+from rates import tds_rate_on
+from timeline import balance_timelines
+from compounding import compounding_schedules, uses_schedule
+from utils import calculate_compound_interest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TDS_FRACTION = Decimal('0.10')  # Default 10% TDS
+POST_RETRIES = 5
+RETRY_BACKOFF = 0.05  # seconds, doubled per attempt with jitter
+RETRYABLE_PGCODES = ('40001', '40P01')  # serialization failure, deadlock
+
+def timeline_interest(timeline, period_from, period_to, annual_rate, interest_type, compound_frequency):
+    """Interest for period_from..period_to on a BalanceTimeline's balance for each day of the period"""
+    if interest_type == 'simple':
+        return timeline.simple_interest(period_from, period_to, annual_rate)
+    return sum((calculate_compound_interest(balance, annual_rate, days, compound_frequency)
+                for balance, days in timeline.segments(period_from, period_to)), Decimal('0'))
+
+def period_interest(customer, period_from, period_to):
+    """Interest for period_from..period_to on the balance as it stood on each day of the period"""
+    if uses_schedule(customer):
+        return compounding_schedules.get(customer).interest(period_from, period_to)
+    return timeline_interest(balance_timelines.get(customer), period_from, period_to,
+                             customer.annual_rate, customer.interest_type, customer.compound_frequency)
+
+def tds_on(customer, int_amount, on_date):
+    """TDS deducted from int_amount for this customer at the rate in force on on_date"""
+    if not customer.tds_applicable:
+        return Decimal('0')
+    tds_rate = tds_rate_on(on_date)
+    if tds_rate is not None:
+        return int_amount * (tds_rate / 100)
+    return int_amount * DEFAULT_TDS_FRACTION
+
+def lock_customer(customer_id):
+    """Start a write transaction that holds the customer's row and return the customer as stored now.
+
+    On PostgreSQL this is SELECT ... FOR UPDATE, so postings for one
+    customer queue behind each other while other customers proceed. SQLite
+    has one writer per database, so the transaction is begun IMMEDIATE
+    (see sqlite_setup.py) to take that lock before the balance is read.
+    A read-only transaction the session already had open is rolled back
+    first; pending changes raise RuntimeError rather than being committed
+    behind the caller's back.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        if db.session.new or db.session.dirty or db.session.deleted:
+            raise RuntimeError('lock_customer() called with uncommitted changes in the session; '
+                               'commit or roll them back first')
+        db.session.rollback()
+        db.session.connection(execution_options={'sqlite_begin': 'IMMEDIATE'})
+    return db.session.execute(
+        select(Customer).where(Customer.id == customer_id).with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+
+def _is_retryable(error):
+    if isinstance(error, OperationalError) and 'database is locked' in str(error.orig):
+        return True
+    return isinstance(error, DBAPIError) and getattr(error.orig, 'pgcode', None) in RETRYABLE_PGCODES
+
+def post_transaction(customer, transaction_date, amount_paid=None, amount_repaid=None,
+                     period_from=None, period_to=None, user_id=None, retries=POST_RETRIES):
+    """Compute balance, interest and TDS for a new ledger row, then insert and commit it.
+
+    The customer's row is locked before its balance is read, so concurrent
+    postings from any number of workers see each other's balances. Lock
+    timeouts, deadlocks and serialization failures are retried.
+    """
+    customer_id = customer.id
+    for attempt in range(retries + 1):
+        try:
+            return _post_locked(lock_customer(customer_id), transaction_date, amount_paid, amount_repaid,
+                                period_from, period_to, user_id)
+        except DBAPIError as e:
+            db.session.rollback()
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+            logger.info('Retrying posting for customer %s after %s (attempt %d)', customer_id, e.orig, attempt + 1)
+            time.sleep(delay)
+
+def _post_locked(customer, transaction_date, amount_paid, amount_repaid, period_from, period_to, user_id):
+    # Calculate new balance (ensure all types are Decimal)
+    current_balance = Decimal(str(customer.get_current_balance()))
+    new_balance = current_balance + (amount_paid or Decimal('0')) - (amount_repaid or Decimal('0'))
+    
+    int_amount = None
+    tds_amount = None
+    net_amount = None
+    no_of_days = None
+    
+    if period_from and period_to:
+        no_of_days = (period_to - period_from).days
+        int_amount = period_interest(customer, period_from, period_to)
+        tds_amount = tds_on(customer, int_amount, period_to)
+        net_amount = int_amount - tds_amount
+    
+    transaction = Transaction(
+        customer_id=customer.id,
+        date=transaction_date,
+        amount_paid=amount_paid,
+        amount_repaid=amount_repaid,
+        balance=new_balance,
+        period_from=period_from,
+        period_to=period_to,
+        no_of_days=no_of_days,
+        int_rate=customer.annual_rate,
+        int_amount=int_amount,
+        tds_amount=tds_amount,
+        net_amount=net_amount,
+        created_by=user_id
+    )
+    
+    db.session.add(transaction)
+    db.session.commit()
+    return transaction
@@ -0,0 +1,188 @@
+"""Projected interest income and TDS for the whole active book, month by month.
+
+The active customers are loaded once into columns (one numpy array per
+field: balance, annual_rate, interest_type, compound_frequency,
+icl_end_date, tds_applicable) and each month is computed for every
+customer at once with vector_interest, instead of calling
+calculate_interest / calculate_compound_interest per customer per month.
+
+The projection assumes balances stay as they stand now and that interest
+is accrued monthly the way run_accrual does it: simple or compound
+interest on the balance for the days of the month, or, for customers with
+a first_compounding_date, daily interest on the balance plus capitalized
+interest, capitalized on the schedule's boundaries (see compounding.py).
+A facility stops accruing at its icl_end_date. TDS is taken at the rate
+in force at the end of each month.
+"""
+import time
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from sqlalchemy import select
+from app import db
+from models import Customer
+from accrual import DEFAULT_TDS_RATE
+from compounding import MONTHS_PER_PERIOD, add_months, load_schedules, uses_schedule
+from rates import tds_rate_on
+from vector_interest import (compound_interest_paise, percentage_paise, periods_per_year,
+                             simple_interest_paise, to_basis_points, to_paise)
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 120
+OPEN_ENDED = date.max  # icl_end_date of facilities without one
+DAILY_RATE_DIVISOR = 100 * 100 * 365  # basis points per year -> fraction per day
+
+def _rupees(paise):
+    return Decimal(int(paise)).scaleb(-2)
+
+def _add_months(anchors, months):
+    """Vectorized compounding.add_months over datetime64[D] anchors"""
+    month = anchors.astype('datetime64[M]') + months
+    first = month.astype('datetime64[D]')
+    last_day = (month + 1).astype('datetime64[D]') - first - 1
+    day = anchors - anchors.astype('datetime64[M]').astype('datetime64[D]')
+    return first + np.minimum(day, last_day)
+
+class LoanBook:
+    """The active book as columns, one element per customer"""
+
+    def __init__(self, rows):
+        self.customer_ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.balance = to_paise([row.balance or 0 for row in rows])
+        self.rate = to_basis_points([row.annual_rate or 0 for row in rows])
+        self.compound = np.array([row.interest_type != 'simple' for row in rows], dtype=bool)
+        self.periods = periods_per_year([row.compound_frequency or '' for row in rows])
+        self.end = np.array([row.icl_end_date or OPEN_ENDED for row in rows], dtype='datetime64[D]')
+        self.tds = np.array([bool(row.tds_applicable) for row in rows], dtype=bool)
+        self.scheduled = np.array([uses_schedule(row) for row in rows], dtype=bool)
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+def load_book():
+    """Rows of every active customer with the columns the projection needs"""
+    return db.session.execute(
+        select(Customer.id, Customer.balance, Customer.annual_rate, Customer.interest_type,
+               Customer.compound_frequency, Customer.first_compounding_date, Customer.icl_end_date,
+               Customer.tds_applicable)
+        .where(Customer.is_active.is_(True))
+        .order_by(Customer.id)
+    ).all()
+
+class ScheduledProjection:
+    """Capitalization state of the first_compounding_date customers, carried forward month by month.
+
+    Starts from each customer's CompoundingSchedule at the projection
+    start: the interest capitalized so far, the interest accrued since the
+    last boundary and the next boundary. Amounts are float paise; only
+    capitalizations and monthly interest are rounded, as in the schedule.
+    """
+
+    def __init__(self, rows, balance, rate, end, start):
+        schedules = load_schedules(rows)
+        passed, capitalized, pending = [], [], []
+        for row in rows:
+            schedule = schedules[row.id]
+            accrued = schedule.accrued(start)
+            index = bisect_right(schedule.boundaries, start)
+            settled = schedule.capitalized[index - 1] if index else Decimal('0')
+            passed.append(index)
+            capitalized.append(float(settled * 100))
+            pending.append(float((accrued - settled) * 100))
+
+        self.balance = balance.astype(np.float64)
+        self.daily_rate = rate / DAILY_RATE_DIVISOR
+        self.end = end
+        self.anchor = np.array([row.first_compounding_date for row in rows], dtype='datetime64[D]')
+        self.months = np.array([MONTHS_PER_PERIOD.get(row.compound_frequency, 12) for row in rows], dtype=np.int64)
+        self.passed = np.array(passed, dtype=np.int64)
+        self.capitalized = np.array(capitalized, dtype=np.float64)
+        self.pending = np.array(pending, dtype=np.float64)
+        self.next_boundary = _add_months(self.anchor, self.months * self.passed)
+
+    def advance(self, period_from, period_to):
+        """Interest in paise accrued by each customer over [period_from, period_to)"""
+        period_from, period_to = np.datetime64(period_from, 'D'), np.datetime64(period_to, 'D')
+        live = self.end > period_from
+        stop = np.maximum(np.minimum(period_to, self.end), period_from)
+        before = self.capitalized + self.pending
+        cursor = np.full(len(self.balance), period_from)
+        while True:
+            due = live & (self.next_boundary <= stop)
+            upto = np.where(due, self.next_boundary, stop)
+            days = (upto - cursor).astype(np.int64)
+            self.pending += (self.balance + self.capitalized) * days * self.daily_rate
+            self.capitalized = np.where(due, self.capitalized + np.rint(self.pending), self.capitalized)
+            self.pending = np.where(due, 0.0, self.pending)
+            cursor = upto
+            if not due.any():
+                break
+            self.passed += due
+            self.next_boundary = np.where(due, _add_months(self.anchor, self.months * self.passed),
+                                          self.next_boundary)
+        return np.rint(self.capitalized + self.pending - before).astype(np.int64)
+
+def monthly_accruals(book, rows, months, start):
+    """Yield (period_from, period_to, interest, tds) per month, with per-customer paise arrays in book order"""
+    simple = ~book.scheduled & ~book.compound
+    compound = ~book.scheduled & book.compound
+    scheduled_rows = [row for row, scheduled in zip(rows, book.scheduled) if scheduled]
+    scheduled = ScheduledProjection(scheduled_rows, book.balance[book.scheduled], book.rate[book.scheduled],
+                                    book.end[book.scheduled], start)
+
+    for month in range(months):
+        period_from, period_to = add_months(start, month), add_months(start, month + 1)
+        month_start, month_end = np.datetime64(period_from, 'D'), np.datetime64(period_to, 'D')
+        days = np.maximum((np.minimum(book.end, month_end) - month_start).astype(np.int64), 0)
+
+        interest = np.zeros(len(book), dtype=np.int64)
+        interest[simple] = simple_interest_paise(book.balance[simple], book.rate[simple], days[simple])
+        interest[compound] = compound_interest_paise(book.balance[compound], book.rate[compound], days[compound],
+                                                     book.periods[compound])
+        interest[book.scheduled] = scheduled.advance(period_from, period_to)
+
+        tds_rate = tds_rate_on(period_to)
+        tds_bp = to_basis_points(tds_rate if tds_rate is not None else DEFAULT_TDS_RATE)
+        tds = np.where(book.tds, percentage_paise(interest, tds_bp), 0)
+        yield period_from, period_to, interest, tds
+
+def project_interest(months=DEFAULT_MONTHS, start=None):
+    """Expected interest, TDS and net income of the active book for each of the next months.
+
+    Months run from start (default: the first of next month), one calendar
+    month apart. Returns per-month and total amounts as Decimals.
+    """
+    if not 1 <= months <= MAX_MONTHS:
+        raise ValueError(f'months must be between 1 and {MAX_MONTHS}')
+    started = time.perf_counter()
+    if start is None:
+        start = add_months(date.today().replace(day=1), 1)
+
+    rows = load_book()
+    book = LoanBook(rows)
+    results = []
+    for period_from, period_to, interest, tds in monthly_accruals(book, rows, months, start):
+        month_start, month_end = np.datetime64(period_from, 'D'), np.datetime64(period_to, 'D')
+        total_interest, total_tds = int(interest.sum()), int(tds.sum())
+        results.append({
+            'period_from': period_from,
+            'period_to': period_to,
+            'facilities': int(np.count_nonzero(interest)),
+            'ending': int(np.count_nonzero((book.end >= month_start) & (book.end < month_end))),
+            'interest': _rupees(total_interest),
+            'tds': _rupees(total_tds),
+            'net': _rupees(total_interest - total_tds),
+        })
+
+    total_interest = sum((month['interest'] for month in results), Decimal('0'))
+    total_tds = sum((month['tds'] for month in results), Decimal('0'))
+    return {
+        'start': start,
+        'customers': len(book),
+        'months': results,
+        'total_interest': total_interest,
+        'total_tds': total_tds,
+        'total_net': total_interest - total_tds,
+        'elapsed': time.perf_counter() - started,
+    }
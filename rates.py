@@ -0,0 +1,114 @@
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from app import db
+from models import CacheVersion, InterestRate, TDSRate
+
+RATE_MODELS = {'interest_rate': InterestRate, 'tds_rate': TDSRate}
+
+class RateTable:
+    """A rate history ordered by effective_date.
+
+    rate_on(d) is the rate whose effective_date is the latest on or before
+    d; when several share that date the one entered last wins. Dates before
+    the first entry get the earliest rate, so old periods still resolve.
+    """
+
+    def __init__(self, rows=()):
+        self.dates = []
+        self.rates = []
+        for effective_date, rate in rows:
+            self.dates.append(effective_date)
+            self.rates.append(Decimal(str(rate)))
+
+    def rate_on(self, on_date):
+        if not self.rates:
+            return None
+        return self.rates[max(bisect_right(self.dates, on_date) - 1, 0)]
+
+def load_rate_table(name):
+    model = RATE_MODELS[name]
+    return RateTable(db.session.execute(
+        select(model.effective_date, model.rate).order_by(model.effective_date, model.id)
+    ).all())
+
+class RateCache:
+    """In-process rate tables, checked against CacheVersion rows.
+
+    The versions are read at most once per RATE_CACHE_CHECK_INTERVAL
+    seconds, so a batch run resolves any number of dates without touching
+    the rate tables. Changes committed in this process drop the cached
+    table right away; other workers notice on their next version check.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._versions = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _current_versions(self):
+        interval = current_app.config.get('RATE_CACHE_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return self._versions
+        versions = dict(db.session.execute(select(CacheVersion.name, CacheVersion.version)).all())
+        with self._lock:
+            self._versions, self._checked_at = versions, now
+        return versions
+
+    def versions(self):
+        """{table name: version} of the rate tables this process is serving"""
+        return dict(self._current_versions())
+
+    def table(self, name):
+        version = self._current_versions().get(name, 0)
+        with self._lock:
+            entry = self._tables.get(name)
+            if entry and entry[0] == version:
+                return entry[1]
+
+        table = load_rate_table(name)
+        with self._lock:
+            self._tables[name] = (version, table)
+        return table
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(name, None)
+            self._checked_at = None
+
+rate_tables = RateCache()
+
+def interest_rate_on(on_date):
+    """Standard interest rate (percent) in force on on_date, or None if none is configured"""
+    return rate_tables.table('interest_rate').rate_on(on_date)
+
+def tds_rate_on(on_date):
+    """TDS rate (percent) in force on on_date, or None if none is configured"""
+    return rate_tables.table('tds_rate').rate_on(on_date)
+
+def rates_changed(name):
+    """Bump the shared version for a rate table; call inside the transaction that changes it"""
+    result = db.session.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1))
+    if not result.rowcount:
+        db.session.add(CacheVersion(name=name, version=1))
+    db.session.info.setdefault('changed_rates', set()).add(name)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_rate_tables(session):
+    for name in session.info.pop('changed_rates', ()):
+        rate_tables.invalidate(name)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_rate_changes(session):
+    session.info.pop('changed_rates', None)
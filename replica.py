@@ -0,0 +1,170 @@
+"""Optional read replica for the read-only pages: reports, exports, the dashboard and profiles.
+
+With SQLALCHEMY_REPLICA_URI set (DATABASE_REPLICA_URL), views decorated
+with @replica_reads send their plain SELECTs to the 'replica' bind;
+flushes, INSERT/UPDATE/DELETE and SELECT ... FOR UPDATE always go to the
+primary, as does everything else the app does.
+
+Staleness policy: the replica is used only while it is at most
+REPLICA_MAX_LAG seconds behind. Lag is measured on the ledger, as the age
+of the oldest Transaction row the primary has and the replica does not,
+and re-measured at most once per REPLICA_CHECK_INTERVAL seconds; if the
+replica cannot be reached it is skipped until the next check, and a view
+whose replica query fails between checks is re-run on the primary (a
+streamed response through replica_stream() is restarted there if nothing
+has been sent yet). So reads
+may be up to REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL seconds old, and a
+user who committed a change within that window reads from the primary,
+so they always see their own writes.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, session as user_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+LAST_WRITE_KEY = 'last_write_at'
+
+def replica_configured():
+    return bool(current_app.config.get('SQLALCHEMY_REPLICA_URI'))
+
+def read_window():
+    """Seconds a replica read may be behind the primary, and a user's own writes stay on the primary"""
+    return current_app.config['REPLICA_MAX_LAG'] + current_app.config['REPLICA_CHECK_INTERVAL']
+
+class RoutingSession(FlaskSession):
+    """Flask-SQLAlchemy session that sends plain SELECTs to the replica during @replica_reads views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None and has_app_context() and g.get('use_replica')):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def measure_lag():
+    """Seconds the replica's ledger is behind the primary's; raises DBAPIError if either is unreachable"""
+    from models import Transaction
+
+    db = current_app.extensions['sqlalchemy']
+    with db.engines[REPLICA_BIND].connect() as replica:
+        replicated_id = replica.execute(select(func.max(Transaction.id))).scalar() or 0
+    with db.engine.connect() as primary:
+        oldest_missing = primary.execute(
+            select(func.min(Transaction.created_at)).where(Transaction.id > replicated_id)).scalar()
+    if oldest_missing is None:
+        return 0.0
+    return max((datetime.utcnow() - oldest_missing).total_seconds(), 0.0)
+
+class ReplicaMonitor:
+    """The replica's last measured lag, re-measured at most once per REPLICA_CHECK_INTERVAL seconds"""
+
+    def __init__(self):
+        self._lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def lag(self):
+        """Last measured lag in seconds, or None if the replica was unreachable"""
+        interval = current_app.config['REPLICA_CHECK_INTERVAL']
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return self._lag
+        try:
+            lag = measure_lag()
+        except DBAPIError:
+            logger.warning('Read replica unavailable; reading from the primary', exc_info=True)
+            lag = None
+        with self._lock:
+            self._lag, self._checked_at = lag, now
+        return lag
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = None
+
+    def mark_down(self):
+        """Treat the replica as unreachable until the next check"""
+        with self._lock:
+            self._lag, self._checked_at = None, time.monotonic()
+
+replica_monitor = ReplicaMonitor()
+
+def use_replica():
+    """Whether this request's reads may go to the replica under the staleness policy"""
+    if not replica_configured():
+        return False
+    last_write = user_session.get(LAST_WRITE_KEY) if has_request_context() else None
+    if last_write is not None and time.time() - last_write < read_window():
+        return False
+    lag = replica_monitor.lag()
+    return lag is not None and lag <= current_app.config['REPLICA_MAX_LAG']
+
+def replica_reads(f):
+    """Decorator for read-only views: serve their SELECTs from the replica when the policy allows"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = use_replica()
+        if not g.use_replica:
+            return f(*args, **kwargs)
+        try:
+            return f(*args, **kwargs)
+        except DBAPIError:
+            # the replica failed between lag checks; the views are read-only, so run this one again on the primary
+            _fall_back_to_primary()
+            return f(*args, **kwargs)
+    return decorated_function
+
+def replica_stream(make_stream):
+    """Iterate make_stream() under the routing a @replica_reads view chose.
+
+    A streamed body runs after the view has returned, outside the
+    decorator's fallback; wrap it (inside stream_with_context) so a replica
+    failure before the first block is sent restarts the stream on the
+    primary. Once bytes have gone out the download cannot be restarted and
+    the error propagates.
+    """
+    sent = False
+    try:
+        for block in make_stream():
+            sent = True
+            yield block
+    except DBAPIError:
+        if sent or not g.get('use_replica'):
+            raise
+        _fall_back_to_primary()
+        yield from make_stream()
+
+def _fall_back_to_primary():
+    logger.warning('Read replica query failed; retrying on the primary', exc_info=True)
+    replica_monitor.mark_down()
+    current_app.extensions['sqlalchemy'].session.rollback()
+    g.use_replica = False
+
+@event.listens_for(Session, 'after_flush')
+def _note_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _remember_user_write(session):
+    # read-your-writes: the committing user's next reads stay on the primary until the replica has caught up
+    if session.info.pop('wrote', False) and has_request_context() and replica_configured():
+        user_session[LAST_WRITE_KEY] = time.time()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_write(session):
+    session.info.pop('wrote', None)
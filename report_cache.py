@@ -0,0 +1,96 @@
+"""Disk-backed LRU cache of rendered reports.
+
+Each entry is one file named after the report and the data version it was
+rendered from, e.g. customer_report-42-v17.xlsx. A lookup for a newer
+version misses and the older file is dropped when the new one is stored,
+so entries never need invalidating. Hits refresh the file's access time
+(the modification time stays the render time, which is what responses
+send as Last-Modified), and whenever the cache grows past its byte limit
+the least recently used files are removed. Files are written to a
+temporary name and renamed into place, so several worker processes can
+share one directory.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ReportCache:
+    def __init__(self, app=None):
+        self.cache_dir = None
+        self.max_bytes = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache_dir = app.config['REPORT_CACHE_DIR']
+        self.max_bytes = app.config['REPORT_CACHE_MAX_BYTES']
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, name, version, suffix):
+        return os.path.join(self.cache_dir, f'{name}-v{version}{suffix}')
+
+    def get(self, name, version, suffix='.xlsx'):
+        """Path of the cached file for this version, or None"""
+        path = self.path(name, version, suffix)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name, version, data, suffix='.xlsx'):
+        """Store rendered bytes for this version, replacing older versions of the same report"""
+        path = self.path(name, version, suffix)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        prefix = f'{name}-v'
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(prefix) and entry.name.endswith(suffix) and entry.path != path:
+                self._remove(entry.path)
+        self.evict()
+        return path
+
+    def get_or_render(self, name, version, render, suffix='.xlsx'):
+        """Path of the cached file, rendering it with render() -> bytes on a miss"""
+        return self.get(name, version, suffix) or self.put(name, version, render(), suffix)
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file():
+                self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning('Could not remove cached report %s', path)
+
+report_cache = ReportCache()
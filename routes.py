@@ -1,41 +1,69 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import render_template, request, redirect, url_for, flash, jsonify, make_response, Response, stream_with_context, send_file, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
-from app import app, db
+from app import db, views
 from models import User, Customer, Transaction, InterestRate, TDSRate
-from utils import calculate_interest, calculate_compound_interest, export_to_excel, get_period_report
+from utils import stream_period_report
+from dashboard import get_portfolio_summary, get_customer_balances, get_recent_transactions
+from ledger import bump_ledger_version
+from jobs import export_queue, enqueue_customer_report, enqueue_period_report, enqueue_statement_batch, enqueue_transaction_import, render_customer_report, ARTIFACT_MIMETYPES, XLSX_MIMETYPE
+from report_cache import report_cache
+from accrual import run_accrual
+from snapshots import build_snapshots
+from posting import post_transaction
+from compounding import compounding_schedules
+from instrumentation import metrics as request_metrics
+from rates import rates_changed
+from replica import replica_reads, replica_stream
+from users import ADMIN_ROLES, DATA_ENTRY_ROLES, user_changed
+from importer import CUSTOMER_HEADERS, import_customers, read_rows
 from datetime import datetime, date
+from functools import wraps
 from decimal import Decimal
 import io
+import tempfile
 import logging
 
+def role_required(roles, message):
+    """Decorator to require one of roles; current_user comes from the user cache, so this costs no query"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated or current_user.role not in roles:
+                flash(message, 'error')
+                return redirect(url_for('dashboard'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 def admin_required(f):
     """Decorator to require admin role"""
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role != 'admin':
-            flash('Admin access required.', 'error')
-            return redirect(url_for('dashboard'))
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+    return role_required(ADMIN_ROLES, 'Admin access required.')(f)
 
 def data_entry_required(f):
     """Decorator to require data entry or admin role"""
-    def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role not in ['data_entry', 'admin']:
-            flash('Data entry access required.', 'error')
-            return redirect(url_for('dashboard'))
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+    return role_required(DATA_ENTRY_ROLES, 'Data entry access required.')(f)
+
+IMPORT_FORMATS = ('csv', 'xlsx')
 
-@app.route('/')
+# The tables render every row until their templates carry the data-source / <th data-data> markup
+# (see LoanApp.tables.initTable); the *_source URLs are passed so a template can switch to server-side paging.
+def active_customers():
+    """Every active customer for a customer table, ordered by ICL number"""
+    return Customer.query.filter_by(is_active=True).order_by(Customer.icl_no).all()
+
+def customer_transactions(customer_id):
+    """The customer's whole ledger for a transaction table, latest first"""
+    return Transaction.query.filter_by(customer_id=customer_id) \
+        .order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+
+@views.route('/')
 def index():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -43,8 +71,7 @@ def login():
         
         user = User.query.filter_by(username=username).first()
         
-        if user and check_password_hash(user.password_hash, password):
-            login_user(user)
+        if user and check_password_hash(user.password_hash, password) and login_user(user):
             flash('Login successful!', 'success')
             return redirect(url_for('dashboard'))
         else:
@@ -52,32 +79,31 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
-@app.route('/dashboard')
+@views.route('/dashboard')
 @login_required
+@replica_reads
 def dashboard():
-    customers = Customer.query.filter_by(is_active=True).all()
-    total_customers = len(customers)
-    
-    # Calculate total outstanding balance
-    total_balance = sum(customer.get_current_balance() for customer in customers)
+    # Totals come from one aggregate query; balances are the stored column, so listing customers is one query
+    summary = get_portfolio_summary()
+    customers = get_customer_balances()
     
     # Recent transactions
-    recent_transactions = Transaction.query.order_by(Transaction.created_at.desc()).limit(5).all()
+    recent_transactions = get_recent_transactions()
     
     return render_template('dashboard.html', 
                          customers=customers,
-                         total_customers=total_customers,
-                         total_balance=total_balance,
+                         total_customers=summary['total_customers'],
+                         total_balance=summary['total_balance'],
                          recent_transactions=recent_transactions)
 
-@app.route('/customer_master', methods=['GET', 'POST'])
+@views.route('/customer_master', methods=['GET', 'POST'])
 @data_entry_required
 def customer_master():
     if request.method == 'POST':
@@ -96,6 +122,10 @@ def customer_master():
             compound_frequency = request.form.get('compound_frequency', '')
             first_compounding_date = datetime.strptime(request.form['first_compounding_date'], '%Y-%m-%d').date() if request.form.get('first_compounding_date') else None
             
+            if Customer.query.filter_by(icl_no=icl_no).first():
+                flash(f'ICL No {icl_no} already exists.', 'error')
+                return redirect(url_for('customer_master'))
+            
             # Create new customer
             customer = Customer(
                 icl_no=icl_no,
@@ -122,22 +152,47 @@ def customer_master():
             db.session.rollback()
             flash(f'Error creating customer: {str(e)}', 'error')
     
-    customers = Customer.query.filter_by(is_active=True).all()
-    return render_template('customer_master.html', customers=customers)
+    customers = active_customers()
+    return render_template('customer_master.html', customers=customers,
+                         customers_source=url_for('datatable_customers'))
 
-@app.route('/customer_profile/<int:customer_id>')
+@views.route('/customer_master/import', methods=['POST'])
+@data_entry_required
+def import_customers_upload():
+    upload = request.files.get('file')
+    if not upload or upload.filename.rsplit('.', 1)[-1].lower() not in IMPORT_FORMATS:
+        flash('Choose a CSV or XLSX file to import.', 'error')
+        return redirect(url_for('customer_master'))
+    
+    file_format = upload.filename.rsplit('.', 1)[-1].lower()
+    with tempfile.NamedTemporaryFile(suffix=f'.{file_format}') as f:
+        upload.save(f)
+        f.flush()
+        result = import_customers(read_rows(f.name, CUSTOMER_HEADERS, file_format), user_id=current_user.id)
+    
+    flash(f"Imported {result['created']} customer(s).", 'success')
+    failed = [r for r in result['results'] if r['status'] == 'error']
+    for r in failed[:10]:
+        flash(f"Row {r['row']} ({r['icl_no'] or 'no ICL'}): {r['error']}", 'error')
+    if len(failed) > 10:
+        flash(f'{len(failed) - 10} more row(s) were rejected.', 'error')
+    return redirect(url_for('customer_master'))
+
+@views.route('/customer_profile/<int:customer_id>')
 @login_required
+@replica_reads
 def customer_profile(customer_id):
     customer = Customer.query.get_or_404(customer_id)
-    transactions = Transaction.query.filter_by(customer_id=customer_id).order_by(Transaction.date.desc()).all()
+    transactions = customer_transactions(customer_id)
     current_balance = customer.get_current_balance()
     
     return render_template('customer_profile.html', 
                          customer=customer, 
                          transactions=transactions,
+                         transactions_source=url_for('datatable_transactions', customer_id=customer_id),
                          current_balance=current_balance)
 
-@app.route('/edit_customer/<int:customer_id>', methods=['GET', 'POST'])
+@views.route('/edit_customer/<int:customer_id>', methods=['GET', 'POST'])
 @data_entry_required
 def edit_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
@@ -161,8 +216,10 @@ def edit_customer(customer_id):
             customer.interest_type = request.form['interest_type']
             customer.compound_frequency = request.form.get('compound_frequency', '')
             customer.first_compounding_date = datetime.strptime(request.form['first_compounding_date'], '%Y-%m-%d').date() if request.form.get('first_compounding_date') else None
+            bump_ledger_version(customer)
             
             db.session.commit()
+            compounding_schedules.invalidate(customer_id)
             flash('Customer updated successfully!', 'success')
             return redirect(url_for('customer_profile', customer_id=customer_id))
             
@@ -172,7 +229,7 @@ def edit_customer(customer_id):
     
     return render_template('customer_master.html', customer=customer, edit_mode=True)
 
-@app.route('/delete_customer/<int:customer_id>')
+@views.route('/delete_customer/<int:customer_id>')
 @admin_required
 def delete_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
@@ -181,7 +238,7 @@ def delete_customer(customer_id):
     flash('Customer deleted successfully!', 'success')
     return redirect(url_for('customer_master'))
 
-@app.route('/transactions/<int:customer_id>', methods=['GET', 'POST'])
+@views.route('/transactions/<int:customer_id>', methods=['GET', 'POST'])
 @data_entry_required
 def transactions(customer_id):
     customer = Customer.query.get_or_404(customer_id)
@@ -193,59 +250,11 @@ def transactions(customer_id):
             amount_paid = Decimal(request.form['amount_paid']) if request.form['amount_paid'] else None
             amount_repaid = Decimal(request.form['amount_repaid']) if request.form['amount_repaid'] else None
             
-            # Calculate new balance (ensure all types are Decimal)
-            current_balance = Decimal(str(customer.get_current_balance()))
-            new_balance = current_balance + (amount_paid or Decimal('0')) - (amount_repaid or Decimal('0'))
-            
-            # Calculate interest if period is specified
             period_from = datetime.strptime(request.form['period_from'], '%Y-%m-%d').date() if request.form.get('period_from') else None
             period_to = datetime.strptime(request.form['period_to'], '%Y-%m-%d').date() if request.form.get('period_to') else None
             
-            int_amount = None
-            tds_amount = None
-            net_amount = None
-            no_of_days = None
-            
-            if period_from and period_to:
-                no_of_days = (period_to - period_from).days
-                
-                if customer.interest_type == 'simple':
-                    int_amount = calculate_interest(current_balance, customer.annual_rate, no_of_days)
-                else:
-                    int_amount = calculate_compound_interest(current_balance, customer.annual_rate, no_of_days, customer.compound_frequency)
-                
-                # Calculate TDS if applicable
-                if customer.tds_applicable:
-                    tds_rate = TDSRate.query.filter_by(is_active=True).first()
-                    if tds_rate:
-                        tds_amount = int_amount * (tds_rate.rate / 100)
-                        net_amount = int_amount - tds_amount
-                    else:
-                        tds_amount = int_amount * Decimal('0.10')  # Default 10% TDS
-                        net_amount = int_amount - tds_amount
-                else:
-                    tds_amount = Decimal('0')
-                    net_amount = int_amount
-            
-            # Create transaction
-            transaction = Transaction(
-                customer_id=customer_id,
-                date=transaction_date,
-                amount_paid=amount_paid,
-                amount_repaid=amount_repaid,
-                balance=new_balance,
-                period_from=period_from,
-                period_to=period_to,
-                no_of_days=no_of_days,
-                int_rate=customer.annual_rate,
-                int_amount=int_amount,
-                tds_amount=tds_amount,
-                net_amount=net_amount,
-                created_by=current_user.id
-            )
-            
-            db.session.add(transaction)
-            db.session.commit()
+            post_transaction(customer, transaction_date, amount_paid, amount_repaid,
+                             period_from, period_to, user_id=current_user.id)
             flash('Transaction added successfully!', 'success')
             return redirect(url_for('transactions', customer_id=customer_id))
             
@@ -253,44 +262,129 @@ def transactions(customer_id):
             db.session.rollback()
             flash(f'Error adding transaction: {str(e)}', 'error')
     
-    transactions = Transaction.query.filter_by(customer_id=customer_id).order_by(Transaction.date.desc()).all()
-    return render_template('transactions.html', customer=customer, transactions=transactions)
+    transactions = customer_transactions(customer_id)
+    return render_template('transactions.html', customer=customer, transactions=transactions,
+                         transactions_source=url_for('datatable_transactions', customer_id=customer_id))
 
-@app.route('/reports')
+@views.route('/reports')
 @login_required
+@replica_reads
 def reports():
-    customers = Customer.query.filter_by(is_active=True).all()
-    return render_template('reports.html', customers=customers)
+    # the customer selector searches /api/datatables/customers as the user types (LoanApp.reports.initCustomerSearch)
+    return render_template('reports.html', customer_search_url=url_for('datatable_customers'))
 
-@app.route('/export_customer_report/<int:customer_id>')
+@views.route('/export_customer_report/<int:customer_id>')
 @login_required
+@replica_reads
 def export_customer_report(customer_id):
     customer = Customer.query.get_or_404(customer_id)
-    transactions = Transaction.query.filter_by(customer_id=customer_id).order_by(Transaction.date).all()
     
-    output = export_to_excel(customer, transactions)
+    # The report only changes with the customer's ledger version, so it is rendered once per version
+    etag = f'customer-report-{customer.id}-{customer.ledger_version}'
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=customer_report_{customer.icl_no}.xlsx'
+    path = report_cache.get_or_render(f'customer_report-{customer.id}', customer.ledger_version,
+                                      lambda: render_customer_report(customer))
+    response = send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                         download_name=f'customer_report_{customer.icl_no}.xlsx',
+                         etag=etag, conditional=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
     
     return response
 
-@app.route('/export_period_report', methods=['POST'])
+@views.route('/export_period_report', methods=['POST'])
 @login_required
+@replica_reads
 def export_period_report():
     start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
     end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
     
-    output = get_period_report(start_date, end_date)
-    
-    response = make_response(output.getvalue())
+    # Streamed so that year-long reports do not have to fit in worker memory; the rows are read while the body
+    # is generated, so the replica fallback has to wrap the stream rather than just this view
+    response = Response(stream_with_context(replica_stream(lambda: stream_period_report(start_date, end_date))))
     response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     response.headers['Content-Disposition'] = f'attachment; filename=period_report_{start_date}_{end_date}.xlsx'
     
     return response
 
-@app.route('/admin_panel')
+def _export_job_response(job):
+    """JSON view of an export job with the URLs the client polls and downloads from"""
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'error': job['error'],
+        'progress': job.get('progress'),
+        'result': job.get('result'),
+        'status_url': url_for('export_job_status', job_id=job['id']),
+        'download_url': url_for('download_export', job_id=job['id']) if job['status'] == 'done' else None,
+    }), 200 if job['status'] == 'done' else 202
+
+@views.route('/exports/customer_report/<int:customer_id>', methods=['POST'])
+@login_required
+def enqueue_customer_export(customer_id):
+    customer = Customer.query.get_or_404(customer_id)
+    job = enqueue_customer_report(customer)
+    return _export_job_response(job)
+
+@views.route('/exports/period_report', methods=['POST'])
+@login_required
+def enqueue_period_export():
+    try:
+        start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start_date and end_date are required (YYYY-MM-DD)'}), 400
+    
+    job = enqueue_period_report(start_date, end_date)
+    return _export_job_response(job)
+
+@views.route('/exports/statements', methods=['POST'])
+@login_required
+def enqueue_statement_export():
+    filters = {'status': 'all' if request.form.get('status') == 'all' else 'active'}
+    if request.form.get('interest_type') in ('simple', 'compound'):
+        filters['interest_type'] = request.form['interest_type']
+    if request.form.get('tds_applicable') in ('yes', 'no'):
+        filters['tds_applicable'] = request.form['tds_applicable'] == 'yes'
+    if request.form.get('icl_prefix', '').strip():
+        filters['icl_prefix'] = request.form['icl_prefix'].strip()
+    if request.form.get('customer_ids', '').strip():
+        try:
+            filters['customer_ids'] = sorted({int(i) for i in request.form['customer_ids'].split(',') if i.strip()})
+        except ValueError:
+            return jsonify({'error': 'customer_ids must be a comma-separated list of ids'}), 400
+    
+    job = enqueue_statement_batch(filters)
+    return _export_job_response(job)
+
+@views.route('/exports/<job_id>')
+@login_required
+def export_job_status(job_id):
+    job = export_queue.status(job_id)
+    if not job:
+        abort(404)
+    return _export_job_response(job)
+
+@views.route('/exports/<job_id>/download')
+@login_required
+def download_export(job_id):
+    job = export_queue.status(job_id)
+    if not job or job['status'] != 'done':
+        abort(404)
+    return send_file(export_queue.artifact_path(job_id, job['extension']),
+                     mimetype=ARTIFACT_MIMETYPES[job['extension']],
+                     as_attachment=True, download_name=job['filename'])
+
+@views.route('/admin/metrics')
+@admin_required
+def metrics():
+    return Response(request_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@views.route('/admin_panel')
 @admin_required
 def admin_panel():
     users = User.query.all()
@@ -299,7 +393,7 @@ def admin_panel():
     
     return render_template('admin_panel.html', users=users, interest_rates=interest_rates, tds_rates=tds_rates)
 
-@app.route('/create_user', methods=['POST'])
+@views.route('/create_user', methods=['POST'])
 @admin_required
 def create_user():
     try:
@@ -322,6 +416,8 @@ def create_user():
         )
         
         db.session.add(user)
+        db.session.flush()
+        user_changed(user.id)
         db.session.commit()
         flash('User created successfully!', 'success')
         
@@ -331,7 +427,7 @@ def create_user():
     
     return redirect(url_for('admin_panel'))
 
-@app.route('/update_interest_rate', methods=['POST'])
+@views.route('/update_interest_rate', methods=['POST'])
 @admin_required
 def update_interest_rate():
     try:
@@ -351,6 +447,7 @@ def update_interest_rate():
         )
         
         db.session.add(interest_rate)
+        rates_changed('interest_rate')
         db.session.commit()
         flash('Interest rate updated successfully!', 'success')
         
@@ -360,7 +457,7 @@ def update_interest_rate():
     
     return redirect(url_for('admin_panel'))
 
-@app.route('/update_tds_rate', methods=['POST'])
+@views.route('/update_tds_rate', methods=['POST'])
 @admin_required
 def update_tds_rate():
     try:
@@ -380,6 +477,7 @@ def update_tds_rate():
         )
         
         db.session.add(tds_rate)
+        rates_changed('tds_rate')
         db.session.commit()
         flash('TDS rate updated successfully!', 'success')
         
@@ -389,7 +487,53 @@ def update_tds_rate():
     
     return redirect(url_for('admin_panel'))
 
-@app.route('/delete_user/<int:user_id>')
+@views.route('/admin/import_transactions', methods=['POST'])
+@admin_required
+def import_transactions_upload():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'Choose a CSV or XLSX file to import'}), 400
+    if upload.filename.rsplit('.', 1)[-1].lower() not in IMPORT_FORMATS:
+        return jsonify({'error': 'Only CSV and XLSX files can be imported'}), 400
+    
+    job = enqueue_transaction_import(upload, current_user.id)
+    return _export_job_response(job)
+
+@views.route('/accrue_interest', methods=['POST'])
+@admin_required
+def accrue_interest():
+    try:
+        period_from = datetime.strptime(request.form['period_from'], '%Y-%m-%d').date()
+        period_to = datetime.strptime(request.form['period_to'], '%Y-%m-%d').date()
+        dry_run = 'dry_run' in request.form
+        
+        result = run_accrual(period_from, period_to, dry_run=dry_run, user_id=current_user.id)
+        action = 'Dry run: would accrue' if dry_run else 'Accrued'
+        flash(f"{action} interest for {result['rows']} customer(s): interest {result['total_interest']}, "
+              f"TDS {result['total_tds']}, net {result['total_net']} "
+              f"({result['rows_per_second']:.0f} rows/s). {result['skipped']} already accrued.", 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error accruing interest: {str(e)}', 'error')
+    
+    return redirect(url_for('admin_panel'))
+
+@views.route('/build_snapshots', methods=['POST'])
+@admin_required
+def build_snapshots_now():
+    try:
+        result = build_snapshots(full='full' in request.form)
+        flash(f"{'Rebuilt' if result['full'] else 'Updated'} {result['months']} monthly snapshot(s) for "
+              f"{result['customers']} customer(s) in {result['elapsed']:.1f}s.", 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error building snapshots: {str(e)}', 'error')
+    
+    return redirect(url_for('admin_panel'))
+
+@views.route('/delete_user/<int:user_id>')
 @admin_required
 def delete_user(user_id):
     if user_id == current_user.id:
@@ -398,6 +542,7 @@ def delete_user(user_id):
     
     user = User.query.get_or_404(user_id)
     user.is_active = False
+    user_changed(user_id)
     db.session.commit()
     flash('User deactivated successfully!', 'success')
     return redirect(url_for('admin_panel'))
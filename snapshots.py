@@ -0,0 +1,276 @@
+"""Month-end ledger snapshots and period summaries served from them.
+
+MonthlySnapshot holds each customer's opening and closing balance and
+paid/repaid/interest/TDS/net totals for every month that has ledger rows.
+build_snapshots() is incremental: it finds the (customer, month) pairs
+that received rows since the last run from Transaction.created_at, which
+also catches back-dated and bulk-inserted rows, re-aggregates only those
+months and re-chains the opening/closing balances of later months from
+the stored totals.
+
+period_summary() answers "what happened between two dates" from the
+snapshots of the whole months in the range plus raw rows for the partial
+months at either end. Customers with rows newer than the last build are
+summed from raw rows, so results are correct even between builds.
+
+Run builds from one scheduler (cron or `flask build-snapshots`); two
+overlapping builds can collide on the (customer, month) unique key.
+"""
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import Date, and_, cast, delete, func, insert, select
+from app import db
+from models import Customer, Transaction, MonthlySnapshot, SnapshotRun
+
+# Rows committed shortly after a run started can carry an earlier created_at; bulk writers
+# (importer, accrual) stamp created_at as each batch is inserted so they stay within this
+WATERMARK_OVERLAP = timedelta(minutes=10)
+SNAPSHOT_CHUNK_SIZE = 500
+AMOUNT_FIELDS = ('amount_paid', 'amount_repaid', 'int_amount', 'tds_amount', 'net_amount')
+ZERO = Decimal('0')
+
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _month_of(column):
+    """SQL expression for the first day of column's month"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m-01', column)
+    return cast(func.date_trunc('month', column), Date)
+
+def _as_month(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _decimal(value):
+    return Decimal(str(value or 0))
+
+def _ledger_totals():
+    """Aggregate columns in AMOUNT_FIELDS order, then the row count"""
+    return [func.coalesce(func.sum(getattr(Transaction, field)), 0) for field in AMOUNT_FIELDS] + \
+        [func.count(Transaction.id)]
+
+def last_watermark():
+    """created_at from which ledger rows may not be in the snapshots yet, or None if never built"""
+    started = db.session.execute(
+        select(func.max(SnapshotRun.started_at)).where(SnapshotRun.finished_at.isnot(None))
+    ).scalar()
+    return started - WATERMARK_OVERLAP if started else None
+
+def _changed_months(watermark):
+    """{customer_id: {month, ...}} with ledger rows created at or after watermark (all rows if None)"""
+    month = _month_of(Transaction.date)
+    query = select(Transaction.customer_id, month).distinct()
+    if watermark is not None:
+        query = query.where(Transaction.created_at >= watermark)
+    changed = defaultdict(set)
+    for customer_id, value in db.session.execute(query):
+        changed[customer_id].add(_as_month(value))
+    return changed
+
+def _latest_closings(before_month, customer_ids=None):
+    """{customer_id: closing balance of the customer's latest snapshot before before_month}"""
+    latest = select(MonthlySnapshot.customer_id, func.max(MonthlySnapshot.month).label('month')) \
+        .where(MonthlySnapshot.month < before_month)
+    if customer_ids is not None:
+        latest = latest.where(MonthlySnapshot.customer_id.in_(customer_ids))
+    latest = latest.group_by(MonthlySnapshot.customer_id).subquery()
+    rows = db.session.execute(
+        select(MonthlySnapshot.customer_id, MonthlySnapshot.closing_balance)
+        .join(latest, and_(latest.c.customer_id == MonthlySnapshot.customer_id,
+                           latest.c.month == MonthlySnapshot.month))
+    ).all()
+    return {customer_id: _decimal(closing) for customer_id, closing in rows}
+
+def _rebuild_customers(earliest, customer_ids, changed, now):
+    """Re-aggregate changed months from earliest on and re-chain balances for these customers"""
+    month = _month_of(Transaction.date)
+    fresh = defaultdict(dict)
+    for customer_id, value, *totals in db.session.execute(
+            select(Transaction.customer_id, month, *_ledger_totals())
+            .where(Transaction.customer_id.in_(customer_ids), Transaction.date >= earliest)
+            .group_by(Transaction.customer_id, month)):
+        value = _as_month(value)
+        if value in changed[customer_id]:
+            fresh[customer_id][value] = [_decimal(total) for total in totals[:-1]] + [totals[-1]]
+
+    # stored totals for the months that did not change
+    stored = defaultdict(dict)
+    for snapshot in db.session.execute(
+            select(MonthlySnapshot)
+            .where(MonthlySnapshot.customer_id.in_(customer_ids), MonthlySnapshot.month >= earliest)).scalars():
+        stored[snapshot.customer_id][snapshot.month] = [_decimal(getattr(snapshot, field)) for field in AMOUNT_FIELDS] + \
+            [snapshot.transaction_count]
+
+    previous = _latest_closings(earliest, customer_ids)
+
+    rows = []
+    for customer_id in customer_ids:
+        months = dict(stored[customer_id])
+        months.update(fresh[customer_id])
+        balance = previous.get(customer_id, ZERO)
+        for snapshot_month in sorted(months):
+            paid, repaid, int_amount, tds_amount, net_amount, count = months[snapshot_month]
+            closing = balance + paid - repaid
+            rows.append({
+                'customer_id': customer_id, 'month': snapshot_month,
+                'opening_balance': balance, 'closing_balance': closing,
+                'amount_paid': paid, 'amount_repaid': repaid, 'int_amount': int_amount,
+                'tds_amount': tds_amount, 'net_amount': net_amount,
+                'transaction_count': count, 'built_at': now,
+            })
+            balance = closing
+
+    db.session.execute(delete(MonthlySnapshot).where(MonthlySnapshot.customer_id.in_(customer_ids),
+                                                     MonthlySnapshot.month >= earliest))
+    if rows:
+        db.session.execute(insert(MonthlySnapshot), rows)
+    return len(rows)
+
+def build_snapshots(full=False):
+    """Bring the monthly snapshots up to date; returns a summary dict.
+
+    Only months with rows created since the last run are re-aggregated
+    from the ledger. full=True (or a first run) rebuilds every month.
+    """
+    timer = time.perf_counter()
+    run = SnapshotRun(started_at=datetime.utcnow(), full=full)
+    watermark = None if full else last_watermark()
+    if watermark is None:
+        run.full = True
+        db.session.execute(delete(MonthlySnapshot))
+
+    changed = _changed_months(watermark)
+    months = 0
+    customer_ids = sorted(changed)
+    for start in range(0, len(customer_ids), SNAPSHOT_CHUNK_SIZE):
+        # customers whose earliest changed month matches share one aggregate query
+        by_earliest = defaultdict(list)
+        for customer_id in customer_ids[start:start + SNAPSHOT_CHUNK_SIZE]:
+            by_earliest[min(changed[customer_id])].append(customer_id)
+        for earliest, chunk_ids in sorted(by_earliest.items()):
+            months += _rebuild_customers(earliest, chunk_ids, changed, run.started_at)
+        db.session.commit()
+
+    run.customers = len(customer_ids)
+    run.months = months
+    run.finished_at = datetime.utcnow()
+    db.session.add(run)
+    db.session.commit()
+
+    elapsed = time.perf_counter() - timer
+    return {
+        'full': run.full,
+        'customers': run.customers,
+        'months': months,
+        'elapsed': elapsed,
+    }
+
+def _stale_customers(watermark):
+    """Customers with ledger rows the snapshots may not include yet"""
+    return set(db.session.execute(
+        select(Transaction.customer_id).distinct().where(Transaction.created_at >= watermark)
+    ).scalars())
+
+def _add_raw_totals(summary, start, end, customer_ids=None):
+    """Add ledger totals for start <= date < end to summary, optionally for some customers only"""
+    if start >= end or customer_ids is not None and not customer_ids:
+        return
+    query = select(Transaction.customer_id, *_ledger_totals()) \
+        .where(Transaction.date >= start, Transaction.date < end)
+    if customer_ids is not None:
+        query = query.where(Transaction.customer_id.in_(customer_ids))
+    for customer_id, *totals in db.session.execute(query.group_by(Transaction.customer_id)):
+        _accumulate(summary[customer_id], totals)
+
+def _accumulate(entry, totals):
+    for field, total in zip(AMOUNT_FIELDS, totals):
+        entry[field] += _decimal(total)
+    entry['transaction_count'] += totals[-1]
+
+def _raw_balances_before(day, customer_ids=None, since=None):
+    """{customer_id: net of ledger rows dated before day (and on or after since)}"""
+    net = func.coalesce(func.sum(Transaction.amount_paid), 0) - func.coalesce(func.sum(Transaction.amount_repaid), 0)
+    query = select(Transaction.customer_id, net).where(Transaction.date < day)
+    if since is not None:
+        query = query.where(Transaction.date >= since)
+    if customer_ids is not None:
+        if not customer_ids:
+            return {}
+        query = query.where(Transaction.customer_id.in_(customer_ids))
+    return {customer_id: _decimal(amount)
+            for customer_id, amount in db.session.execute(query.group_by(Transaction.customer_id))}
+
+def period_summary(start_date, end_date):
+    """Per-customer opening/closing balance and totals for start_date..end_date inclusive.
+
+    Returns {'customers': [...], 'totals': {...}}. Whole months come from
+    MonthlySnapshot; the partial months at each end, and any customer
+    with rows newer than the last snapshot build, come from the ledger.
+    """
+    end = end_date + timedelta(days=1)
+    first_full = start_date if start_date.day == 1 else next_month(start_date)
+    last_full = month_start(end)  # whole months are [first_full, last_full)
+
+    summary = defaultdict(lambda: dict({field: ZERO for field in AMOUNT_FIELDS}, transaction_count=0))
+    watermark = last_watermark()
+    if watermark is None:
+        stale = None
+        _add_raw_totals(summary, start_date, end)
+        opening = _raw_balances_before(start_date)
+    else:
+        stale = _stale_customers(watermark)
+        if first_full < last_full:
+            _add_raw_totals(summary, start_date, first_full)
+            _add_raw_totals(summary, last_full, end)
+            for customer_id, *totals in db.session.execute(
+                    select(MonthlySnapshot.customer_id,
+                           *[func.sum(getattr(MonthlySnapshot, field)) for field in AMOUNT_FIELDS],
+                           func.sum(MonthlySnapshot.transaction_count))
+                    .where(MonthlySnapshot.month >= first_full, MonthlySnapshot.month < last_full)
+                    .group_by(MonthlySnapshot.customer_id)):
+                if customer_id not in stale:
+                    _accumulate(summary[customer_id], totals)
+            _add_raw_totals(summary, first_full, last_full, stale)
+        else:
+            _add_raw_totals(summary, start_date, end)
+
+        # opening balance: last closing before start's month plus the days of that month before start
+        opening_month = month_start(start_date)
+        opening = defaultdict(lambda: ZERO)
+        for customer_id, closing in _latest_closings(opening_month).items():
+            if customer_id not in stale:
+                opening[customer_id] += closing
+        if start_date > opening_month:
+            for customer_id, amount in _raw_balances_before(start_date, since=opening_month).items():
+                if customer_id not in stale:
+                    opening[customer_id] += amount
+        opening.update(_raw_balances_before(start_date, stale))
+
+    customer_ids = set(summary) | {customer_id for customer_id, amount in opening.items() if amount}
+    customers = db.session.execute(
+        select(Customer.id, Customer.icl_no, Customer.name)
+        .where(Customer.id.in_(customer_ids)).order_by(Customer.icl_no)
+    ).all() if customer_ids else []
+
+    totals = dict({field: ZERO for field in AMOUNT_FIELDS}, transaction_count=0,
+                  opening_balance=ZERO, closing_balance=ZERO)
+    rows = []
+    for customer_id, icl_no, name in customers:
+        entry = summary[customer_id]
+        opening_balance = opening.get(customer_id, ZERO)
+        row = dict(entry, customer_id=customer_id, icl_no=icl_no, name=name,
+                   opening_balance=opening_balance,
+                   closing_balance=opening_balance + entry['amount_paid'] - entry['amount_repaid'])
+        rows.append(row)
+        for field in totals:
+            totals[field] += row[field]
+    return {'customers': rows, 'totals': totals, 'from_snapshots': stale is not None}
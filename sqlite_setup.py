@@ -0,0 +1,32 @@
+"""SQLite connection settings for running several workers on one database file.
+
+Connections use WAL journaling, so readers never block the writer, and a
+busy timeout, so a writer waits for the lock instead of failing at once.
+pysqlite's own implicit transactions are turned off and SQLAlchemy emits
+BEGIN itself; a connection opened with the execution option
+sqlite_begin='IMMEDIATE' takes the write lock at BEGIN instead of at its
+first write, which is how posting.py makes a read-then-write atomic.
+"""
+from sqlalchemy import event
+
+def _configure_connection(app):
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(app.config["SQLITE_BUSY_TIMEOUT"] * 1000)}')
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
+    return on_connect
+
+def _begin(connection):
+    mode = connection.get_execution_options().get('sqlite_begin', 'DEFERRED')
+    connection.exec_driver_sql(f'BEGIN {mode}')
+
+def init_app(app, db):
+    """Install the SQLite connection hooks on the app's engine; other databases are left alone"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+    event.listen(engine, 'connect', _configure_connection(app))
+    event.listen(engine, 'begin', _begin)
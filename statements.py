@@ -0,0 +1,162 @@
+"""Batch statement export: every matching customer's report in one ZIP.
+
+The parent process reads customers and their ledger rows with plain
+column selects and hands each worker process a chunk of
+(customer tuple, [transaction tuples]) pairs. Workers rebuild lightweight
+stand-ins for the models, render with utils.export_to_excel, and return
+(filename, bytes); the parent writes the results into the ZIP as they
+arrive, keeping only a few chunks in flight. Statements already in the
+report cache for the customer's current ledger version are copied
+instead of rendered.
+
+Workers are started from a fork server (or spawned where there is none),
+never forked from the calling process: exports run on a thread of a
+multi-threaded server, and a plain fork could copy a lock another thread
+holds. The fork server preloads this module, so each worker starts with
+the application modules already imported. As with any multiprocessing
+start method other than fork, a script that calls export_statements must
+keep its top-level work under `if __name__ == '__main__':`.
+"""
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+from app import db
+from models import Customer, Transaction
+from report_cache import report_cache
+from utils import export_to_excel
+
+STATEMENT_CHUNK_SIZE = 20  # customers per worker task
+PROGRESS_INTERVAL = 1.0  # seconds between progress callbacks
+STATEMENT_FILTERS = ('status', 'interest_type', 'tds_applicable', 'icl_prefix', 'customer_ids')
+
+CUSTOMER_COLUMNS = (Customer.id, Customer.icl_no, Customer.name, Customer.address, Customer.contact_details,
+                    Customer.annual_rate, Customer.interest_type, Customer.tds_applicable, Customer.balance,
+                    Customer.ledger_version)
+TRANSACTION_COLUMNS = (Transaction.date, Transaction.amount_paid, Transaction.amount_repaid, Transaction.balance,
+                       Transaction.period_from, Transaction.period_to, Transaction.no_of_days, Transaction.int_rate,
+                       Transaction.int_amount, Transaction.tds_amount, Transaction.net_amount)
+
+class StatementCustomer(namedtuple('StatementCustomer', [column.key for column in CUSTOMER_COLUMNS])):
+    """The Customer attributes export_to_excel reads"""
+    __slots__ = ()
+
+    def get_current_balance(self):
+        return float(self.balance or 0)
+
+StatementTransaction = namedtuple('StatementTransaction', [column.key for column in TRANSACTION_COLUMNS])
+
+def statement_filename(icl_no, customer_id):
+    """ZIP member name; the id keeps it unique when two ICL numbers sanitise to the same name"""
+    safe_icl_no = secure_filename(icl_no or '')
+    return f'customer_report_{safe_icl_no}_{customer_id}.xlsx' if safe_icl_no else f'customer_report_{customer_id}.xlsx'
+
+def _render_statements(chunk):
+    """Worker: [(customer tuple, [transaction tuple, ...]), ...] -> [(filename, xlsx bytes), ...]"""
+    results = []
+    for customer_row, transaction_rows in chunk:
+        customer = StatementCustomer(*customer_row)
+        transactions = [StatementTransaction(*row) for row in transaction_rows]
+        results.append((statement_filename(customer.icl_no, customer.id),
+                        export_to_excel(customer, transactions).getvalue()))
+    return results
+
+def statement_customers_query(status='active', interest_type=None, tds_applicable=None, icl_prefix=None,
+                              customer_ids=None):
+    """Customers selected for a statement run, as plain rows ordered by ICL number"""
+    query = select(*CUSTOMER_COLUMNS)
+    if status == 'active':
+        query = query.where(Customer.is_active.is_(True))
+    if interest_type:
+        query = query.where(Customer.interest_type == interest_type)
+    if tds_applicable is not None:
+        query = query.where(Customer.tds_applicable.is_(bool(tds_applicable)))
+    if icl_prefix:
+        escaped = icl_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.where(Customer.icl_no.like(f'{escaped}%', escape='\\'))
+    if customer_ids:
+        query = query.where(Customer.id.in_(customer_ids))
+    return query.order_by(Customer.icl_no)
+
+def _ledger_rows(customer_ids):
+    """{customer_id: [transaction tuple, ...]} in report order for a chunk of customers"""
+    rows = {customer_id: [] for customer_id in customer_ids}
+    for customer_id, *row in db.session.execute(
+            select(Transaction.customer_id, *TRANSACTION_COLUMNS)
+            .where(Transaction.customer_id.in_(customer_ids))
+            .order_by(Transaction.customer_id, Transaction.date, Transaction.id)):
+        rows[customer_id].append(tuple(row))
+    return rows
+
+def _process_pool(workers):
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def export_statements(path, filters=None, workers=None, chunk_size=STATEMENT_CHUNK_SIZE, progress=None):
+    """Write statements for every customer matching filters into a ZIP at path; returns a summary dict"""
+    started = time.perf_counter()
+    customers = db.session.execute(statement_customers_query(**(filters or {}))).all()
+    total = len(customers)
+    stats = {'rendered': 0, 'cached': 0}
+    last_report = [0.0]
+
+    def report(force=False):
+        now = time.perf_counter()
+        if progress and (force or now - last_report[0] >= PROGRESS_INTERVAL):
+            last_report[0] = now
+            done = stats['rendered'] + stats['cached']
+            elapsed = now - started
+            progress({'done': done, 'total': total, 'rendered': stats['rendered'], 'cached': stats['cached'],
+                      'elapsed': round(elapsed, 2),
+                      'statements_per_second': round(done / elapsed, 1) if elapsed else 0})
+
+    workers = workers or os.cpu_count() or 1
+    # .xlsx files are already deflated, so they are stored as is
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive, _process_pool(workers) as pool:
+        in_flight = deque()
+
+        def drain(limit):
+            while len(in_flight) > limit:
+                for filename, data in in_flight.popleft().result():
+                    archive.writestr(filename, data)
+                    stats['rendered'] += 1
+                report()
+
+        for start in range(0, total, chunk_size):
+            chunk = customers[start:start + chunk_size]
+            pending = []
+            for customer in chunk:
+                cached = report_cache.get(f'customer_report-{customer.id}', customer.ledger_version)
+                try:
+                    if cached:
+                        archive.write(cached, statement_filename(customer.icl_no, customer.id))
+                        stats['cached'] += 1
+                        continue
+                except FileNotFoundError:
+                    pass  # evicted since the lookup
+                pending.append(customer)
+            if pending:
+                ledgers = _ledger_rows([customer.id for customer in pending])
+                in_flight.append(pool.submit(_render_statements,
+                                             [(tuple(customer), ledgers[customer.id]) for customer in pending]))
+            # keep every worker busy without holding the whole book in memory
+            drain(workers * 2)
+        drain(0)
+
+    report(force=True)
+    elapsed = time.perf_counter() - started
+    return {
+        'statements': total,
+        'rendered': stats['rendered'],
+        'cached': stats['cached'],
+        'elapsed': elapsed,
+        'statements_per_second': round(total / elapsed, 1) if elapsed else 0,
+    }
@@ -226,6 +226,20 @@ const LoanApp = {
                 ];
             }
             
+            // Tables with a data-source URL page, sort and search on the server.
+            // Each <th data-data="..."> names the JSON field shown in that column.
+            const source = table.data('source');
+            if (source) {
+                config.serverSide = true;
+                config.processing = true;
+                config.searchDelay = 400;
+                config.ajax = source;
+                config.columns = table.find('thead th').map(function() {
+                    const field = $(this).data('data');
+                    return {data: field || null, orderable: !!field, defaultContent: ''};
+                }).get();
+            }
+            
             table.DataTable(config);
         }
     },
@@ -440,8 +454,39 @@ const LoanApp = {
             // Initialize report handlers
             $('#generateReportBtn').on('click', LoanApp.reports.generateReport);
             $('#exportReportBtn').on('click', LoanApp.reports.exportReport);
+            $('select[data-search-source]').each(function() {
+                LoanApp.reports.initCustomerSearch($(this));
+            });
         },
-        
+
+        // Fill a customer <select data-search-source="..."> from the DataTables customer source,
+        // searching ICL numbers and names by prefix as the user types instead of listing every customer
+        initCustomerSearch: function(select) {
+            const source = select.data('search-source');
+            const input = $('<input type="search" class="form-control mb-2" placeholder="Search by ICL No or name">');
+            select.before(input);
+
+            let timer = null;
+            let latest = 0;
+            const load = function() {
+                const request = ++latest;
+                $.getJSON(source, {'search[value]': input.val().trim(), start: 0, length: 20}).done(function(page) {
+                    if (request !== latest) return;  // a newer search has been sent
+                    const selected = select.val();
+                    select.empty().append($('<option value="">').text('Select a customer'));
+                    page.data.forEach(function(customer) {
+                        select.append($('<option>').val(customer.id).text(`${customer.iclNo} - ${customer.customerName}`));
+                    });
+                    select.val(selected);
+                });
+            };
+            input.on('input', function() {
+                clearTimeout(timer);
+                timer = setTimeout(load, 300);
+            });
+            load();
+        },
+
         generateReport: function() {
             const startDate = $('#start_date').val();
             const endDate = $('#end_date').val();
@@ -465,15 +510,96 @@ const LoanApp = {
         },
         
         exportReport: function() {
+            const startDate = $('#start_date').val();
+            const endDate = $('#end_date').val();
+            
+            if (!startDate || !endDate) {
+                LoanApp.utils.showToast('Please select both start and end dates', 'warning');
+                return;
+            }
+            
+            LoanApp.reports.runExport('/exports/period_report', {start_date: startDate, end_date: endDate});
+        },
+        
+        // Queue a background export, poll its status and download the file when ready
+        runExport: function(url, data) {
             LoanApp.utils.showLoading();
-            // Export will be handled by the backend
-            setTimeout(() => {
+            
+            const poll = function(job) {
+                if (job.status === 'done') {
+                    LoanApp.utils.hideLoading();
+                    LoanApp.utils.showToast('Report exported successfully', 'success');
+                    window.location.href = job.download_url;
+                } else if (job.status === 'failed') {
+                    LoanApp.utils.hideLoading();
+                    LoanApp.utils.showToast('Report export failed: ' + job.error, 'danger');
+                } else {
+                    setTimeout(() => $.getJSON(job.status_url).done(poll).fail(failed), 1000);
+                }
+            };
+            const failed = function() {
                 LoanApp.utils.hideLoading();
-                LoanApp.utils.showToast('Report exported successfully', 'success');
-            }, 1000);
+                LoanApp.utils.showToast('Report export failed', 'danger');
+            };
+            
+            $.post(url, data || {}).done(poll).fail(failed);
         }
     },
     
+    // Live updates for server-rendered pages (see static/js/live.js). Pages opt in with
+    // data-live="dashboard"; totals go to [data-live-total="customers"|"balance"], new rows are
+    // prepended to [data-live="recent-transactions"], and server-side tables change in place.
+    live: {
+        recentRows: 10,
+
+        init: function() {
+            if (!window.LiveUpdates || !$('[data-live="dashboard"]').length) return;
+            LiveUpdates.subscribe({
+                onTotals: LoanApp.live.updateTotals,
+                onTransaction: LoanApp.live.addTransaction,
+                onCustomer: LoanApp.live.reloadTables,
+                onRefresh: LoanApp.live.reloadTables
+            });
+        },
+
+        updateTotals: function(totals) {
+            $('[data-live-total="customers"]').text(totals.totalCustomers);
+            $('[data-live-total="balance"]').text(LoanApp.utils.formatCurrency(totals.totalBalance));
+        },
+
+        addTransaction: function(data) {
+            const t = data.transaction;
+            const list = $('[data-live="recent-transactions"]');
+            if (list.length && !list.find(`tr[data-transaction-id="${t.id}"]`).length) {
+                const row = $('<tr class="slide-up">').attr('data-transaction-id', t.id);
+                [t.date, data.iclNo, data.customerName].forEach(value => row.append($('<td>').text(value || '-')));
+                [t.amountPaid, t.amountRepaid, t.balance].forEach(value => row.append($('<td>').text(LoanApp.utils.formatCurrency(value))));
+                list.prepend(row);
+                list.children('tr').slice(LoanApp.live.recentRows).remove();
+            }
+            // Balance cells of a server-side customer table are updated without a redraw
+            $('table[data-source]').each(function() {
+                if (!$.fn.DataTable.isDataTable(this)) return;
+                $(this).DataTable().rows().every(function() {
+                    const row = this.data();
+                    if (row.id === data.customerId) {
+                        row.balance = data.balance;
+                        this.invalidate('data');
+                    }
+                });
+            });
+        },
+
+        // Server-side tables re-request just the page on screen
+        reloadTables: function() {
+            $('table[data-source]').each(function() {
+                if ($.fn.DataTable.isDataTable(this)) {
+                    $(this).DataTable().ajax.reload(null, false);
+                }
+            });
+        }
+    },
+
     // Animation functions
     animations: {
         init: function() {
@@ -523,6 +649,7 @@ $(document).ready(function() {
     LoanApp.customer.init();
     LoanApp.admin.init();
     LoanApp.reports.init();
+    LoanApp.live.init();
     LoanApp.animations.init();
     
     // Initialize tooltips
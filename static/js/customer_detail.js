@@ -41,21 +41,62 @@ document.addEventListener('DOMContentLoaded', function() {
         `;
     }
 
-    // Function to fetch and display transactions and cumulative data
-    async function fetchTransactionsAndCalculations() {
-        try {
-            const response = await fetch(`/api/customers/${customerId}/transactions`);
+    // Ledger rows in (date, id) order, each with its calculated period
+    let ledgerRows = [];
+    let ledgerUpdates = Promise.resolve();
+
+    // Fetch the ledger from after the cursor row (from the start if null) to the end
+    // Pages are followed via nextCursor; unchanged pages are revalidated with ETags (304)
+    async function fetchLedgerRows(cursor) {
+        let rows = [];
+        do {
+            const url = `/api/customers/${customerId}/transactions` + (cursor ? `?after=${encodeURIComponent(cursor)}` : '');
+            const response = await fetch(url);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const data = await response.json(); // Contains 'transactions' and 'calculatedPeriods'
-            renderCumulativeTable(data.calculatedPeriods);
+            const data = await response.json(); // Contains 'transactions', 'calculatedPeriods' and 'nextCursor'
+            rows = rows.concat(data.transactions.map((transaction, i) => ({transaction: transaction, period: data.calculatedPeriods[i]})));
+            cursor = data.nextCursor;
+        } while (cursor);
+        return rows;
+    }
+
+    // Function to fetch and display transactions and cumulative data
+    async function fetchTransactionsAndCalculations() {
+        try {
+            ledgerRows = await fetchLedgerRows(null);
+            renderCumulativeTable(ledgerRows.map(row => row.period));
         } catch (error) {
             console.error('Error fetching transactions or calculations:', error);
             cumulativeTableContainer.innerHTML = '<p class="text-red-500">Failed to load transactions and calculations.</p>';
         }
     }
 
+    // A new row ends the period of the row before it and shifts the balances of any later
+    // (back-dated) rows, so only the ledger from the row before it onwards is re-fetched
+    async function applyNewTransaction(transaction) {
+        if (ledgerRows.some(row => row.transaction.id === transaction.id)) {
+            return; // already shown (the POST response and the live event both report it)
+        }
+        const later = ledgerRows.findIndex(row => row.transaction.date > transaction.date);
+        const keep = Math.max((later === -1 ? ledgerRows.length : later) - 1, 0);
+        const cursorRow = keep > 0 ? ledgerRows[keep - 1].transaction : null;
+        try {
+            const tail = await fetchLedgerRows(cursorRow ? `${cursorRow.date}_${cursorRow.id}` : null);
+            ledgerRows = ledgerRows.slice(0, keep).concat(tail);
+            renderCumulativeTable(ledgerRows.map(row => row.period));
+        } catch (error) {
+            console.error('Error updating transactions:', error);
+            await fetchTransactionsAndCalculations();
+        }
+    }
+
+    // Updates are applied one at a time so that overlapping tails do not interleave
+    function queueNewTransaction(transaction) {
+        ledgerUpdates = ledgerUpdates.then(() => applyNewTransaction(transaction));
+    }
+
     // Function to render the cumulative table
     function renderCumulativeTable(calculatedPeriods) {
         if (calculatedPeriods.length === 0) {
@@ -160,8 +201,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('Transaction added:', result);
                 // Clear form fields
                 addTransactionForm.reset();
-                // Re-fetch and re-render data after adding transaction
-                fetchTransactionsAndCalculations();
+                // Only the affected end of the ledger is re-fetched
+                queueNewTransaction(result.transaction);
             } catch (error) {
                 console.error('Error adding transaction:', error);
                 alert('Failed to add transaction: ' + error.message); // Consider custom modal
@@ -173,4 +214,17 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initial data load on page load
     fetchCustomerDetails();
     fetchTransactionsAndCalculations();
+
+    // Changes made elsewhere (other users, imports, accrual) are pushed; see static/js/live.js
+    if (window.LiveUpdates) {
+        LiveUpdates.subscribe({
+            customerId: customerId,
+            onTransaction: data => queueNewTransaction(data.transaction),
+            onCustomer: renderCustomerDetails,
+            onRefresh: () => {
+                fetchCustomerDetails();
+                ledgerUpdates = ledgerUpdates.then(fetchTransactionsAndCalculations);
+            },
+        });
+    }
 });
@@ -0,0 +1,29 @@
+// static/js/live.js
+// Push updates from /api/live (server-sent events). Include before the page scripts.
+// EventSource reconnects on its own and the server replays what was missed; when it
+// cannot, it sends a `refresh` event and the page re-fetches its data.
+window.LiveUpdates = {
+    // options: customerId (subscribe to one customer's page instead of the dashboard),
+    // onTransaction, onCustomer, onTotals, onRefresh
+    subscribe: function(options) {
+        if (!window.EventSource) {
+            return null;
+        }
+        const url = '/api/live' + (options.customerId ? `?customer=${encodeURIComponent(options.customerId)}` : '');
+        const source = new EventSource(url);
+        const handlers = {
+            transaction: options.onTransaction,
+            customer: options.onCustomer,
+            totals: options.onTotals,
+            refresh: options.onRefresh,
+        };
+        Object.keys(handlers).forEach(function(kind) {
+            if (handlers[kind]) {
+                source.addEventListener(kind, function(event) {
+                    handlers[kind](JSON.parse(event.data));
+                });
+            }
+        });
+        return source;
+    }
+};
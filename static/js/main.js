@@ -2,18 +2,24 @@
 document.addEventListener('DOMContentLoaded', function() {
     const customerListContainer = document.getElementById('customer-list-container');
     // USER_ROLE is now passed from Flask template
+    let customers = [];
 
     async function fetchCustomers() {
         try {
-            const response = await fetch('/api/customers');
-            if (!response.ok) {
-                // If not logged in, Flask will redirect to login page.
-                // For API calls, it might return a 401 or 403.
-                // We'll rely on Flask's redirect for page loads.
-                // For API, just show an error.
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            const customers = await response.json();
+            customers = [];
+            let cursor = null;
+            do {
+                const response = await fetch('/api/customers' + (cursor ? `?after=${cursor}` : ''));
+                if (!response.ok) {
+                    // If not logged in, Flask will redirect to login page.
+                    // For API calls, it might return a 401 or 403.
+                    // We'll rely on Flask's redirect for page loads.
+                    // For API, just show an error.
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                customers = customers.concat(await response.json());
+                cursor = response.headers.get('X-Next-Cursor');
+            } while (cursor);
             renderCustomerList(customers);
         } catch (error) {
             console.error('Error fetching customers:', error);
@@ -62,5 +68,22 @@ document.addEventListener('DOMContentLoaded', function() {
         customerListContainer.innerHTML = tableHtml;
     }
 
+    // Created, edited and deactivated customers are pushed instead of re-fetching the list
+    function applyCustomer(customer) {
+        const index = customers.findIndex(c => c.id === customer.id);
+        if (!customer.active) {
+            if (index !== -1) customers.splice(index, 1);
+        } else if (index !== -1) {
+            customers[index] = customer;
+        } else {
+            customers.push(customer); // the list is in id order, so new customers go last
+        }
+        renderCustomerList(customers);
+    }
+
     fetchCustomers();
+
+    if (window.LiveUpdates) {
+        LiveUpdates.subscribe({onCustomer: applyCustomer, onRefresh: fetchCustomers});
+    }
 });
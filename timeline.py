@@ -0,0 +1,188 @@
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from decimal import Decimal
+from operator import itemgetter
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from models import Transaction
+from ledger import balance_delta
+from utils import calculate_interest
+
+_point_date = itemgetter(0)
+
+class BalanceTimeline:
+    """Balance change points for one customer with prefix sums of balance x days.
+
+    Each point is (date, balance from that date on, sum of balance x days
+    before that date). A day's balance includes every transaction dated on
+    or before it, and periods are half-open [start, end), matching
+    no_of_days = (period_to - period_from).days. Lookups are a binary
+    search over the points.
+    """
+
+    def __init__(self, changes=()):
+        self.points = []
+        for change_date, amount in changes:
+            self.insert(change_date, amount)
+
+    def insert(self, change_date, amount):
+        """Add a net balance change on change_date; appending in date order is O(1)"""
+        amount = Decimal(str(amount))
+        points = self.points
+        if not points or change_date > points[-1][0]:
+            if points:
+                last_date, last_balance, last_weighted = points[-1]
+                weighted = last_weighted + last_balance * (change_date - last_date).days
+                points.append((change_date, last_balance + amount, weighted))
+            else:
+                points.append((change_date, amount, Decimal('0')))
+            return
+
+        # Back-dated change: rebuild the suffix into a new list so concurrent readers see a consistent copy
+        index = bisect_right(points, change_date, key=_point_date)
+        rebuilt = points[:index]
+        if rebuilt and rebuilt[-1][0] == change_date:
+            start_date, start_balance, start_weighted = rebuilt.pop()
+            rebuilt.append((start_date, start_balance + amount, start_weighted))
+        else:
+            previous = rebuilt[-1] if rebuilt else None
+            balance = (previous[1] if previous else Decimal('0')) + amount
+            weighted = previous[2] + previous[1] * (change_date - previous[0]).days if previous else Decimal('0')
+            rebuilt.append((change_date, balance, weighted))
+        for point_date, balance, _ in points[index:]:
+            prev_date, prev_balance, prev_weighted = rebuilt[-1]
+            balance += amount
+            rebuilt.append((point_date, balance, prev_weighted + prev_balance * (point_date - prev_date).days))
+        self.points = rebuilt
+
+    def balance_on(self, on_date):
+        """Balance at the end of on_date"""
+        points = self.points
+        index = bisect_right(points, on_date, key=_point_date) - 1
+        return points[index][1] if index >= 0 else Decimal('0')
+
+    def _balance_days_before(self, end):
+        points = self.points
+        index = bisect_right(points, end, key=_point_date) - 1
+        if index < 0:
+            return Decimal('0')
+        point_date, balance, weighted = points[index]
+        return weighted + balance * (end - point_date).days
+
+    def balance_days(self, start, end):
+        """Sum of daily balances over [start, end)"""
+        return self._balance_days_before(end) - self._balance_days_before(start)
+
+    def segments(self, start, end):
+        """[(balance, days), ...] covering [start, end), split at each balance change"""
+        points = self.points
+        index = bisect_right(points, start, key=_point_date)
+        balance = points[index - 1][1] if index else Decimal('0')
+        segments = []
+        cursor = start
+        while index < len(points) and points[index][0] < end:
+            # a date whose rows net to zero is not a balance change
+            if points[index][1] != balance:
+                segments.append((balance, (points[index][0] - cursor).days))
+                cursor, balance = points[index][0], points[index][1]
+            index += 1
+        segments.append((balance, (end - cursor).days))
+        return [segment for segment in segments if segment[1]]
+
+    def simple_interest(self, start, end, annual_rate):
+        """Exact day-weighted simple interest over [start, end), rounded once"""
+        return calculate_interest(self.balance_days(start, end), annual_rate, 1)
+
+def load_timeline(customer_id):
+    """Build a customer's timeline from the ledger with one grouped query"""
+    net = func.coalesce(func.sum(Transaction.amount_paid), 0) - func.coalesce(func.sum(Transaction.amount_repaid), 0)
+    changes = db.session.execute(
+        select(Transaction.date, net)
+        .where(Transaction.customer_id == customer_id)
+        .group_by(Transaction.date)
+        .order_by(Transaction.date)
+    ).all()
+    return BalanceTimeline(changes)
+
+def load_timelines(customer_ids):
+    """{customer_id: BalanceTimeline} for several customers from one grouped query"""
+    net = func.coalesce(func.sum(Transaction.amount_paid), 0) - func.coalesce(func.sum(Transaction.amount_repaid), 0)
+    changes = db.session.execute(
+        select(Transaction.customer_id, Transaction.date, net)
+        .where(Transaction.customer_id.in_(customer_ids))
+        .group_by(Transaction.customer_id, Transaction.date)
+        .order_by(Transaction.customer_id, Transaction.date)
+    ).all()
+    timelines = {customer_id: BalanceTimeline() for customer_id in customer_ids}
+    for customer_id, change_date, amount in changes:
+        timelines[customer_id].insert(change_date, amount)
+    return timelines
+
+class TimelineCache:
+    """In-process LRU of customer timelines, checked against Customer.ledger_version.
+
+    Transactions committed through this process are applied incrementally.
+    Any change made elsewhere (another worker, a bulk insert, an edit)
+    leaves the cached version behind the customer's, and the timeline is
+    rebuilt on next use.
+    """
+
+    def __init__(self, max_customers=10000):
+        self.max_customers = max_customers
+        self.listeners = []  # called as listener(customer_id, change_date, amount) after each record()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, customer):
+        with self._lock:
+            entry = self._entries.get(customer.id)
+            if entry and entry[0] == customer.ledger_version:
+                self._entries.move_to_end(customer.id)
+                return entry[1]
+
+        timeline = load_timeline(customer.id)
+        with self._lock:
+            self._entries[customer.id] = (customer.ledger_version, timeline)
+            self._entries.move_to_end(customer.id)
+            while len(self._entries) > self.max_customers:
+                self._entries.popitem(last=False)
+        return timeline
+
+    def record(self, customer_id, change_date, amount):
+        """Apply a committed transaction to the cached timeline, if there is one"""
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry:
+                version, timeline = entry
+                if amount:
+                    timeline.insert(change_date, amount)
+                self._entries[customer_id] = (version + 1, timeline)
+        for listener in self.listeners:
+            listener(customer_id, change_date, amount)
+
+    def invalidate(self, customer_id=None):
+        with self._lock:
+            if customer_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(customer_id, None)
+
+balance_timelines = TimelineCache()
+
+@event.listens_for(Transaction, 'after_insert')
+def _remember_new_transaction(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('new_ledger_rows', []).append(
+            (target.customer_id, target.date, balance_delta(target.amount_paid, target.amount_repaid)))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_transactions(session):
+    for customer_id, change_date, amount in session.info.pop('new_ledger_rows', []):
+        balance_timelines.record(customer_id, change_date, amount)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_transactions(session):
+    session.info.pop('new_ledger_rows', None)
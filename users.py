@@ -0,0 +1,90 @@
+import threading
+import time
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from models import User
+
+ADMIN_ROLES = frozenset(['admin'])
+DATA_ENTRY_ROLES = frozenset(['data_entry', 'admin'])
+
+class SessionUser(UserMixin):
+    """The columns of a User that requests need, detached from any DB session"""
+
+    def __init__(self, id, username, email, role, is_active):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.active = bool(is_active)
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+class UserCache:
+    """In-process cache of signed-in users for the Flask-Login loader.
+
+    Entries live for USER_CACHE_TTL seconds, so most requests resolve
+    current_user without a query. Changes committed in this process drop
+    the user's entry right away; other workers pick them up when their
+    entry expires.
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        ttl = current_app.config.get('USER_CACHE_TTL', 30)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and now - entry[0] < ttl:
+                return entry[1]
+
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.role, User.is_active).where(User.id == user_id)
+        ).first()
+        user = SessionUser(*row) if row else None
+        with self._lock:
+            if len(self._entries) >= self.max_users:
+                self._entries.clear()
+            self._entries[user_id] = (now, user)
+        return user
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+user_cache = UserCache()
+
+def load_session_user(user_id):
+    """Flask-Login user loader: the cached user, or None if unknown or deactivated"""
+    try:
+        user = user_cache.get(int(user_id))
+    except (TypeError, ValueError):
+        return None
+    return user if user is not None and user.is_active else None
+
+def user_changed(user_id):
+    """Drop the user's cached entry once the current transaction commits"""
+    db.session.info.setdefault('changed_users', set()).add(user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_user_changes(session):
+    session.info.pop('changed_users', None)
@@ -1,12 +1,21 @@
 from decimal import Decimal
 from datetime import datetime, date
 import io
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
+import tempfile
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from app import db
 from models import Transaction, Customer
 import math
 
+# openpyxl is imported inside the export functions, so workers only load it once a report is requested
+
+PERIOD_REPORT_HEADERS = ['Customer ICL', 'Customer Name', 'Date', 'Amount Paid', 'Amount Repaid', 
+                         'Balance', 'From', 'To', 'No of Days', 'Int Rate', 'Int Amount', 'TDS', 'Net Amount']
+STREAM_CHUNK_SIZE = 1000
+STREAM_READ_SIZE = 64 * 1024
+MAX_COLUMN_WIDTH = 20
+
 def calculate_interest(principal, annual_rate, days):
     """Calculate simple interest for given principal, rate and days"""
     if not principal or not annual_rate or not days:
@@ -57,6 +66,10 @@ def calculate_compound_interest(principal, annual_rate, days, frequency):
 
 def export_to_excel(customer, transactions):
     """Export customer data and transactions to Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
     output = io.BytesIO()
     
     # Create workbook and worksheet
@@ -182,7 +195,7 @@ def export_to_excel(customer, transactions):
     # Auto-adjust column widths
     for column in ws.columns:
         max_length = 0
-        column_letter = column[0].column_letter
+        column_letter = get_column_letter(column[0].column)
         for cell in column:
             try:
                 if len(str(cell.value)) > max_length:
@@ -198,10 +211,14 @@ def export_to_excel(customer, transactions):
 
 def get_period_report(start_date, end_date):
     """Generate period-based report for all customers"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
     output = io.BytesIO()
     
     # Get all transactions in the period
-    transactions = Transaction.query.filter(
+    transactions = Transaction.query.options(joinedload(Transaction.customer)).filter(
         Transaction.date >= start_date,
         Transaction.date <= end_date
     ).order_by(Transaction.date).all()
@@ -224,10 +241,7 @@ def get_period_report(start_date, end_date):
     
     # Headers
     row = 3
-    headers = ['Customer ICL', 'Customer Name', 'Date', 'Amount Paid', 'Amount Repaid', 
-               'Balance', 'From', 'To', 'No of Days', 'Int Rate', 'Int Amount', 'TDS', 'Net Amount']
-    
-    for col, header in enumerate(headers, 1):
+    for col, header in enumerate(PERIOD_REPORT_HEADERS, 1):
         cell = ws.cell(row=row, column=col, value=header)
         cell.font = header_font
         cell.border = border
@@ -286,7 +300,7 @@ def get_period_report(start_date, end_date):
     # Auto-adjust column widths
     for column in ws.columns:
         max_length = 0
-        column_letter = column[0].column_letter
+        column_letter = get_column_letter(column[0].column)
         for cell in column:
             try:
                 if len(str(cell.value)) > max_length:
@@ -299,3 +313,137 @@ def get_period_report(start_date, end_date):
     wb.save(output)
     output.seek(0)
     return output
+
+
+def _period_report_styles():
+    """Named styles shared by every cell of the streamed period report"""
+    from openpyxl.styles import Font, Alignment, Border, Side, NamedStyle
+
+    border = Border(left=Side(style='thin'), right=Side(style='thin'), 
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    return [
+        NamedStyle(name='report_title', font=Font(bold=True, size=14)),
+        NamedStyle(name='report_header', font=Font(bold=True, size=12), border=border,
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle(name='report_text', border=border),
+        NamedStyle(name='report_number', border=border, alignment=Alignment(horizontal='right')),
+        NamedStyle(name='report_total', font=Font(bold=True, size=12), border=border),
+    ]
+
+def _period_report_widths(start_date, end_date):
+    """Column widths for the period report, sized from aggregates instead of scanning cells"""
+    def text_width(value):
+        return len(str(value)) if value is not None else 0
+
+    def amount_width(largest, smallest):
+        largest = abs(largest or 0)
+        smallest = abs(smallest or 0)
+        return len(f'{max(largest, smallest):.2f}') + (1 if smallest else 0)
+
+    amount_columns = [Transaction.amount_paid, Transaction.amount_repaid, Transaction.balance,
+                      Transaction.int_amount, Transaction.tds_amount, Transaction.net_amount]
+    aggregates = [func.max(func.length(Customer.icl_no)), func.max(func.length(Customer.name)),
+                  func.max(Transaction.no_of_days)]
+    for column in amount_columns:
+        aggregates.extend([func.max(column), func.min(column)])
+
+    row = db.session.execute(
+        select(*aggregates)
+        .select_from(Transaction)
+        .join(Customer, Customer.id == Transaction.customer_id)
+        .where(Transaction.date >= start_date, Transaction.date <= end_date)
+    ).one()
+    icl_width, name_width, days = row[0] or 0, row[1] or 0, row[2]
+    paid, repaid, balance, int_amount, tds, net = (amount_width(row[i], row[i + 1]) for i in range(3, 15, 2))
+
+    date_width = len('dd-mm-yyyy')
+    data_widths = [icl_width, name_width, date_width, paid, repaid, balance, date_width, date_width,
+                   text_width(days), len('100.00%'), int_amount, tds, net]
+    return [min(max(len(header), width) + 2, MAX_COLUMN_WIDTH)
+            for header, width in zip(PERIOD_REPORT_HEADERS, data_widths)]
+
+def stream_period_report(start_date, end_date, chunk_size=STREAM_CHUNK_SIZE):
+    """Generate the period report as a stream of .xlsx bytes with flat memory use.
+
+    Rows are read in chunks through a server-side cursor with the customer
+    columns joined in, written through an openpyxl write-only workbook that
+    spools to a temporary file, and the finished file is yielded in blocks.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    for style in _period_report_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet(title=f"Period Report {start_date} to {end_date}")
+
+    for col, width in enumerate(_period_report_widths(start_date, end_date), 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    def styled(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    # Title and headers
+    ws.merged_cells.add(f'A1:{get_column_letter(len(PERIOD_REPORT_HEADERS) - 1)}1')
+    ws.append([styled(f'Period Report: {start_date.strftime("%d-%m-%Y")} to {end_date.strftime("%d-%m-%Y")}', 'report_title')])
+    ws.append([])
+    ws.append([styled(header, 'report_header') for header in PERIOD_REPORT_HEADERS])
+
+    # Data
+    total_int_amount = Decimal('0')
+    total_tds = Decimal('0')
+    total_net = Decimal('0')
+
+    result = db.session.execute(
+        select(Customer.icl_no, Customer.name, Transaction.date, Transaction.amount_paid,
+               Transaction.amount_repaid, Transaction.balance, Transaction.period_from,
+               Transaction.period_to, Transaction.no_of_days, Transaction.int_rate,
+               Transaction.int_amount, Transaction.tds_amount, Transaction.net_amount)
+        .join(Customer, Customer.id == Transaction.customer_id)
+        .where(Transaction.date >= start_date, Transaction.date <= end_date)
+        .order_by(Transaction.date, Transaction.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for rows in result.partitions():
+        for (icl_no, name, txn_date, amount_paid, amount_repaid, balance, period_from, period_to,
+             no_of_days, int_rate, int_amount, tds_amount, net_amount) in rows:
+            data = [
+                icl_no,
+                name,
+                txn_date.strftime('%d-%m-%Y') if txn_date else '',
+                amount_paid or '',
+                amount_repaid or '',
+                balance or '',
+                period_from.strftime('%d-%m-%Y') if period_from else '',
+                period_to.strftime('%d-%m-%Y') if period_to else '',
+                no_of_days or '',
+                f"{int_rate}%" if int_rate else '',
+                int_amount or '',
+                tds_amount or '',
+                net_amount or ''
+            ]
+            ws.append([styled(value, 'report_number' if col > 6 else 'report_text')
+                       for col, value in enumerate(data, 1)])
+
+            if int_amount is not None:
+                total_int_amount += Decimal(str(int_amount))
+            if tds_amount is not None:
+                total_tds += Decimal(str(tds_amount))
+            if net_amount is not None:
+                total_net += Decimal(str(net_amount))
+
+    # Totals row
+    totals = ['Total'] + [None] * 9 + [total_int_amount, total_tds, total_net]
+    ws.append([styled(value, 'report_total') for value in totals])
+
+    with tempfile.TemporaryFile() as spool:
+        wb.save(spool)
+        spool.seek(0)
+        while True:
+            block = spool.read(STREAM_READ_SIZE)
+            if not block:
+                break
+            yield block
@@ -0,0 +1,121 @@
+"""Vectorized counterparts of utils.calculate_interest and utils.calculate_compound_interest.
+
+Amounts are handled as integer paise so the results are exact fixed-point
+values. Each function returns an int64 array of interest in paise that
+equals, element for element, the scalar Decimal function's result after
+quantize(Decimal('0.01')).
+"""
+from decimal import Decimal
+import numpy as np
+from utils import calculate_compound_interest
+
+PERIODS_PER_YEAR = {'monthly': 12, 'quarterly': 4, 'yearly': 1}
+
+# principal (paise) * rate (hundredths of a percent) * days / SIMPLE_DENOMINATOR = interest in paise
+SIMPLE_DENOMINATOR = 100 * 100 * 365
+
+# Float results within this many ulps (scaled by the exponent) of a half-paisa boundary are settled with Decimal
+TIE_ULPS = 64
+
+def to_paise(amounts):
+    """Rupee amounts (floats, ints or Decimals with at most two decimals) as int64 paise"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+def to_basis_points(rates):
+    """Percentage rates with at most two decimals (e.g. 15.50) as int64 hundredths of a percent"""
+    return np.rint(np.asarray(rates, dtype=np.float64) * 100).astype(np.int64)
+
+def paise_to_decimal(paise):
+    """Convert a paise array back to a list of two-place Decimals"""
+    return [Decimal(int(value)).scaleb(-2) for value in np.asarray(paise)]
+
+def periods_per_year(frequencies):
+    """Map frequency names to compounding periods per year; empty/None means no interest (0).
+
+    Integer input is passed through and must be one of PERIODS_PER_YEAR's values.
+    """
+    frequencies = np.asarray(frequencies)
+    if frequencies.dtype.kind in 'iu':
+        return frequencies.astype(np.int64)
+    return np.array([PERIODS_PER_YEAR.get(f, 1) if f else 0 for f in frequencies], dtype=np.int64)
+
+def simple_interest_paise(principal_paise, rate_bp, days):
+    """Simple interest in paise for arrays of principal (paise), rate (basis points) and days.
+
+    The division is carried out exactly in integers and rounded half-even,
+    matching Decimal's default context.
+    """
+    principal_paise, rate_bp, days = np.broadcast_arrays(
+        np.asarray(principal_paise, dtype=np.int64),
+        np.asarray(rate_bp, dtype=np.int64),
+        np.asarray(days, dtype=np.int64))
+    sign = np.sign(principal_paise) * np.sign(rate_bp) * np.sign(days)
+
+    # |P * R * D| can overflow int64, so split P * R by the denominator first
+    whole, remainder = np.divmod(np.abs(principal_paise) * np.abs(rate_bp), SIMPLE_DENOMINATOR)
+    abs_days = np.abs(days)
+    carry, remainder = np.divmod(remainder * abs_days, SIMPLE_DENOMINATOR)
+    quotient = whole * abs_days + carry
+
+    twice = 2 * remainder
+    round_up = (twice > SIMPLE_DENOMINATOR) | ((twice == SIMPLE_DENOMINATOR) & (quotient % 2 == 1))
+    return sign * (quotient + round_up)
+
+def percentage_paise(amount_paise, rate_bp):
+    """amount_paise * rate_bp / 10000 in paise, rounded half-even like (amount * rate / 100).quantize()"""
+    amount_paise, rate_bp = np.broadcast_arrays(np.asarray(amount_paise, dtype=np.int64),
+                                                np.asarray(rate_bp, dtype=np.int64))
+    # split the amount by the denominator first so the product cannot overflow int64
+    whole, part = np.divmod(np.abs(amount_paise), 10000)
+    carry, remainder = np.divmod(part * np.abs(rate_bp), 10000)
+    quotient = whole * np.abs(rate_bp) + carry
+    twice = 2 * remainder
+    round_up = (twice > 10000) | ((twice == 10000) & (quotient % 2 == 1))
+    return np.sign(amount_paise) * np.sign(rate_bp) * (quotient + round_up)
+
+def compound_interest_paise(principal_paise, rate_bp, days, frequencies):
+    """Compound interest in paise: P * (1 + r/n) ** (n * days / 365) - P.
+
+    Computed in float64 through log1p/expm1; the few elements that land
+    within rounding distance of a half-paisa boundary are recomputed with
+    the Decimal scalar function so the result always matches it exactly.
+    """
+    n = periods_per_year(frequencies)
+    principal_paise, rate_bp, days, n = np.broadcast_arrays(
+        np.asarray(principal_paise, dtype=np.int64),
+        np.asarray(rate_bp, dtype=np.int64),
+        np.asarray(days, dtype=np.int64),
+        n)
+
+    active = (principal_paise != 0) & (rate_bp != 0) & (days != 0) & (n != 0)
+    safe_n = np.where(n == 0, 1, n)
+    rate = rate_bp / 10000.0
+    exponent = safe_n * (days / 365.0) * np.log1p(rate / safe_n)
+    exact = principal_paise * np.expm1(exponent)
+
+    result = np.where(active, np.floor(exact + 0.5), 0).astype(np.int64)
+
+    fraction = exact - np.floor(exact)
+    tolerance = TIE_ULPS * np.finfo(np.float64).eps * (1.0 + np.abs(exponent)) * np.maximum(np.abs(exact), 1.0)
+    near_tie = active & (np.abs(fraction - 0.5) <= tolerance)
+    for i in np.flatnonzero(near_tie):
+        interest = calculate_compound_interest(Decimal(int(principal_paise.flat[i])).scaleb(-2),
+                                               Decimal(int(rate_bp.flat[i])).scaleb(-2),
+                                               int(days.flat[i]),
+                                               _frequency_name(int(n.flat[i])))
+        result.flat[i] = int(interest.scaleb(2))
+    return result
+
+def _frequency_name(n):
+    for name, periods in PERIODS_PER_YEAR.items():
+        if periods == n:
+            return name
+    return 'yearly'
+
+def simple_interest_array(principals, annual_rates, days):
+    """Vectorized calculate_interest taking rupee principals and percentage rates; returns paise"""
+    return simple_interest_paise(to_paise(principals), to_basis_points(annual_rates), days)
+
+def compound_interest_array(principals, annual_rates, days, frequencies):
+    """Vectorized calculate_compound_interest taking rupee principals and percentage rates; returns paise"""
+    return compound_interest_paise(to_paise(principals), to_basis_points(annual_rates), days, frequencies)